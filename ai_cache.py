@@ -0,0 +1,200 @@
+# ai_cache.py
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+DEFAULT_CACHE_DIR = '.gemini_cache'
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+def content_key(model_name, contents):
+    """
+    Hashes a model request into a cache key.
+
+    Text parts are hashed as UTF-8, bytes as they are and images (anything
+    with ``tobytes``, such as PIL images) by mode, size and pixel data, so
+    the same prompt with a changed plot gets a new key.
+
+    Parameters:
+        model_name (str): Name of the model the request is sent to.
+        contents (str or list): Prompt, or list of prompt parts.
+
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    if not isinstance(contents, (list, tuple)):
+        contents = [contents]
+    digest = hashlib.sha256(model_name.encode())
+    for part in contents:
+        if isinstance(part, str):
+            digest.update(b'text\0' + part.encode())
+        elif isinstance(part, (bytes, bytearray)):
+            digest.update(b'bytes\0' + hashlib.sha256(part).digest())
+        elif hasattr(part, 'tobytes'):
+            header = f"image\0{getattr(part, 'mode', '')}\0{getattr(part, 'size', '')}\0"
+            digest.update(header.encode() + hashlib.sha256(part.tobytes()).digest())
+        else:
+            raise TypeError(f"Cannot hash prompt part of type {type(part).__name__}")
+    return digest.hexdigest()
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of model responses.
+
+    Each response is one JSON file named after its key. Entries older than
+    ``ttl`` seconds are treated as missing, and once the directory grows past
+    ``max_bytes`` the least recently used entries are deleted. Files are
+    written atomically, so several threads or processes can share a cache.
+
+    Attributes:
+        cache_dir (str): Directory holding the entries.
+        ttl (float or None): Lifetime of an entry in seconds, None for no expiry.
+        max_bytes (int or None): Size limit of the directory, None for no limit.
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups that were not.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """
+        Returns the cached text for a key, or None if it is missing or expired.
+        Unreadable entries count as misses and are deleted.
+        """
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+        except OSError:
+            self.misses += 1
+            return None
+        except ValueError:
+            # Truncated or not JSON at all
+            self._remove(path)
+            self.misses += 1
+            return None
+        try:
+            text = entry['text']
+            expired = self.ttl is not None and time.time() - entry['created'] > self.ttl
+        except (KeyError, TypeError):
+            # Valid JSON, but not a cache entry
+            expired = True
+        if expired:
+            self._remove(path)
+            self.misses += 1
+            return None
+        # The access time used for eviction is the file's modification time
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return text
+
+    def put(self, key, text, model_name=None):
+        """
+        Stores the text for a key, then evicts entries beyond the size limit.
+        """
+        entry = {'created': time.time(), 'model': model_name, 'text': text}
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        if self.max_bytes is not None:
+            self.evict(self.max_bytes)
+
+    def evict(self, max_bytes):
+        """
+        Deletes the least recently used entries until the cache fits in max_bytes.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= max_bytes:
+                break
+            self._remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+    def clear(self):
+        """Deletes every entry."""
+        self.evict(0)
+
+    def __len__(self):
+        return sum(1 for name in os.listdir(self.cache_dir) if name.endswith('.json'))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+class CachedResponse:
+    """Response read from the cache, exposing ``text`` like a Gemini response."""
+
+    def __init__(self, text):
+        self.text = text
+
+class CachedModel:
+    """
+    Drop-in replacement for ``genai.GenerativeModel`` that answers repeated
+    requests from a ResponseCache.
+
+    Parameters:
+        model_name (str): Name of the model.
+        cache (ResponseCache, optional): Cache to use, defaults to one in
+            DEFAULT_CACHE_DIR.
+        client (object, optional): Object with a ``generate_content`` method
+            to forward misses to, for example a test stub. Defaults to
+            ``genai.GenerativeModel(model_name)``, created on the first miss.
+    """
+
+    def __init__(self, model_name, cache=None, client=None):
+        self.model_name = model_name
+        self.cache = cache if cache is not None else ResponseCache()
+        self.client = client
+
+    def generate_content(self, contents):
+        """
+        Returns the response to a request, from the cache when possible.
+
+        Parameters:
+            contents (str or list): Prompt, or list of text and image parts.
+
+        Returns:
+            object: Response with a ``text`` attribute.
+        """
+        key = content_key(self.model_name, contents)
+        text = self.cache.get(key)
+        if text is not None:
+            return CachedResponse(text)
+        if self.client is None:
+            import google.generativeai as genai
+            self.client = genai.GenerativeModel(self.model_name)
+        response = self.client.generate_content(contents)
+        self.cache.put(key, response.text, self.model_name)
+        return response
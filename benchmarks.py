@@ -0,0 +1,411 @@
+# benchmarks.py
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from knapsack_instance import KnapsackInstance
+from mbo_core import (LOCAL_SEARCH_MODES, batch_tournament_indices, calculate_diversity, fitness, generate_random_solution, local_search,
+                      main_knapsack_mbo, migration_phase, mutate, rank_indices, repair, select_next_generation,
+                      tournament_selection)
+from mbo_stacked import stacked_knapsack_mbo
+
+ITEM_COUNTS = (10, 100, 1_000, 10_000, 100_000, 1_000_000)
+QUICK_ITEM_COUNTS = (10, 100, 1_000, 10_000)
+POP_SIZES = (20, 100)
+# Grid points whose population holds more bits than this are skipped, to bound memory
+MAX_CELLS = 20_000_000
+# Generations of the end-to-end runs
+END_TO_END_GENERATIONS = 5
+# Slowdown, as a fraction of the baseline time, above which compare flags a regression
+REGRESSION_THRESHOLD = 0.25
+# Modules the headless solver path must import without
+HEAVY_MODULES = ('matplotlib', 'tkinter', 'google.generativeai')
+# Modules whose import time the imports command measures
+STARTUP_MODULES = ('mbo_core', 'knapsack_problem', 'utils')
+# Ways of solving many small instances that the throughput command compares
+THROUGHPUT_ENGINES = ('python', 'numpy', 'stacked')
+
+def make_instance(num_items, seed):
+    """
+    Builds a reproducible random instance that fits about half its items.
+
+    Parameters:
+        num_items (int): Number of items.
+        seed (int): Seed of the instance generator.
+
+    Returns:
+        KnapsackInstance: The instance.
+    """
+    rng = random.Random(seed)
+    values = [rng.randint(1, 1000) for _ in range(num_items)]
+    weights = [rng.randint(1, 100) for _ in range(num_items)]
+    return KnapsackInstance(values, weights, sum(weights) // 4)
+
+class Workload:
+    """
+    Inputs shared by the benchmarks of one grid point, built from a fixed seed.
+
+    Attributes:
+        instance (KnapsackInstance): The instance.
+        pop_size (int): Population size.
+        seed (int): Seed the inputs were built from.
+        raw_population (list): Random solutions, mostly over capacity.
+        population (list): The same solutions after repair.
+        fitness_values (list): Fitness of each repaired solution.
+    """
+
+    def __init__(self, num_items, pop_size, seed):
+        self.instance = make_instance(num_items, seed)
+        self.pop_size = pop_size
+        self.seed = seed
+        random.seed(seed)
+        self.raw_population = [generate_random_solution(num_items) for _ in range(pop_size)]
+        self.population = [repair(sol, self.instance) for sol in self.raw_population]
+        self.fitness_values = [fitness(sol, self.instance) for sol in self.population]
+
+def _end_to_end(work, **options):
+    random.seed(work.seed)
+    return main_knapsack_mbo(work.instance, pop_size=work.pop_size, max_generations=END_TO_END_GENERATIONS,
+                             verbose=False, **options)
+
+# Each benchmark times one pass over the population, the work a generation does with that operator
+BENCHMARKS = {
+    'fitness': lambda work: [fitness(sol, work.instance) for sol in work.population],
+    'repair': lambda work: [repair(sol, work.instance) for sol in work.raw_population],
+    'local_search': lambda work: [local_search(sol, work.instance) for sol in work.population],
+    'local_search_swap': lambda work: [local_search(sol, work.instance, mode='swap') for sol in work.population],
+    'mutate': lambda work: [mutate(sol, 0.01) for sol in work.population],
+    'mutate_geometric': lambda work: [mutate(sol, 0.01, geometric=True) for sol in work.population],
+    'migration_phase': lambda work: migration_phase(work.population),
+    'calculate_diversity': lambda work: calculate_diversity(work.population),
+    'tournament_selection': lambda work: tournament_selection(work.population, work.fitness_values),
+    'batch_tournament': lambda work: [work.population[i].copy()
+                                      for i in batch_tournament_indices(work.fitness_values)],
+    'select_next_generation': lambda work: select_next_generation(
+        work.population + work.population, work.fitness_values + work.fitness_values, work.pop_size),
+    'elite': lambda work: rank_indices(work.fitness_values, work.pop_size // 10),
+    'main_knapsack_mbo': _end_to_end,
+    'main_knapsack_mbo_in_place': lambda work: _end_to_end(work, in_place=True),
+    'main_knapsack_mbo_steady_state': lambda work: _end_to_end(work, steady_state=max(2, work.pop_size // 10)),
+}
+
+def time_benchmark(func, work, min_time=0.2, repeats=3):
+    """
+    Times a benchmark, calling it in loops of at least ``min_time`` seconds.
+
+    Parameters:
+        func (callable): Benchmark taking the Workload.
+        work (Workload): Its inputs.
+        min_time (float): Minimum duration of one timed loop.
+        repeats (int): Number of timed loops; the fastest one counts.
+
+    Returns:
+        tuple: (seconds per call, calls per loop).
+    """
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            func(work)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        # Grow the loop towards min_time, at most tenfold per step
+        calls = min(calls * 10, max(calls + 1, int(calls * min_time / max(elapsed, 1e-9) * 1.2)))
+    best = elapsed
+    for _ in range(repeats - 1):
+        started = time.perf_counter()
+        for _ in range(calls):
+            func(work)
+        best = min(best, time.perf_counter() - started)
+    return best / calls, calls
+
+def run_benchmarks(item_counts=ITEM_COUNTS, pop_sizes=POP_SIZES, benchmarks=None, seed=0, min_time=0.2,
+                   repeats=3, max_cells=MAX_CELLS, verbose=True):
+    """
+    Runs the benchmark grid.
+
+    Parameters:
+        item_counts (iterable): Instance sizes.
+        pop_sizes (iterable): Population sizes.
+        benchmarks (iterable, optional): Names from BENCHMARKS, all by default.
+        seed (int): Seed of every grid point's inputs.
+        min_time (float): Minimum duration of one timed loop.
+        repeats (int): Timed loops per benchmark.
+        max_cells (int): Skip grid points with more than this many population bits.
+        verbose (bool): Print each result as it is measured.
+
+    Returns:
+        dict: {'meta': environment, 'results': one record per benchmark and grid point}.
+    """
+    names = list(BENCHMARKS) if benchmarks is None else list(benchmarks)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Unknown benchmarks {unknown}, expected names from {list(BENCHMARKS)}")
+
+    results = []
+    for num_items in item_counts:
+        for pop_size in pop_sizes:
+            if num_items * pop_size > max_cells:
+                if verbose:
+                    print(f"Skipping {num_items} items x {pop_size} solutions (over {max_cells} cells)")
+                continue
+            work = Workload(num_items, pop_size, seed)
+            for name in names:
+                seconds, calls = time_benchmark(BENCHMARKS[name], work, min_time, repeats)
+                results.append({'benchmark': name, 'num_items': num_items, 'pop_size': pop_size,
+                                'seconds': seconds, 'calls': calls})
+                if verbose:
+                    print(f"{name:>28} n={num_items:<8} pop={pop_size:<5} {seconds * 1e3:12.3f} ms")
+
+    meta = {'python': platform.python_version(), 'platform': platform.platform(), 'seed': seed,
+            'min_time': min_time, 'repeats': repeats, 'end_to_end_generations': END_TO_END_GENERATIONS,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    return {'meta': meta, 'results': results}
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    Matches two benchmark reports by benchmark and grid point.
+
+    Parameters:
+        baseline (dict): Report from ``run_benchmarks`` to compare against.
+        current (dict): New report.
+        threshold (float): Relative slowdown counted as a regression.
+
+    Returns:
+        list: One dict per shared measurement with 'benchmark', 'num_items',
+            'pop_size', 'baseline', 'current', 'ratio' (current / baseline) and
+            'regression' (ratio above 1 + threshold).
+    """
+    key = lambda record: (record['benchmark'], record['num_items'], record['pop_size'])
+    baseline_times = {key(record): record['seconds'] for record in baseline['results']}
+    comparison = []
+    for record in current['results']:
+        base = baseline_times.get(key(record))
+        if base is None:
+            continue
+        ratio = record['seconds'] / base if base > 0 else float('inf')
+        comparison.append({'benchmark': record['benchmark'], 'num_items': record['num_items'],
+                           'pop_size': record['pop_size'], 'baseline': base, 'current': record['seconds'],
+                           'ratio': ratio, 'regression': ratio > 1 + threshold})
+    return comparison
+
+def print_comparison(comparison):
+    for row in comparison:
+        flag = '  REGRESSION' if row['regression'] else ''
+        print(f"{row['benchmark']:>28} n={row['num_items']:<8} pop={row['pop_size']:<5} "
+              f"{row['baseline'] * 1e3:12.3f} ms -> {row['current'] * 1e3:12.3f} ms  x{row['ratio']:.2f}{flag}")
+    regressions = sum(row['regression'] for row in comparison)
+    print(f"\n{len(comparison)} measurements compared, {regressions} regressions")
+
+def import_time(module, repeats=5):
+    """
+    Times the import of a module in fresh interpreters.
+
+    Parameters:
+        module (str): Module to import.
+        repeats (int): Interpreters to start; the fastest import counts.
+
+    Returns:
+        tuple: (seconds, heavy modules from HEAVY_MODULES the import loaded).
+    """
+    code = (f"import sys, time\nstarted = time.perf_counter()\nimport {module}\n"
+            f"print(time.perf_counter() - started)\n"
+            f"print(*[name for name in {HEAVY_MODULES!r} if name in sys.modules])")
+    directory = os.path.dirname(os.path.abspath(__file__))
+    best, heavy = float('inf'), []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', code], cwd=directory, capture_output=True, text=True,
+                                check=True).stdout.splitlines()
+        best = min(best, float(output[0]))
+        heavy = output[1].split() if len(output) > 1 else []
+    return best, heavy
+
+def throughput(num_instances=200, min_items=8, max_items=16, pop_size=50, generations=100,
+               engines=THROUGHPUT_ENGINES, seed=0):
+    """
+    Measures how many small instances per second each engine solves.
+
+    'python' and 'numpy' call ``main_knapsack_mbo`` once per instance, and
+    'stacked' solves all of them in one ``stacked_knapsack_mbo`` call.
+
+    Parameters:
+        num_instances (int): Instances to solve.
+        min_items, max_items (int): Range of their item counts.
+        pop_size, generations (int): Solver settings.
+        engines (tuple): Engines from THROUGHPUT_ENGINES to measure.
+        seed (int): Seed of the instances and of the runs.
+
+    Returns:
+        dict: Per engine, its instances per second and mean best fitness.
+    """
+    rng = random.Random(seed)
+    instances = [make_instance(rng.randint(min_items, max_items), seed + i) for i in range(num_instances)]
+    rows = {}
+    for engine in engines:
+        random.seed(seed)
+        started = time.perf_counter()
+        if engine == 'stacked':
+            results = stacked_knapsack_mbo(instances, pop_size=pop_size, max_generations=generations)
+        else:
+            results = [main_knapsack_mbo(instance, pop_size=pop_size, max_generations=generations,
+                                         engine=engine, verbose=False) for instance in instances]
+        elapsed = time.perf_counter() - started
+        rows[engine] = {'instances_per_second': num_instances / elapsed,
+                        'mean_fitness': sum(result[1] for result in results) / max(num_instances, 1)}
+    return rows
+
+def search_quality(item_counts=(100, 1_000), pop_size=50, generations=100, modes=LOCAL_SEARCH_MODES,
+                   quality=0.99, seed=0):
+    """
+    Measures the solution quality each local search mode reaches per CPU-second.
+
+    Quality is the best fitness as a fraction of the instance's Dantzig upper
+    bound, which the optimum cannot exceed. CPU time rather than wall time
+    is counted, so the numbers do not depend on the machine's load.
+
+    Parameters:
+        item_counts (tuple): Instance sizes.
+        pop_size, generations (int): Solver settings.
+        modes (tuple): Local search modes from LOCAL_SEARCH_MODES.
+        quality (float): Quality whose first CPU time is reported.
+        seed (int): Seed of the instances and of the runs.
+
+    Returns:
+        list: One record per size and mode with the final quality, the CPU
+            seconds of the run and those until ``quality`` was first reached
+            (None if it never was).
+    """
+    records = []
+    for num_items in item_counts:
+        instance = make_instance(num_items, seed)
+        bound = instance.upper_bound()
+        for mode in modes:
+            reached = []
+            random.seed(seed)
+            started = time.process_time()
+
+            def track(snapshot):
+                if not reached and snapshot.best_fitness >= quality * bound:
+                    reached.append(time.process_time() - started)
+
+            result = main_knapsack_mbo(instance, pop_size=pop_size, max_generations=generations, verbose=False,
+                                       local_search_mode=mode, progress=track)
+            records.append({'num_items': num_items, 'mode': mode, 'quality': result[1] / bound if bound else 1.0,
+                            'cpu_seconds': time.process_time() - started,
+                            'cpu_seconds_to_quality': reached[0] if reached else None})
+    return records
+
+def load_report(path):
+    with open(path) as file:
+        return json.load(file)
+
+def write_report(report, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the MBO operators and full runs.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmark grid')
+    run_parser.add_argument('--output', type=str, default=os.path.join('results', 'benchmarks.json'),
+                            help='JSON report to write')
+    run_parser.add_argument('--quick', action='store_true', help=f'Only item counts up to {QUICK_ITEM_COUNTS[-1]}')
+    run_parser.add_argument('--items', type=int, nargs='+', default=None, help='Item counts of the grid')
+    run_parser.add_argument('--pop_sizes', type=int, nargs='+', default=list(POP_SIZES),
+                            help='Population sizes of the grid')
+    run_parser.add_argument('--benchmarks', type=str, nargs='+', choices=list(BENCHMARKS), default=None,
+                            help='Benchmarks to run (default: all)')
+    run_parser.add_argument('--seed', type=int, default=0, help='Seed of the benchmark inputs')
+    run_parser.add_argument('--min_time', type=float, default=0.2, help='Minimum seconds per timed loop')
+    run_parser.add_argument('--repeats', type=int, default=3, help='Timed loops per benchmark')
+    run_parser.add_argument('--max_cells', type=int, default=MAX_CELLS,
+                            help='Skip grid points with more items x population than this')
+    run_parser.add_argument('--compare', type=str, default=None, help='Baseline report to compare against')
+    run_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                            help='Relative slowdown flagged as a regression')
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two reports')
+    compare_parser.add_argument('baseline', type=str, help='Baseline report')
+    compare_parser.add_argument('current', type=str, help='New report')
+    compare_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                                help='Relative slowdown flagged as a regression')
+
+    imports_parser = subparsers.add_parser('imports', help='Time the imports of the solver modules')
+    imports_parser.add_argument('--modules', type=str, nargs='+', default=list(STARTUP_MODULES),
+                                help='Modules to import')
+    imports_parser.add_argument('--repeats', type=int, default=5, help='Fresh interpreters per module')
+    throughput_parser = subparsers.add_parser('throughput', help='Compare instances per second on small instances')
+    throughput_parser.add_argument('--instances', type=int, default=200, help='Instances to solve')
+    throughput_parser.add_argument('--min_items', type=int, default=8, help='Fewest items of an instance')
+    throughput_parser.add_argument('--max_items', type=int, default=16, help='Most items of an instance')
+    throughput_parser.add_argument('--pop_size', type=int, default=50, help='Population size')
+    throughput_parser.add_argument('--max_gen', type=int, default=100, help='Generations per instance')
+    throughput_parser.add_argument('--engines', type=str, nargs='+', choices=THROUGHPUT_ENGINES,
+                                   default=list(THROUGHPUT_ENGINES), help='Engines to compare')
+    throughput_parser.add_argument('--seed', type=int, default=0, help='Seed of the instances and runs')
+    quality_parser = subparsers.add_parser('quality', help='Compare local search modes by quality per CPU-second')
+    quality_parser.add_argument('--items', type=int, nargs='+', default=[100, 1_000], help='Instance sizes')
+    quality_parser.add_argument('--pop_size', type=int, default=50, help='Population size')
+    quality_parser.add_argument('--max_gen', type=int, default=100, help='Generations per run')
+    quality_parser.add_argument('--modes', type=str, nargs='+', choices=LOCAL_SEARCH_MODES,
+                                default=list(LOCAL_SEARCH_MODES), help='Local search modes to compare')
+    quality_parser.add_argument('--quality', type=float, default=0.99,
+                                help='Fraction of the upper bound whose CPU time to report')
+    quality_parser.add_argument('--seed', type=int, default=0, help='Seed of the instances and runs')
+    args = parser.parse_args()
+
+    if args.command == 'quality':
+        for record in search_quality(args.items, args.pop_size, args.max_gen, args.modes, args.quality, args.seed):
+            to_quality = record['cpu_seconds_to_quality']
+            to_quality = 'never' if to_quality is None else f"{to_quality:.3f}s"
+            print(f"{record['mode']:>28} n={record['num_items']:<8} quality {record['quality']:.4f} "
+                  f"in {record['cpu_seconds']:.3f}s CPU, {args.quality:g} after {to_quality}")
+        return 0
+
+    if args.command == 'throughput':
+        rows = throughput(args.instances, args.min_items, args.max_items, args.pop_size, args.max_gen,
+                          args.engines, args.seed)
+        for engine, row in rows.items():
+            print(f"{engine:>28} {row['instances_per_second']:12.1f} instances/s  "
+                  f"mean fitness {row['mean_fitness']:.1f}")
+        return 0
+
+    if args.command == 'imports':
+        # Fails if a module drags in plotting, GUI or AI libraries
+        failed = False
+        for module in args.modules:
+            seconds, heavy = import_time(module, args.repeats)
+            failed = failed or bool(heavy)
+            loaded = f"  loads {', '.join(heavy)}" if heavy else ''
+            print(f"{module:>28} {seconds * 1e3:12.3f} ms{loaded}")
+        return 1 if failed else 0
+
+    if args.command == 'run':
+        item_counts = args.items or (QUICK_ITEM_COUNTS if args.quick else ITEM_COUNTS)
+        report = run_benchmarks(item_counts, args.pop_sizes, args.benchmarks, args.seed, args.min_time,
+                                args.repeats, args.max_cells)
+        write_report(report, args.output)
+        print(f"\nResults written to {args.output}")
+        if args.compare is None:
+            return 0
+        baseline, current = load_report(args.compare), report
+    else:
+        baseline, current = load_report(args.baseline), load_report(args.current)
+
+    comparison = compare_results(baseline, current, args.threshold)
+    print_comparison(comparison)
+    return 1 if any(row['regression'] for row in comparison) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
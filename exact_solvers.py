@@ -0,0 +1,146 @@
+# exact_solvers.py
+
+import time
+from bisect import bisect_right
+
+import numpy as np
+
+from knapsack_instance import as_instance, break_fraction
+from mbo_core import RunStats
+
+def _exact_result(instance, selected, best_fitness, started, stop_reason, verbose, return_stats, method):
+    """
+    Packs an exact solver's answer into the ``main_knapsack_mbo`` result tuple.
+    The solve counts as one generation, matching its single-entry histories.
+    """
+    fitness_history = [best_fitness]
+    stats = RunStats(stop_reason, len(fitness_history), time.perf_counter() - started)
+    if verbose:
+        total_weight = sum(w for w, bit in zip(instance.weights, selected) if bit)
+        print(f"\n{method} Complete!")
+        print(f"Stopped By: {stop_reason}")
+        print(f"Best Fitness: {best_fitness}")
+        print(f"Best Solution: {selected}")
+        print(f"Total Weight: {total_weight}")
+    result = (selected, best_fitness, fitness_history, [0.0])
+    if return_stats:
+        return result + (stats,)
+    return result
+
+def dp_knapsack(values, weights=None, capacity=None, verbose=True, return_stats=False):
+    """
+    Solves the instance exactly with an O(n * C) dynamic program over capacities.
+
+    Each item updates the whole table of best values per capacity with one
+    vectorized comparison; a boolean table of decisions is kept to rebuild
+    the solution, so memory is about n * C bytes. Weights and capacity must
+    be non-negative integers; values may be fractional, in which case the
+    table holds floats.
+
+    Parameters:
+        values (list or KnapsackInstance): List of item values, or the whole
+            instance in place of values, weights and capacity.
+        weights (list): List of item weights.
+        capacity (int): Maximum capacity of the knapsack.
+        verbose (bool): Print the result.
+        return_stats (bool): Also return a RunStats as fifth element.
+
+    Returns:
+        tuple: (best_solution, best_fitness, fitness_history, diversity_history)
+            with single-entry histories, followed by a RunStats if requested.
+    """
+    started = time.perf_counter()
+    instance = as_instance(values, weights, capacity)
+    capacity = int(instance.capacity)
+    if capacity < 0 or any(w < 0 for w in instance.weights):
+        raise ValueError("The DP needs non-negative integer weights and capacity")
+
+    integral = instance.integral_values
+    best = np.zeros(capacity + 1, dtype=np.int64 if integral else np.float64)
+    taken = np.zeros((instance.num_items, capacity + 1), dtype=bool)
+    for i, (v, w) in enumerate(zip(instance.values, instance.weights)):
+        if w > capacity or v <= 0:
+            continue
+        # Values with item i, computed from the table before item i
+        with_item = best[:capacity + 1 - w] + v
+        take = with_item > best[w:]
+        best[w:] = np.where(take, with_item, best[w:])
+        taken[i, w:] = take
+
+    selected = [0] * instance.num_items
+    remaining = capacity
+    for i in range(instance.num_items - 1, -1, -1):
+        if taken[i, remaining]:
+            selected[i] = 1
+            remaining -= instance.weights[i]
+    best_fitness = int(best[capacity]) if integral else float(best[capacity])
+    return _exact_result(instance, selected, best_fitness, started, 'optimal',
+                         verbose, return_stats, 'Dynamic Programming')
+
+def branch_and_bound_knapsack(values, weights=None, capacity=None, node_limit=None, verbose=True, return_stats=False):
+    """
+    Solves the instance exactly by depth-first branch and bound.
+
+    Items are branched on in greedy ratio order, including before excluding,
+    and a subtree is pruned when its Dantzig bound cannot beat the incumbent.
+    The bound is read off the instance's greedy prefix sums with a bisection,
+    and only rounded down when all values are integers.
+
+    Parameters:
+        values (list or KnapsackInstance): List of item values, or the whole
+            instance in place of values, weights and capacity.
+        weights (list): List of item weights.
+        capacity (int): Maximum capacity of the knapsack.
+        node_limit (int, optional): Give up after this many nodes and return
+            the incumbent, with stop reason 'node_limit' instead of 'optimal'.
+        verbose (bool): Print the result.
+        return_stats (bool): Also return a RunStats as fifth element.
+
+    Returns:
+        tuple: (best_solution, best_fitness, fitness_history, diversity_history)
+            with single-entry histories, followed by a RunStats if requested.
+    """
+    started = time.perf_counter()
+    instance = as_instance(values, weights, capacity)
+    n = instance.num_items
+    order = instance.greedy_order
+    item_weights = [instance.weights[i] for i in order]
+    item_values = [instance.values[i] for i in order]
+    prefix_weights, prefix_values = instance.prefix_weights, instance.prefix_values
+    integral = instance.integral_values
+
+    def bound(k, slack, value):
+        # Greedy items k.. that fit whole, then a fraction of the break item
+        end = bisect_right(prefix_weights, prefix_weights[k] + slack, k) - 1
+        value += prefix_values[end] - prefix_values[k]
+        if end < n:
+            slack -= prefix_weights[end] - prefix_weights[k]
+            value += break_fraction(slack, item_values[end], item_weights[end], integral)
+        return value
+
+    best_value = 0
+    best_chosen = None
+    nodes = 0
+    stop_reason = 'optimal'
+    # Nodes are (next greedy position, slack, value, chosen positions as a linked list)
+    stack = [(0, instance.capacity, 0, None)]
+    while stack:
+        nodes += 1
+        if node_limit is not None and nodes > node_limit:
+            stop_reason = 'node_limit'
+            break
+        k, slack, value, chosen = stack.pop()
+        if value > best_value:
+            best_value, best_chosen = value, chosen
+        if k == n or bound(k, slack, value) <= best_value:
+            continue
+        stack.append((k + 1, slack, value, chosen))
+        if item_weights[k] <= slack and item_values[k] > 0:
+            stack.append((k + 1, slack - item_weights[k], value + item_values[k], (k, chosen)))
+
+    selected = [0] * n
+    while best_chosen is not None:
+        k, best_chosen = best_chosen
+        selected[order[k]] = 1
+    return _exact_result(instance, selected, best_value, started, stop_reason,
+                         verbose, return_stats, 'Branch and Bound')
@@ -0,0 +1,155 @@
+# knapsack_instance.py
+
+from bisect import bisect_right
+from itertools import accumulate
+
+class KnapsackInstance:
+    """
+    A knapsack problem with the item orderings every operator needs, computed once.
+
+    Attributes:
+        values (list): List of item values.
+        weights (list): List of item weights.
+        capacity (int): Maximum capacity of the knapsack.
+        num_items (int): Number of items.
+        ratios (list): Value-to-weight ratio of each item (inf for weightless items).
+        ascending_order (list): Item indices by ascending ratio, ties by index.
+            This is the order in which ``repair`` removes items.
+        greedy_order (list): Item indices by descending ratio, ties by index.
+        prefix_weights (list): prefix_weights[k] is the weight of the first k items of greedy_order.
+        prefix_values (list): prefix_values[k] is the value of the first k items of greedy_order.
+        total_weight (int): Weight of all items.
+        total_value (int): Value of all items.
+        min_weight (int): Weight of the lightest item.
+        break_index (int): Position in greedy_order of the LP break item, the
+            first item that no longer fits whole; num_items if all items fit.
+        integral_values (bool): Whether every value is a whole number, so
+            that value bounds may be rounded down.
+
+    The instance unpacks like the ``(values, weights, capacity)`` tuple that
+    ``load_knapsack_instance`` used to return.
+
+    Values and weights may also be NumPy integer arrays, as returned by the
+    fast loader; they are stored as lists all the same, but the orderings are
+    then computed with vectorized sorts, which matters for millions of items.
+    """
+
+    def __init__(self, values, weights, capacity):
+        if len(values) != len(weights):
+            raise ValueError("values and weights must be of same length")
+        arrays = hasattr(values, 'tolist') and hasattr(weights, 'tolist')
+        self.values = values.tolist() if arrays else list(values)
+        self.weights = weights.tolist() if arrays else list(weights)
+        self.capacity = capacity
+        self.num_items = len(self.values)
+
+        if arrays:
+            (self.ratios, self.ascending_order, self.greedy_order,
+             self.prefix_weights, self.prefix_values) = _array_tables(values, weights)
+        else:
+            self.ratios = [v / w if w else float('inf') for v, w in zip(self.values, self.weights)]
+            ratios = self.ratios
+            self.ascending_order = sorted(range(self.num_items), key=lambda i: (ratios[i], i))
+            self.greedy_order = sorted(range(self.num_items), key=lambda i: (-ratios[i], i))
+            self.prefix_weights = list(accumulate((self.weights[i] for i in self.greedy_order), initial=0))
+            self.prefix_values = list(accumulate((self.values[i] for i in self.greedy_order), initial=0))
+        self.total_weight = self.prefix_weights[-1]
+        self.total_value = self.prefix_values[-1]
+        self.min_weight = min(self.weights, default=0)
+        self.break_index = bisect_right(self.prefix_weights, self.capacity) - 1
+        self.integral_values = all(isinstance(v, int) or (isinstance(v, float) and v.is_integer())
+                                   for v in self.values)
+        self._weight_index = None
+
+    def weight_index(self):
+        """
+        Returns the sorted weight index of the swap local search, built on first use.
+
+        Items are sorted by ascending weight, heavier duplicates of a value
+        last. ``best_before[p]`` is the position of the most valuable of the
+        first p + 1 sorted items, the lightest of them on ties, so following
+        best_before from any prefix visits the items no lighter item
+        outvalues, most valuable first.
+
+        Returns:
+            tuple: (sorted_weights, weight_order, best_before) lists, where
+                weight_order holds the item indices in sorted order.
+        """
+        if self._weight_index is None:
+            values, weights = self.values, self.weights
+            weight_order = sorted(range(self.num_items), key=lambda i: (weights[i], -values[i], i))
+            best_before = []
+            best = -1
+            for p, i in enumerate(weight_order):
+                if best < 0 or values[i] > values[weight_order[best]]:
+                    best = p
+                best_before.append(best)
+            self._weight_index = ([weights[i] for i in weight_order], weight_order, best_before)
+        return self._weight_index
+
+    def upper_bound(self):
+        """
+        Returns the Dantzig bound, the optimum of the LP relaxation.
+
+        Items are packed whole in greedy order and the break item that no
+        longer fits contributes the fraction of its value that does. No 0-1
+        solution can be worth more. With integer values no solution can be
+        worth a fraction either, so the bound is then rounded down.
+
+        Returns:
+            int or float: Upper bound on the optimal total value.
+        """
+        count = self.break_index
+        if count >= self.num_items:
+            return self.total_value
+        remaining = self.capacity - self.prefix_weights[count]
+        break_item = self.greedy_order[count]
+        fraction = break_fraction(remaining, self.values[break_item], self.weights[break_item],
+                                  self.integral_values)
+        return self.prefix_values[count] + fraction
+
+    def __iter__(self):
+        return iter((self.values, self.weights, self.capacity))
+
+    def __repr__(self):
+        return f"KnapsackInstance(num_items={self.num_items}, capacity={self.capacity})"
+
+def break_fraction(remaining, value, weight, integral):
+    """
+    Returns the value of the part of an item that fills ``remaining`` capacity,
+    rounded down when ``integral`` says all values are whole numbers.
+    """
+    if integral:
+        return (remaining * value) // weight
+    return remaining * value / weight
+
+def _array_tables(values, weights):
+    """Ratios, item orders and greedy prefix sums of array-backed items, as the list-based code computes them."""
+    import numpy as np
+    values = np.asarray(values)
+    weights = np.asarray(weights)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = np.where(weights != 0, values / np.where(weights != 0, weights, 1), np.inf)
+    # Stable sorts break ties by item index
+    ascending_order = np.argsort(ratios, kind='stable')
+    greedy_order = np.argsort(-ratios, kind='stable')
+    prefix_weights = np.concatenate(([0], np.cumsum(weights[greedy_order])))
+    prefix_values = np.concatenate(([0], np.cumsum(values[greedy_order])))
+    return (ratios.tolist(), ascending_order.tolist(), greedy_order.tolist(),
+            prefix_weights.tolist(), prefix_values.tolist())
+
+def as_instance(values, weights=None, capacity=None):
+    """
+    Returns ``values`` if it already is a KnapsackInstance, else builds one.
+
+    Parameters:
+        values (list or KnapsackInstance): List of item values, or a full instance.
+        weights (list): List of item weights.
+        capacity (int): Maximum capacity of the knapsack.
+
+    Returns:
+        KnapsackInstance: The instance.
+    """
+    if isinstance(values, KnapsackInstance):
+        return values
+    return KnapsackInstance(values, weights, capacity)
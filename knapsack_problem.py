@@ -1,54 +1,481 @@
 # knapsack_problem.py
 
-from mbo_core import main_knapsack_mbo
-from utils import plot_fitness_history, plot_solution
+from exact_solvers import branch_and_bound_knapsack, dp_knapsack
+from knapsack_instance import KnapsackInstance
+from mbo_core import ENGINES, LOCAL_SEARCH_MODES, main_knapsack_mbo
+from mbo_islands import TOPOLOGIES
+from mbo_stacked import stacked_knapsack_mbo
+from utils import PLOT_MODES, plot_fitness_history, plot_solution
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import glob
+import json
 import os
+import random
+import tempfile
+import time
+import warnings
 
-def load_knapsack_instance(file_path):
+import numpy as np
+
+# Binary copy of a parsed instance file, stored next to it as <file>.npz
+SIDECAR_SUFFIX = '.npz'
+
+def parse_instance_file(file_path):
+    """
+    Parses an instance file, its item lines in one vectorized pass.
+    
+    The file holds the capacity on its first line and one "value weight"
+    pair per following line; blank lines are ignored.
+    
+    Parameters:
+        file_path (str): Path to the instance file.
+    
+    Returns:
+        tuple: (values, weights, capacity) with values and weights as int64 arrays.
+    """
+    with open(file_path) as file:
+        try:
+            capacity = int(file.readline())
+        except ValueError:
+            raise ValueError(f"{file_path}: the first line must hold the capacity") from None
+        with warnings.catch_warnings():
+            # An instance without items is valid, though loadtxt warns about it
+            warnings.simplefilter('ignore', UserWarning)
+            try:
+                items = np.loadtxt(file, dtype=np.int64, ndmin=2)
+            except ValueError as e:
+                raise ValueError(f"{file_path}: item lines hold two integers, value and weight ({e})") from None
+    if items.size == 0:
+        items = items.reshape(0, 2)
+    if items.shape[1] != 2:
+        raise ValueError(f"{file_path}: item lines hold two integers, value and weight")
+    return items[:, 0].copy(), items[:, 1].copy(), capacity
+
+def read_sidecar(file_path):
+    """
+    Returns the (values, weights, capacity) stored in the binary sidecar of an
+    instance file, or None if there is none or the file changed since.
+    """
+    try:
+        stat = os.stat(file_path)
+        with np.load(file_path + SIDECAR_SUFFIX) as sidecar:
+            if (int(sidecar['source_mtime_ns']) != stat.st_mtime_ns
+                    or int(sidecar['source_size']) != stat.st_size):
+                return None
+            return sidecar['values'], sidecar['weights'], int(sidecar['capacity'])
+    except (OSError, EOFError, KeyError, ValueError):
+        return None
+
+def write_sidecar(file_path, values, weights, capacity, stat):
+    """
+    Stores parsed instance data next to the instance file, tagged with the
+    modification time and size in ``stat``, the file's ``os.stat`` from
+    before it was parsed. The sidecar is replaced atomically, gets the
+    read and write permissions of the file, so that whoever can read the
+    file can read the sidecar, and directories that cannot be written to
+    are skipped silently.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, values=values, weights=weights, capacity=capacity,
+                     source_mtime_ns=stat.st_mtime_ns, source_size=stat.st_size)
+        # mkstemp creates the file readable by its owner only
+        os.chmod(tmp_path, stat.st_mode & 0o666)
+        os.replace(tmp_path, file_path + SIDECAR_SUFFIX)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def load_knapsack_instance(file_path, use_sidecar=True):
     """
     Loads a knapsack problem instance from a file.
     
+    The text is parsed once and kept in a binary ``.npz`` sidecar next to
+    the file; later loads read the sidecar while the file's modification
+    time and size are unchanged.
+    
+    Parameters:
+        file_path (str): Path to the instance file.
+        use_sidecar (bool): Read and write the binary sidecar.
+    
+    Returns:
+        KnapsackInstance: The instance, which also unpacks as (values, weights, capacity).
+    """
+    data = read_sidecar(file_path) if use_sidecar else None
+    if data is None:
+        stat = os.stat(file_path)
+        data = parse_instance_file(file_path)
+        if use_sidecar:
+            write_sidecar(file_path, *data, stat)
+    return KnapsackInstance(*data)
+
+METHODS = ('auto', 'mbo', 'dp', 'bnb')
+
+# Largest n * (C + 1) table the automatic dispatch hands to the DP (about 50 MB of decisions)
+DP_CELL_LIMIT = 50_000_000
+# Largest instance the automatic dispatch tries branch and bound on, and its node budget
+BNB_ITEM_LIMIT = 200
+BNB_NODE_LIMIT = 1_000_000
+
+def choose_method(instance):
+    """
+    Picks the solver the automatic dispatch uses for an instance.
+    
+    Parameters:
+        instance (KnapsackInstance): The knapsack instance.
+    
+    Returns:
+        str: 'dp' when the capacity table is small and the values, weights
+            and capacity are integers, else 'bnb' for few items, else 'mbo'.
+    """
+    integral = (instance.integral_values and isinstance(instance.capacity, int)
+                and all(isinstance(w, int) and w >= 0 for w in instance.weights))
+    if integral and instance.capacity >= 0 and instance.num_items * (instance.capacity + 1) <= DP_CELL_LIMIT:
+        return 'dp'
+    if instance.num_items <= BNB_ITEM_LIMIT:
+        return 'bnb'
+    return 'mbo'
+
+def solve_knapsack(instance, method='auto', verbose=True, return_stats=False, **mbo_options):
+    """
+    Solves an instance with an exact engine or MBO, picked by size when automatic.
+    
+    Parameters:
+        instance (KnapsackInstance): The knapsack instance.
+        method (str): 'dp', 'bnb', 'mbo', or 'auto' to let ``choose_method``
+            decide. An automatic branch and bound that runs out of nodes falls
+            back to MBO.
+        verbose (bool): Print progress and the result.
+        return_stats (bool): Also return a RunStats as fifth element.
+        **mbo_options: Keyword arguments for ``main_knapsack_mbo``.
+    
+    Returns:
+        tuple: (best_solution, best_fitness, fitness_history, diversity_history),
+            followed by a RunStats if return_stats is set.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method!r}, expected one of {METHODS}")
+    automatic = method == 'auto'
+    if automatic:
+        method = choose_method(instance)
+    if method == 'dp':
+        return dp_knapsack(instance, verbose=verbose, return_stats=return_stats)
+    if method == 'bnb':
+        result = branch_and_bound_knapsack(instance, node_limit=BNB_NODE_LIMIT if automatic else None,
+                                           verbose=verbose, return_stats=True)
+        if not automatic or result[-1].stop_reason == 'optimal':
+            return result if return_stats else result[:4]
+    return main_knapsack_mbo(instance, verbose=verbose, return_stats=return_stats, **mbo_options)
+
+# Command line options that only the MBO solver reads
+MBO_OPTIONS = ('pop_size', 'max_gen', 'mutation_rate', 'engine', 'cache_size', 'deduplicate', 'delta_evaluation',
+               'islands', 'migration_interval', 'topology', 'num_migrants', 'target_fitness', 'time_limit',
+               'stop_at_optimum', 'greedy_fraction', 'greedy_noise', 'in_place', 'geometric_mutation',
+               'batch_tournament', 'steady_state', 'local_search', 'profile', 'checkpoint', 'checkpoint_every',
+               'checkpoint_interval', 'resume', 'stacked')
+
+def mbo_options_set(args, parser):
+    """
+    Lists the MBO-only command line options given other values than their defaults.
+    
+    Parameters:
+        args (argparse.Namespace): Parsed arguments.
+        parser (argparse.ArgumentParser): The parser, for the defaults.
+    
+    Returns:
+        list: Option flags such as '--in_place', in MBO_OPTIONS order.
+    """
+    return [f'--{name}' for name in MBO_OPTIONS if getattr(args, name) != parser.get_default(name)]
+
+BATCH_FIELDS = ('instance', 'num_items', 'capacity', 'best_fitness', 'total_weight', 'wall_time', 'generations',
+                'stop_reason', 'error')
+
+def expand_instance_paths(pattern):
+    """
+    Lists the instance files of a batch.
+    
+    Parameters:
+        pattern (str): A directory (all its .txt files are used) or a glob pattern.
+            Sidecar caches matched by the pattern are skipped.
+    
+    Returns:
+        list: Sorted instance file paths.
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '*.txt')
+    return sorted(path for path in glob.glob(pattern)
+                  if os.path.isfile(path) and not path.endswith(SIDECAR_SUFFIX))
+
+def solve_instance_file(file_path, seed=None, method='auto', **solver_options):
+    """
+    Loads and solves one instance file without printing or plotting.
+    
     Parameters:
         file_path (str): Path to the instance file.
+        seed (int, optional): Seed for the ``random`` module before solving.
+        method (str): Solver, see ``solve_knapsack``.
+        **solver_options: Keyword arguments for ``main_knapsack_mbo``.
+    
+    Returns:
+        dict: One batch result row, see ``BATCH_FIELDS``.
+    """
+    if seed is not None:
+        random.seed(seed)
+    instance = load_knapsack_instance(file_path)
+    start = time.perf_counter()
+    best_sol, best_fit, fitness_history, diversity_history, stats = solve_knapsack(
+        instance, method=method, verbose=False, return_stats=True, **solver_options)
+    wall_time = time.perf_counter() - start
+    total_weight = sum(w for w, bit in zip(instance.weights, best_sol) if bit) if best_sol else 0
+    return {
+        'instance': file_path,
+        'num_items': instance.num_items,
+        'capacity': instance.capacity,
+        'best_fitness': best_fit,
+        'total_weight': total_weight,
+        'wall_time': wall_time,
+        'generations': stats.generations,
+        'stop_reason': stats.stop_reason,
+        'error': None,
+    }
+
+def solve_batch(file_paths, max_workers=None, **solver_options):
+    """
+    Solves many instance files concurrently on a process pool.
+    
+    Every file gets its own seed drawn from the ``random`` module, so a batch
+    is reproducible under ``random.seed`` whatever the worker scheduling. A file
+    that fails to load or solve does not abort the batch: its row holds only
+    the instance path and the error message.
+    
+    Parameters:
+        file_paths (list): Instance file paths.
+        max_workers (int, optional): Worker processes, defaults to the CPU count.
+        **solver_options: Keyword arguments for ``solve_instance_file``.
     
     Returns:
-        tuple: (values, weights, capacity)
-    """
-    values = []
-    weights = []
-    capacity = 0
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
-        capacity = int(lines[0].strip())
-        for line in lines[1:]:
-            if line.strip():  # Ensure the line is not empty
-                v, w = map(int, line.strip().split())
-                values.append(v)
-                weights.append(w)
-    return values, weights, capacity
+        list: Result rows in the order of ``file_paths``.
+    """
+    seeds = [random.getrandbits(64) for _ in file_paths]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(solve_instance_file, path, seed, **solver_options)
+                   for path, seed in zip(file_paths, seeds)]
+        results = []
+        for path, future in zip(file_paths, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                row = dict.fromkeys(BATCH_FIELDS)
+                row.update(instance=path, error=f"{type(e).__name__}: {e}")
+                results.append(row)
+        return results
+
+def solve_stacked(file_paths, **solver_options):
+    """
+    Solves many small instance files together on one stacked population,
+    see ``mbo_stacked.stacked_knapsack_mbo``.
+    
+    The run is timed as a whole, so each row's wall_time is the run's share
+    per instance.
+    
+    Parameters:
+        file_paths (list): Instance file paths.
+        **solver_options: Keyword arguments for ``stacked_knapsack_mbo``.
+    
+    Returns:
+        list: Result rows in the order of ``file_paths``.
+    """
+    instances = [load_knapsack_instance(path) for path in file_paths]
+    start = time.perf_counter()
+    results = stacked_knapsack_mbo(instances, verbose=False, return_stats=True, **solver_options)
+    wall_time = (time.perf_counter() - start) / max(len(instances), 1)
+    rows = []
+    for path, instance, (best_sol, best_fit, _, _, stats) in zip(file_paths, instances, results):
+        rows.append({
+            'instance': path,
+            'num_items': instance.num_items,
+            'capacity': instance.capacity,
+            'best_fitness': best_fit,
+            'total_weight': sum(w for w, bit in zip(instance.weights, best_sol) if bit),
+            'wall_time': wall_time,
+            'generations': stats.generations,
+            'stop_reason': stats.stop_reason,
+            'error': None,
+        })
+    return rows
+
+def write_batch_results(results, output_path):
+    """
+    Writes batch result rows to a .json or .csv file, chosen by extension.
+    
+    Parameters:
+        results (list): Result rows from ``solve_batch``.
+        output_path (str): Path of the results file.
+    """
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if output_path.endswith('.csv'):
+        with open(output_path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=BATCH_FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        with open(output_path, 'w') as file:
+            json.dump(results, file, indent=2)
 
 def main():
     import argparse
 
     # Set up argument parser
     parser = argparse.ArgumentParser(description='Enhanced MBO for 0–1 Knapsack Problem')
-    parser.add_argument('--instance', type=str, required=True, help='Path to knapsack instance file')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--instance', type=str, help='Path to knapsack instance file')
+    source.add_argument('--batch', type=str, help='Directory or glob of instance files to solve concurrently, without plots')
     parser.add_argument('--pop_size', type=int, default=50, help='Population size')
     parser.add_argument('--max_gen', type=int, default=100, help='Number of generations')
     parser.add_argument('--mutation_rate', type=float, default=0.01, help='Mutation rate')
+    parser.add_argument('--method', type=str, choices=METHODS, default='auto',
+                        help='Solver: exact DP, branch and bound, MBO, or picked by instance size')
+    parser.add_argument('--engine', type=str, choices=ENGINES, default='python', help='Population engine')
+    parser.add_argument('--cache_size', type=int, default=0, help='Fitness cache capacity (0 disables it)')
+    parser.add_argument('--deduplicate', action='store_true', help='Drop duplicate solutions before selection')
+    parser.add_argument('--delta_evaluation', action='store_true', help='Carry solution totals instead of re-summing them')
+    parser.add_argument('--islands', type=int, default=1, help='Number of island populations run in parallel processes')
+    parser.add_argument('--migration_interval', type=int, default=10, help='Generations between island migrations')
+    parser.add_argument('--topology', type=str, choices=TOPOLOGIES, default='ring', help='Island migration topology')
+    parser.add_argument('--num_migrants', type=int, default=1, help='Solutions each island sends per migration')
+    parser.add_argument('--target_fitness', type=int, default=None, help='Stop once this fitness is reached')
+    parser.add_argument('--time_limit', type=float, default=None, help='Stop after this many seconds')
+    parser.add_argument('--stop_at_optimum', action='store_true',
+                        help='Stop when the best fitness reaches the LP-relaxation upper bound')
+    parser.add_argument('--greedy_fraction', type=float, default=0.0,
+                        help='Share of the initial population seeded around the greedy solution')
+    parser.add_argument('--greedy_noise', type=float, default=0.1,
+                        help='Probability of skipping each item when building a seeded solution')
+    parser.add_argument('--in_place', action='store_true',
+                        help='Reuse two preallocated population buffers instead of allocating offspring')
+    parser.add_argument('--geometric_mutation', action='store_true',
+                        help='Draw mutated positions from geometric gaps, one random number per flip')
+    parser.add_argument('--batch_tournament', action='store_true',
+                        help='Draw all tournament contestants in one batch, with replacement')
+    parser.add_argument('--steady_state', type=int, default=0,
+                        help='Offspring per generation that replace the worst solutions (default: 0, whole generations)')
+    parser.add_argument('--local_search', type=str, choices=LOCAL_SEARCH_MODES, default='add',
+                        help='Offspring local search: add fitting items in index order, or fill by ratio and swap')
+    parser.add_argument('--profile', action='store_true',
+                        help='Print the time spent in each generation phase and operator counters')
+    parser.add_argument('--checkpoint', type=str, default=None,
+                        help='File to save the solver state to periodically, for --resume')
+    parser.add_argument('--checkpoint_every', type=int, default=None,
+                        help='Generations between checkpoints (default: 10 unless --checkpoint_interval is set)')
+    parser.add_argument('--checkpoint_interval', type=float, default=None, help='Seconds between checkpoints')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue the run saved in --checkpoint, if the file exists')
+    parser.add_argument('--stacked', action='store_true',
+                        help='Solve the --batch instances together on one stacked population instead of a process pool')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes for --batch (default: CPU count)')
+    parser.add_argument('--output', type=str, default=os.path.join('results', 'batch_results.json'),
+                        help='Results file for --batch, .json or .csv')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for the random number generator')
     parser.add_argument('--save_plots', action='store_true', help='Save plots instead of displaying them')
+    parser.add_argument('--plot_mode', type=str, choices=PLOT_MODES, default='auto',
+                        help='Solution plot: one bar per item, item ranges, or cumulative curves (default: by size)')
     args = parser.parse_args()
 
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    solver_options = dict(pop_size=args.pop_size, max_generations=args.max_gen,
+                          mutation_rate=args.mutation_rate, engine=args.engine,
+                          cache_size=args.cache_size, deduplicate=args.deduplicate,
+                          delta_evaluation=args.delta_evaluation, target_fitness=args.target_fitness,
+                          time_limit=args.time_limit, stop_at_optimum=args.stop_at_optimum,
+                          greedy_fraction=args.greedy_fraction, greedy_noise=args.greedy_noise,
+                          in_place=args.in_place, geometric_mutation=args.geometric_mutation,
+                          batch_tournament=args.batch_tournament, steady_state=args.steady_state,
+                          local_search_mode=args.local_search)
+
+    if args.geometric_mutation and args.engine != 'python':
+        parser.error('--geometric_mutation needs the python engine')
+    if args.in_place and args.engine != 'python':
+        parser.error('--in_place needs the python engine')
+    if args.steady_state and args.engine != 'python':
+        parser.error('--steady_state needs the python engine')
+    if args.local_search != 'add' and args.engine != 'python':
+        parser.error('--local_search swap needs the python engine')
+    if args.profile and (args.engine != 'python' or args.islands > 1):
+        parser.error('--profile needs the python engine and a single population')
+    if args.resume and not args.checkpoint:
+        parser.error('--resume needs --checkpoint')
+    if args.checkpoint and (args.engine != 'python' or args.islands > 1 or args.batch):
+        parser.error('--checkpoint needs the python engine, a single population and a single instance')
+
+    # MBO options choose MBO when the method is automatic, and are refused by the exact solvers
+    mbo_flags = mbo_options_set(args, parser)
+    if mbo_flags and args.method in ('dp', 'bnb'):
+        parser.error(f"{', '.join(mbo_flags)}: MBO options, not used by --method {args.method}")
+    method = 'mbo' if mbo_flags and args.method == 'auto' else args.method
+
+    if args.stacked:
+        if not args.batch:
+            parser.error('--stacked needs --batch')
+        if (args.engine != 'python' or args.cache_size or args.deduplicate or args.delta_evaluation
+                or args.in_place or args.geometric_mutation or args.batch_tournament or args.steady_state
+                or args.local_search != 'add'):
+            parser.error('--stacked runs its own vectorized engine and takes none of the engine options')
+
+    if args.batch:
+        if args.islands > 1:
+            parser.error('--islands cannot be combined with --batch')
+        if args.profile:
+            parser.error('--profile cannot be combined with --batch')
+        file_paths = expand_instance_paths(args.batch)
+        if not file_paths:
+            parser.error(f'No instance files match {args.batch}')
+        start = time.perf_counter()
+        if args.stacked:
+            results = solve_stacked(file_paths, pop_size=args.pop_size, max_generations=args.max_gen,
+                                    mutation_rate=args.mutation_rate, target_fitness=args.target_fitness,
+                                    time_limit=args.time_limit, stop_at_optimum=args.stop_at_optimum,
+                                    greedy_fraction=args.greedy_fraction, greedy_noise=args.greedy_noise)
+        else:
+            results = solve_batch(file_paths, max_workers=args.workers, method=method, **solver_options)
+        write_batch_results(results, args.output)
+        elapsed = time.perf_counter() - start
+        failed = [row for row in results if row['error']]
+        print(f"Solved {len(results) - len(failed)} instances in {elapsed:.2f}s "
+              f"({len(results) / elapsed:.1f} instances/s), results written to {args.output}")
+        if failed:
+            print(f"{len(failed)} instances failed:")
+            for row in failed:
+                print(f"  {row['instance']}: {row['error']}")
+        return
+
     # Load the instance
-    values, weights, capacity = load_knapsack_instance(args.instance)
+    instance = load_knapsack_instance(args.instance)
+    values, weights, capacity = instance
     
     print(f"Knapsack Capacity: {capacity}")
     print(f"Number of Items: {len(values)}")
 
+    island_options = {}
+    if args.islands > 1:
+        island_options = dict(migration_interval=args.migration_interval, topology=args.topology,
+                              num_migrants=args.num_migrants)
+
     # Run MBO for Knapsack
-    best_sol, best_fit, fitness_history = main_knapsack_mbo(
-        values, weights, capacity, pop_size=args.pop_size, 
-        max_generations=args.max_gen, mutation_rate=args.mutation_rate
+    if args.checkpoint:
+        solver_options.update(checkpoint_path=args.checkpoint, checkpoint_every=args.checkpoint_every,
+                              checkpoint_interval=args.checkpoint_interval, resume=args.resume)
+    best_sol, best_fit, fitness_history, diversity_history = solve_knapsack(
+        instance, method=method, islands=args.islands, profile=args.profile, **solver_options, **island_options
     )
 
     # Define paths for saving plots
@@ -62,11 +489,11 @@ def main():
     if args.save_plots:
         # Save plots to files
         plot_fitness_history(fitness_history, save_path=fitness_plot_path)
-        plot_solution(best_sol, values, weights, capacity, save_path=solution_plot_path)
+        plot_solution(best_sol, values, weights, capacity, save_path=solution_plot_path, mode=args.plot_mode)
     else:
         # Display plots interactively
         plot_fitness_history(fitness_history)
-        plot_solution(best_sol, values, weights, capacity)
+        plot_solution(best_sol, values, weights, capacity, mode=args.plot_mode)
 
 if __name__ == "__main__":
     main()
@@ -1,29 +1,63 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext
-import google.generativeai as genai
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import os, json, re, PIL.Image, io
+import queue, threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from ai_cache import CachedModel, ResponseCache
 from knapsack_problem import main_knapsack_mbo, load_knapsack_instance
-from utils import plot_fitness_history, plot_solution
-from dotenv import load_dotenv
-# Load environment variables from .env file
-load_dotenv()
+from utils import MAX_MARKERS, downsample_history, plot_fitness_history, plot_solution
 
-# Configure Google AI
-api_key = os.getenv('GEMINI_API_KEY')
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel('gemini-2.0-flash-exp')
-story = genai.GenerativeModel('gemini-1.5-flash-latest')
+# Shared by all models, created with the first one
+response_cache = None
+
+def configure_ai():
+    """
+    Loads the .env file and configures Google AI with its GEMINI_API_KEY.
+
+    Runs once, when the first model is made, so importing this module
+    neither reads the environment nor loads the AI SDK.
+    """
+    global response_cache
+    if response_cache is not None:
+        return
+    import google.generativeai as genai
+    from dotenv import load_dotenv
+    load_dotenv()
+    genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+    # Repeated requests are answered from disk instead of the network
+    response_cache = ResponseCache()
+
+def make_model(model_name):
+    configure_ai()
+    return CachedModel(model_name, response_cache)
+
+# Milliseconds between two polls of the worker event queue
+POLL_INTERVAL = 50
 
 class KnapsackApp:
-    def __init__(self, root):
+    def __init__(self, root, model_factory=make_model):
+        # model_factory maps a model name to an object with generate_content,
+        # so tests can swap in a local stub
         self.root = root
         self.root.title("Knapsack Problem Solver")
         self.setup_ui()
-        self.ai_model = genai.GenerativeModel('gemini-1.5-flash-8b')
+        self.story_model = model_factory('gemini-1.5-flash-latest')
+        self.ai_model = model_factory('gemini-1.5-flash-8b')
+        self.explain_model = model_factory('gemini-2.0-flash-exp')
         Path('data/knapsack_instances').mkdir(parents=True, exist_ok=True)
+        
+        # Workers never touch Tk: they post (kind, payload) events that the
+        # main thread handles in poll_events
+        self.events = queue.Queue()
+        self.ai_executor = ThreadPoolExecutor(max_workers=2)
+        self.cancel_event = threading.Event()
+        self.solver_thread = None
+        self.fitness_history = []
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(POLL_INTERVAL, self.poll_events)
 
     def setup_ui(self):
         # Left panel for controls
@@ -60,8 +94,14 @@ class KnapsackApp:
         self.additional_prompt = tk.StringVar()
         ttk.Entry(param_frame, textvariable=self.additional_prompt).pack()
         
-        # Solve button
-        ttk.Button(left_panel, text="Solve Problem", command=self.solve_problem).pack(pady=5)
+        # Solve and cancel buttons
+        self.solve_button = ttk.Button(left_panel, text="Solve Problem", command=self.solve_problem)
+        self.solve_button.pack(pady=5)
+        self.cancel_button = ttk.Button(left_panel, text="Cancel", command=self.cancel_solve, state=tk.DISABLED)
+        self.cancel_button.pack(pady=5)
+        
+        self.status = tk.StringVar(value="Ready")
+        ttk.Label(left_panel, textvariable=self.status, wraplength=200).pack(pady=5)
         
         # Right panel for display
         right_panel = ttk.Frame(self.root, padding="10")
@@ -79,8 +119,61 @@ class KnapsackApp:
         self.plots_frame = ttk.Frame(right_panel)
         self.plots_frame.pack(fill=tk.BOTH, expand=True)
 
+    def poll_events(self):
+        # Handle everything the workers posted since the last poll
+        latest_progress = None
+        while True:
+            try:
+                kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                self.fitness_history.append(payload.best_fitness)
+                latest_progress = payload
+            elif kind == 'problem':
+                self.show_problem(payload)
+            elif kind == 'solved':
+                self.show_solution(*payload)
+                latest_progress = None
+            elif kind == 'instances':
+                self.show_text(payload)
+                self.status.set("Instance files created")
+            elif kind == 'explained':
+                self.show_text(self.format_markdown(payload))
+                self.status.set("Analysis ready")
+            elif kind == 'error':
+                print(payload)
+                self.show_text(payload)
+                self.status.set("Error")
+        
+        # Redraw the fitness plot once per poll, however many generations arrived
+        if latest_progress is not None:
+            self.update_fitness_plot()
+            self.status.set(f"Generation {latest_progress.generation}: "
+                            f"Best Fitness = {latest_progress.best_fitness}")
+        self.root.after(POLL_INTERVAL, self.poll_events)
+
+    def show_text(self, text):
+        self.result_text.delete('1.0', tk.END)
+        self.result_text.insert('1.0', text)
+
+    def on_close(self):
+        self.cancel_event.set()
+        self.ai_executor.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
+
     def generate_problem(self):
+        # Tk variables are read here, on the main thread
         additional_prompt = self.additional_prompt.get()
+        try:
+            capacity = int(self.capacity.get())
+        except ValueError as e:
+            self.events.put(('error', f"Error processing items: {str(e)}"))
+            return
+        self.status.set("Generating problem...")
+        self.ai_executor.submit(self.generate_problem_worker, additional_prompt, capacity)
+
+    def generate_problem_worker(self, additional_prompt, capacity):
         prompt = f"""Create a complex knapsack problem scenario with these requirements:
         1. Write an engaging story about resource optimization
         2. Include 15-20 items with varying properties
@@ -96,24 +189,33 @@ class KnapsackApp:
         
         Additional instruction from user: {additional_prompt}"""
         
-        response = story.generate_content(prompt)
-        problem_text = response.text
+        try:
+            response = self.story_model.generate_content(prompt)
+            problem_text = response.text
+        except Exception as e:
+            self.events.put(('error', f"Error generating problem: {str(e)}"))
+            return
         
         print("\nAI Generated Problem:")
         print("-" * 50)
         print(problem_text)
         
+        self.events.put(('problem', problem_text))
+        self.create_instance_files(problem_text, capacity)
+
+    def show_problem(self, problem_text):
         self.problem_text.delete('1.0', tk.END)
         self.problem_text.insert('1.0', self.format_markdown(problem_text))
-        
-        self.create_instance_files(problem_text)
+        self.status.set("Extracting items...")
 
     def format_markdown(self, text):
         # Simple markdown to plain text conversion
         text = text.replace('**', '').replace('*', '')
         return text
 
-    def create_instance_files(self, problem_text):
+    def create_instance_files(self, problem_text, capacity):
+        # Runs on an AI worker thread; the outcome is posted to the event queue
+        response_text = ""
         prompt = """Extract items from this text and return a clean JSON object in this exact format (no extra text):
         {"items":[{"name":"name","value":1000,"weight":10,"category":"A","risk":5}]}"""
     
@@ -152,7 +254,6 @@ class KnapsackApp:
             risks = [item['risk'] for item in items]
             
             # Create instance files
-            capacity = int(self.capacity.get())
             total_weight = sum(weights)
             
             for i, (items_percent, cap_percent) in enumerate(
@@ -177,20 +278,17 @@ class KnapsackApp:
                 print(f"\nCreated instance file: {filename}")
                 print(f"Items: {num_items}, Capacity: {adjusted_capacity}")
             
-            self.result_text.delete('1.0', tk.END)
-            self.result_text.insert('1.0', 
+            self.events.put(('instances',
                 f"Successfully generated {len(items)} items\n"
                 f"Value range: {min(values)}-{max(values)}\n"
                 f"Weight range: {min(weights)}-{max(weights)}\n"
-                f"Created {i} instance files")
+                f"Created {i} instance files"))
                 
         except Exception as e:
-            error_msg = f"Error processing items: {str(e)}\nResponse: {response_text}"
-            print(error_msg)
-            self.result_text.delete('1.0', tk.END)
-            self.result_text.insert('1.0', error_msg)
+            self.events.put(('error', f"Error processing items: {str(e)}\nResponse: {response_text}"))
 
     def explain_results(self, plot_path, graph_path, data):
+        # Runs on an AI worker thread; the outcome is posted to the event queue
         try:
             # Open and convert images to PIL format
             plot_image = PIL.Image.open(plot_path)
@@ -206,7 +304,7 @@ class KnapsackApp:
             Data: {data}"""
             
             # Send prompt and images to AI
-            response = model.generate_content([prompt, plot_image, graph_image])
+            response = self.explain_model.generate_content([prompt, plot_image, graph_image])
             
             # Display AI response
             explanation = response.text
@@ -214,47 +312,92 @@ class KnapsackApp:
             print("-" * 50)
             print(explanation)
             
-            self.result_text.delete('1.0', tk.END)
-            self.result_text.insert('1.0', self.format_markdown(explanation))
+            self.events.put(('explained', explanation))
             
         except Exception as e:
-            error_msg = f"Error explaining results: {str(e)}"
-            print(error_msg)
-            self.result_text.delete('1.0', tk.END)
-            self.result_text.insert('1.0', error_msg)
+            self.events.put(('error', f"Error explaining results: {str(e)}"))
 
     def solve_problem(self):
-        # Load instance
-        values, weights, capacity = load_knapsack_instance('data/knapsack_instances/instance1.txt')
+        if self.solver_thread is not None and self.solver_thread.is_alive():
+            return
+        try:
+            options = dict(pop_size=int(self.pop_size.get()),
+                           max_generations=int(self.max_gen.get()),
+                           mutation_rate=float(self.mutation_rate.get()))
+        except ValueError as e:
+            self.events.put(('error', f"Error solving problem: {str(e)}"))
+            return
+        
+        # Clear old plots and start an empty fitness plot that fills in as the solver runs
+        for widget in self.plots_frame.winfo_children():
+            widget.destroy()
+        self.fitness_history = []
+        self.fitness_fig, ax1 = plt.subplots(figsize=(6, 4))
+        plot_fitness_history(self.fitness_history, ax=ax1)
+        self.fitness_line = ax1.lines[0]
+        self.fitness_canvas = FigureCanvasTkAgg(self.fitness_fig, self.plots_frame)
+        self.fitness_canvas.draw()
+        self.fitness_canvas.get_tk_widget().pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
-        # Run MBO
-        best_sol, best_fit, fitness_history, diversity_history = main_knapsack_mbo(
-            values, weights, capacity,
-            pop_size=int(self.pop_size.get()),
-            max_generations=int(self.max_gen.get()),
-            mutation_rate=float(self.mutation_rate.get())
-        )
+        self.cancel_event.clear()
+        self.solve_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status.set("Solving...")
+        self.solver_thread = threading.Thread(target=self.solve_worker, args=(options,), daemon=True)
+        self.solver_thread.start()
+
+    def solve_worker(self, options):
+        # Runs on the solver thread; snapshots and the result go through the event queue
+        try:
+            instance = load_knapsack_instance('data/knapsack_instances/instance1.txt')
+            
+            def on_progress(snapshot):
+                self.events.put(('progress', snapshot))
+                return not self.cancel_event.is_set()
+            
+            result = main_knapsack_mbo(instance, verbose=False, return_stats=True,
+                                       progress=on_progress, **options)
+        except Exception as e:
+            self.events.put(('error', f"Error solving problem: {str(e)}"))
+            self.events.put(('solved', (None, None)))
+            return
+        self.events.put(('solved', (instance, result)))
+
+    def cancel_solve(self):
+        # The solver checks the flag after every generation
+        self.cancel_event.set()
+        self.status.set("Cancelling...")
+
+    def update_fitness_plot(self):
+        self.fitness_line.set_data(*downsample_history(self.fitness_history))
+        if len(self.fitness_history) > MAX_MARKERS:
+            self.fitness_line.set_marker(None)
+        ax = self.fitness_line.axes
+        ax.relim()
+        ax.autoscale_view()
+        self.fitness_canvas.draw_idle()
+
+    def show_solution(self, instance, result):
+        self.solve_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        if result is None:
+            return
+        values, weights, capacity = instance
+        best_sol, best_fit, fitness_history, diversity_history, stats = result
+        self.fitness_history = fitness_history
+        self.update_fitness_plot()
         
         # Display results
+        total_weight = sum(w for w, bit in zip(weights, best_sol) if bit)
         result = f"Best Fitness: {best_fit}\n"
         result += f"Best Solution: {best_sol}\n"
-        result += f"Total Weight: {sum(w for w, bit in zip(weights, best_sol) if bit)}"
-        
-        self.result_text.delete('1.0', tk.END)
-        self.result_text.insert('1.0', result)
-        
-        # Clear old plots
-        for widget in self.plots_frame.winfo_children():
-            widget.destroy()
+        result += f"Total Weight: {total_weight}\n"
+        result += f"Stopped By: {stats.stop_reason} after {stats.generations} generations"
+        self.show_text(result)
+        self.status.set(f"Stopped By: {stats.stop_reason}, analysing...")
         
-        # Create new plots
-        fig1, ax1 = plt.subplots(figsize=(6, 4))
-        plot_fitness_history(fitness_history, ax=ax1)
-        canvas1 = FigureCanvasTkAgg(fig1, self.plots_frame)
-        canvas1.draw()
-        canvas1.get_tk_widget().pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         plot_path = 'fitness_history.png'
-        fig1.savefig(plot_path)
+        self.fitness_fig.savefig(plot_path)
         
         fig2, ax2 = plt.subplots(figsize=(6, 4))
         plot_solution(best_sol, values, weights, capacity, ax=ax2)
@@ -268,13 +411,13 @@ class KnapsackApp:
         data = {
             "best_fitness": best_fit,
             "best_solution": best_sol,
-            "total_weight": sum(w for w, bit in zip(weights, best_sol) if bit),
+            "total_weight": total_weight,
             "fitness_history": fitness_history,
             "diversity_history": diversity_history
         }
         
-        # Explain results using AI
-        self.explain_results(plot_path, graph_path, data)
+        # Explain results using AI, concurrently with any problem generation in flight
+        self.ai_executor.submit(self.explain_results, plot_path, graph_path, data)
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,379 @@
+# mbo_bitpacked.py
+
+import random
+import time
+from operator import getitem
+
+from knapsack_instance import as_instance
+
+# Translation tables between 0/1 byte values and the ASCII digits of a binary literal
+_TO_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+_FROM_DIGITS = bytes.maketrans(b'01', b'\x00\x01')
+
+def pack_solution(solution):
+    """
+    Packs a binary solution into a Python int, item i stored in bit i.
+
+    Parameters:
+        solution (list): Binary list representing the solution.
+
+    Returns:
+        int: Packed solution.
+    """
+    if len(solution) == 0:
+        return 0
+    return int(bytes(reversed(solution)).translate(_TO_DIGITS), 2)
+
+def unpack_solution(packed, num_items):
+    """
+    Unpacks a packed solution back into a binary list.
+
+    Parameters:
+        packed (int): Packed solution.
+        num_items (int): Number of items in the knapsack.
+
+    Returns:
+        list: Binary list representing the solution.
+    """
+    if num_items == 0:
+        return []
+    return list(format(packed, f'0{num_items}b')[::-1].encode().translate(_FROM_DIGITS))
+
+def pack_population(population):
+    """
+    Packs every solution of a population.
+
+    Parameters:
+        population (list): List of binary solutions.
+
+    Returns:
+        list: List of packed solutions.
+    """
+    return [pack_solution(sol) for sol in population]
+
+def hamming_distance(packed1, packed2):
+    """
+    Counts the items on which two packed solutions differ.
+
+    Parameters:
+        packed1 (int): First packed solution.
+        packed2 (int): Second packed solution.
+
+    Returns:
+        int: Hamming distance.
+    """
+    return (packed1 ^ packed2).bit_count()
+
+def calculate_diversity_packed(packed_population):
+    """
+    Calculates the average pairwise Hamming distance using XOR and popcount.
+
+    Parameters:
+        packed_population (list): List of packed solutions.
+
+    Returns:
+        float: Average Hamming distance between all pairs.
+    """
+    n = len(packed_population)
+    if n < 2:
+        return 0
+    diversity = 0
+    for i in range(n):
+        a = packed_population[i]
+        for b in packed_population[i + 1:]:
+            diversity += (a ^ b).bit_count()
+    return diversity / (n * (n-1) / 2)
+
+def single_point_crossover_packed(parent1, parent2, num_items):
+    """
+    Performs single-point crossover on packed parents.
+
+    Draws the cut point exactly like ``mbo_core.single_point_crossover``, so
+    both representations produce the same children for the same RNG state.
+
+    Parameters:
+        parent1 (int): First packed parent.
+        parent2 (int): Second packed parent.
+        num_items (int): Number of items in the knapsack.
+
+    Returns:
+        tuple: Two packed child solutions.
+    """
+    point = random.randint(1, num_items - 1)
+    head = (1 << point) - 1
+    tail = ((1 << num_items) - 1) ^ head
+    child1 = (parent1 & head) | (parent2 & tail)
+    child2 = (parent2 & head) | (parent1 & tail)
+    return child1, child2
+
+def mutate_packed(packed, num_items, mutation_rate):
+    """
+    Mutates a packed solution by flipping bits with a given probability.
+
+    Parameters:
+        packed (int): Packed solution.
+        num_items (int): Number of items in the knapsack.
+        mutation_rate (float): Probability of flipping each bit.
+
+    Returns:
+        int: Mutated packed solution.
+    """
+    flips = 0
+    for i in range(num_items):
+        if random.random() < mutation_rate:
+            flips |= 1 << i
+    return packed ^ flips
+
+def migration_phase_packed(packed_population, num_items):
+    """
+    Performs the migration phase on a packed population.
+
+    Parameters:
+        packed_population (list): List of packed solutions.
+        num_items (int): Number of items in the knapsack.
+
+    Returns:
+        list: Migrated packed population.
+    """
+    mid = len(packed_population) // 2
+    subpop_a, subpop_b = packed_population[:mid], packed_population[mid:]
+    migrated = []
+
+    for i in range(len(subpop_a)):
+        child1, child2 = single_point_crossover_packed(subpop_a[i], subpop_b[i % len(subpop_b)], num_items)
+        migrated.extend([child1, child2])
+
+    if len(packed_population) % 2 != 0:
+        migrated.append(packed_population[-1])
+
+    return migrated
+
+def byte_tables(item_values, num_items):
+    """
+    Builds one 256-entry lookup table per byte of a packed solution, holding
+    the sum of ``item_values`` over the items selected by each byte value.
+
+    Parameters:
+        item_values (list): Per-item values or weights.
+        num_items (int): Number of items in the knapsack.
+
+    Returns:
+        list: One table per byte, least significant byte first.
+    """
+    tables = []
+    for start in range(0, num_items, 8):
+        # The bits past the last item never get set
+        chunk = list(item_values[start:start + 8]) + [0] * (start + 8 - num_items)
+        table = [0] * 256
+        for byte in range(1, 256):
+            # A byte's sum is that of the byte without its lowest bit, plus that bit's item
+            low = byte & -byte
+            table[byte] = table[byte ^ low] + chunk[low.bit_length() - 1]
+        tables.append(table)
+    return tables
+
+def packed_sum(packed, tables):
+    """
+    Sums the item values selected by a packed solution, one table lookup per byte.
+
+    Parameters:
+        packed (int): Packed solution.
+        tables (list): Lookup tables from ``byte_tables``.
+
+    Returns:
+        int or float: Sum over the selected items.
+    """
+    return sum(map(getitem, tables, packed.to_bytes(len(tables), 'little')))
+
+def repair_packed(packed, weight, instance):
+    """
+    Repairs a packed solution like ``mbo_core.repair``, removing items in
+    ascending value-to-weight order until it fits.
+
+    Parameters:
+        packed (int): Packed solution.
+        weight (int or float): Its total weight.
+        instance (KnapsackInstance): The knapsack instance.
+
+    Returns:
+        tuple: (feasible packed solution, its total weight).
+    """
+    weights, capacity = instance.weights, instance.capacity
+    if weight <= capacity:
+        return packed, weight
+    for idx in instance.ascending_order:
+        bit = 1 << idx
+        if packed & bit:
+            packed ^= bit
+            weight -= weights[idx]
+            if weight <= capacity:
+                break
+    return packed, weight
+
+def local_search_packed(packed, weight, instance):
+    """
+    Improves a feasible packed solution like ``mbo_core.local_search``,
+    adding every item that still fits in index order.
+
+    Parameters:
+        packed (int): Packed solution.
+        weight (int or float): Its total weight.
+        instance (KnapsackInstance): The knapsack instance.
+
+    Returns:
+        int: Improved packed solution.
+    """
+    values, weights, capacity = instance
+    slack = capacity - weight
+    for i in range(instance.num_items):
+        if slack < instance.min_weight:
+            break
+        if not packed >> i & 1 and weights[i] <= slack and values[i] > 0:
+            packed |= 1 << i
+            slack -= weights[i]
+    return packed
+
+def main_knapsack_mbo_packed(values, weights=None, capacity=None, pop_size=50, max_generations=100, mutation_rate=0.01,
+                             verbose=True, target_fitness=None, time_limit=None, stop_at_optimum=False,
+                             return_stats=False, greedy_fraction=0.0, greedy_noise=0.1, progress=None):
+    """
+    MBO engine on packed solutions with the control flow of ``main_knapsack_mbo``.
+
+    Every solution is a Python int, so crossover and migration are two
+    masks, diversity is an XOR popcount per pair and weights and values are
+    summed one byte at a time from lookup tables. The operators draw the
+    same random numbers as the python engine's defaults, so a seeded run
+    gives the same result on both.
+
+    Parameters:
+        values (list or KnapsackInstance): List of item values, or the whole
+            instance in place of values, weights and capacity.
+        weights (list): List of item weights.
+        capacity (int): Maximum capacity of the knapsack.
+        pop_size (int): Number of solutions in the population.
+        max_generations (int): Number of generations.
+        mutation_rate (float): Minimum per-bit mutation probability.
+        verbose (bool): Print progress for every generation.
+        target_fitness, time_limit, stop_at_optimum, return_stats: Stopping
+            criteria and reporting, as for ``main_knapsack_mbo``.
+        greedy_fraction (float): Share of the initial and re-injected
+            solutions built around the ratio-greedy solution.
+        greedy_noise (float): Probability of skipping each item in those.
+        progress (callable, optional): Per-generation callback, as for
+            ``main_knapsack_mbo``.
+
+    Returns:
+        tuple: (best_solution, best_fitness, fitness_history, diversity_history),
+            followed by a RunStats if return_stats is set.
+    """
+    # mbo_core packs solutions with this module, so it is imported on use
+    from mbo_core import (GenerationSnapshot, RunStats, check_stop, initialize_population, rank_indices, repair,
+                          tournament_indices)
+
+    started = time.perf_counter()
+    instance = as_instance(values, weights, capacity)
+    upper_bound = instance.upper_bound() if stop_at_optimum else None
+    capacity = instance.capacity
+    num_items = instance.num_items
+    value_tables = byte_tables(instance.values, num_items)
+    weight_tables = byte_tables(instance.weights, num_items)
+
+    def evaluate(packed):
+        if packed_sum(packed, weight_tables) > capacity:
+            return 0
+        return packed_sum(packed, value_tables)
+
+    def new_solutions(count):
+        return pack_population(initialize_population(count, num_items, instance, greedy_fraction, greedy_noise))
+
+    population = pack_population([repair(sol, instance) for sol in initialize_population(
+        pop_size, num_items, instance, greedy_fraction, greedy_noise)])
+
+    best_solution = None
+    best_fitness = 0
+    fitness_history = []
+    diversity_history = []
+
+    # Control parameters
+    min_mutation = mutation_rate
+    max_mutation = 0.1
+    stagnation_limit = 20
+    stagnation_counter = 0
+    elite_size = pop_size // 10
+    stop_reason = None
+
+    for generation in range(max_generations):
+        diversity = calculate_diversity_packed(population)
+        diversity_history.append(diversity)
+
+        current_mutation = min_mutation + (max_mutation - min_mutation) * (1 - diversity/1.0)
+
+        fitness_values = [evaluate(sol) for sol in population]
+        current_best = max(fitness_values)
+
+        if current_best > best_fitness:
+            best_fitness = current_best
+            best_solution = population[fitness_values.index(current_best)]
+            stagnation_counter = 0
+        else:
+            stagnation_counter += 1
+
+        fitness_history.append(best_fitness)
+
+        if verbose:
+            print(f"Generation {generation + 1}: Best Fitness = {best_fitness}, Diversity = {diversity:.3f}")
+
+        stop_reason = check_stop(best_fitness, started, target_fitness, time_limit, upper_bound)
+        if progress is not None:
+            snapshot = GenerationSnapshot(generation + 1, best_fitness, diversity, current_mutation,
+                                          time.perf_counter() - started,
+                                          None if best_solution is None else unpack_solution(best_solution, num_items),
+                                          stop_reason)
+            if progress(snapshot) is False:
+                stop_reason = stop_reason or 'cancelled'
+        if stop_reason:
+            break
+
+        # Re-injected solutions are unrepaired and scored when they make the elite
+        refreshed_from = len(population)
+        if stagnation_counter >= stagnation_limit:
+            num_refresh = pop_size // 4
+            if num_refresh:
+                population[-num_refresh:] = new_solutions(num_refresh)
+                refreshed_from = len(population) - num_refresh
+            stagnation_counter = 0
+
+        elite_indices = rank_indices(fitness_values, elite_size)
+        elite = [population[i] for i in elite_indices]
+
+        parents = [population[i] for i in tournament_indices(population, fitness_values)]
+        offspring = []
+        for sol in migration_phase_packed(parents, num_items):
+            sol = mutate_packed(sol, num_items, current_mutation)
+            sol, weight = repair_packed(sol, packed_sum(sol, weight_tables), instance)
+            offspring.append(local_search_packed(sol, weight, instance))
+
+        elite_fitness = [fitness_values[i] if i < refreshed_from else evaluate(population[i])
+                         for i in elite_indices]
+        combined_population = elite + offspring
+        combined_fitness = elite_fitness + [evaluate(sol) for sol in offspring]
+        population = [combined_population[i] for i in rank_indices(combined_fitness, pop_size)]
+
+    if best_solution is None:
+        best_solution = population[0]
+    best_solution = unpack_solution(best_solution, num_items)
+    stats = RunStats(stop_reason or 'max_generations', len(fitness_history),
+                     time.perf_counter() - started, upper_bound)
+
+    if verbose:
+        print("\nOptimization Complete!")
+        print(f"Stopped By: {stats.stop_reason} after {stats.generations} generations")
+        print(f"Best Fitness: {best_fitness}")
+        print(f"Best Solution: {best_solution}")
+        print(f"Final Diversity: {diversity:.3f}")
+        total_weight = sum(w for w, bit in zip(instance.weights, best_solution) if bit)
+        print(f"Total Weight: {total_weight}")
+
+    if return_stats:
+        return best_solution, best_fitness, fitness_history, diversity_history, stats
+    return best_solution, best_fitness, fitness_history, diversity_history
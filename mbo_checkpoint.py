@@ -0,0 +1,149 @@
+# mbo_checkpoint.py
+
+import os
+import pickle
+import random
+import tempfile
+import time
+
+from mbo_bitpacked import pack_population, pack_solution, unpack_solution
+from mbo_core import MBOState
+
+CHECKPOINT_VERSION = 1
+# Generations between checkpoints when neither a count nor an interval is given
+DEFAULT_CHECKPOINT_EVERY = 10
+
+def run_config(instance, **settings):
+    """
+    Describes a run for checking that a checkpoint is resumed with the same settings.
+
+    Parameters:
+        instance (KnapsackInstance): The knapsack instance, recorded by its
+            size, capacity and totals.
+        **settings: Parameters that change the course of the run, such as
+            pop_size and mutation_rate.
+
+    Returns:
+        dict: The description.
+    """
+    return dict(num_items=instance.num_items, capacity=instance.capacity, total_weight=instance.total_weight,
+                total_value=instance.total_value, **settings)
+
+def save_checkpoint(path, state, config=None):
+    """
+    Writes the state of a python-engine run and the ``random`` module state.
+
+    Solutions are stored bit-packed, and the file is written to a temporary
+    file first and then moved over ``path``, so a crash while writing leaves
+    the previous checkpoint intact. The state must be taken between two
+    generations, as ``iter_generations`` hands it to its checkpoint callback.
+
+    Parameters:
+        path (str): File to write.
+        state (MBOState): State to save.
+        config (dict, optional): Run description from ``run_config``.
+    """
+    num_items = len(state.population[0]) if state.population else 0
+    data = {
+        'version': CHECKPOINT_VERSION,
+        'config': config,
+        'random_state': random.getstate(),
+        'num_items': num_items,
+        'pop_size': state.pop_size,
+        'population': pack_population(state.population),
+        'population_totals': state.population_totals,
+        'best_solution': None if state.best_solution is None else pack_solution(state.best_solution),
+        'best_fitness': state.best_fitness,
+        'fitness_history': state.fitness_history,
+        'diversity_history': state.diversity_history,
+        'stagnation_counter': state.stagnation_counter,
+        'generation': state.generation,
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def load_checkpoint(path, config=None):
+    """
+    Reads a checkpoint written by ``save_checkpoint``.
+
+    Parameters:
+        path (str): Checkpoint file.
+        config (dict, optional): Description of the run about to resume; a
+            ValueError is raised if the checkpoint was written with other
+            settings.
+
+    Returns:
+        tuple: (state, random_state) where state is the MBOState and
+            random_state is to be restored with ``random.setstate`` before
+            the run continues.
+    """
+    with open(path, 'rb') as f:
+        data = pickle.load(f)
+    if data.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version {data.get('version')!r} in {path}")
+    if config is not None and data['config'] is not None:
+        changed = [f"{key} {data['config'].get(key)!r} != {value!r}" for key, value in config.items()
+                   if data['config'].get(key) != value]
+        if changed:
+            raise ValueError(f"Checkpoint {path} was written by a different run: {', '.join(changed)}")
+
+    num_items = data['num_items']
+    population = [unpack_solution(packed, num_items) for packed in data['population']]
+    state = MBOState(population, None, data['pop_size'])
+    state.population_totals = data['population_totals']
+    if data['best_solution'] is not None:
+        state.best_solution = unpack_solution(data['best_solution'], num_items)
+    state.best_fitness = data['best_fitness']
+    state.fitness_history = data['fitness_history']
+    state.diversity_history = data['diversity_history']
+    state.stagnation_counter = data['stagnation_counter']
+    state.generation = data['generation']
+    return state, data['random_state']
+
+class Checkpointer:
+    """
+    Checkpoint callback for ``iter_generations`` that saves every ``every``
+    generations or ``interval`` seconds, whichever comes first.
+
+    Attributes:
+        path (str): Checkpoint file.
+        every (int or None): Generations between checkpoints.
+        interval (float or None): Seconds between checkpoints.
+        config (dict or None): Run description stored with each checkpoint.
+        saved (int): Number of checkpoints written.
+    """
+
+    def __init__(self, path, every=None, interval=None, config=None):
+        if every is None and interval is None:
+            every = DEFAULT_CHECKPOINT_EVERY
+        self.path = path
+        self.every = every
+        self.interval = interval
+        self.config = config
+        self.saved = 0
+        self._last_generation = None
+        self._last_time = None
+
+    def __call__(self, state):
+        now = time.perf_counter()
+        if self._last_generation is None:
+            # Nothing new to save at the start of a run
+            self._last_generation, self._last_time = state.generation, now
+            return
+        if ((self.every is not None and state.generation - self._last_generation >= self.every)
+                or (self.interval is not None and now - self._last_time >= self.interval)):
+            self.save(state)
+
+    def save(self, state):
+        """Writes a checkpoint now."""
+        save_checkpoint(self.path, state, self.config)
+        self.saved += 1
+        self._last_generation, self._last_time = state.generation, time.perf_counter()
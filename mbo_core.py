@@ -1,6 +1,16 @@
 # mbo_core.py
 
+import math
+import os
 import random
+import time
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+from itertools import compress, islice, repeat
+from operator import add, ne
+
+from knapsack_instance import KnapsackInstance, as_instance
+from mbo_bitpacked import pack_solution
 
 def generate_random_solution(num_items):
     """
@@ -14,46 +24,145 @@ def generate_random_solution(num_items):
     """
     return [random.randint(0, 1) for _ in range(num_items)]
 
-def initialize_population(pop_size, num_items):
+def generate_greedy_solution(instance, noise=0.1):
+    """
+    Generates a feasible solution around the ratio-greedy one.
+    
+    Items are visited in greedy order, each skipped with probability ``noise``,
+    and packed while they fit. Half of the solutions pack the LP break item
+    first, so the population covers both sides of the LP solution.
+    
+    Parameters:
+        instance (KnapsackInstance): The knapsack instance.
+        noise (float): Probability of skipping each item.
+    
+    Returns:
+        list: A feasible binary solution.
+    """
+    weights, values = instance.weights, instance.values
+    solution = [0] * instance.num_items
+    slack = instance.capacity
+    if random.random() < 0.5 and instance.break_index < instance.num_items:
+        break_item = instance.greedy_order[instance.break_index]
+        if weights[break_item] <= slack:
+            solution[break_item] = 1
+            slack -= weights[break_item]
+    for i in instance.greedy_order:
+        if slack < instance.min_weight:
+            break
+        if not solution[i] and weights[i] <= slack and values[i] > 0 and random.random() >= noise:
+            solution[i] = 1
+            slack -= weights[i]
+    return solution
+
+def initialize_population(pop_size, num_items, instance=None, greedy_fraction=0.0, greedy_noise=0.1):
     """
-    Initializes the population with random solutions.
+    Initializes the population with random solutions, optionally seeded with greedy ones.
     
     Parameters:
         pop_size (int): Number of solutions in the population.
         num_items (int): Number of items in the knapsack.
+        instance (KnapsackInstance, optional): Needed for greedy seeding.
+        greedy_fraction (float): Share of the population built with
+            ``generate_greedy_solution``; the rest is uniformly random.
+        greedy_noise (float): Skip probability passed to ``generate_greedy_solution``.
     
     Returns:
-        list: A list of binary solutions.
+        list: A list of binary solutions. Random ones may need repair.
     """
-    return [generate_random_solution(num_items) for _ in range(pop_size)]
+    num_seeded = round(pop_size * greedy_fraction) if instance is not None else 0
+    return ([generate_greedy_solution(instance, greedy_noise) for _ in range(num_seeded)]
+            + [generate_random_solution(num_items) for _ in range(pop_size - num_seeded)])
 
-def fitness(solution, values, weights, capacity):
+def fitness(solution, values, weights=None, capacity=None):
     """
     Evaluates the fitness of a solution.
     
     Parameters:
         solution (list): Binary list representing the solution.
-        values (list): List of item values.
+        values (list or KnapsackInstance): List of item values, or the whole
+            instance in place of values, weights and capacity.
         weights (list): List of item weights.
         capacity (int): Maximum capacity of the knapsack.
     
     Returns:
         int: Total value if feasible, else 0.
     """
-    total_value = sum(v for v, bit in zip(values, solution) if bit)
-    total_weight = sum(w for w, bit in zip(weights, solution) if bit)
+    if isinstance(values, KnapsackInstance):
+        instance = values
+        values, weights, capacity = instance
+        total_value = sum(compress(values, solution))
+        # Nothing to weigh if all items fit together
+        if instance.total_weight <= capacity:
+            return total_value
+    else:
+        total_value = sum(v for v, bit in zip(values, solution) if bit)
+    total_weight = sum(compress(weights, solution))
     if total_weight > capacity:
         return 0
     else:
         return total_value
 
-def repair(solution, weights, capacity, values):
+class FitnessCache:
+    """
+    Size-capped LRU cache of fitness values keyed by the bit-packed solution.
+
+    Calling the cache evaluates a solution like ``fitness`` and remembers the
+    result; ``hits`` and ``misses`` count how often an evaluation was saved.
+    """
+
+    def __init__(self, values, weights=None, capacity=None, max_size=10000):
+        self.instance = as_instance(values, weights, capacity)
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, solution):
+        key = pack_solution(solution)
+        entries = self.entries
+        if key in entries:
+            self.hits += 1
+            entries.move_to_end(key)
+            return entries[key]
+        self.misses += 1
+        value = fitness(solution, self.instance)
+        entries[key] = value
+        if len(entries) > self.max_size:
+            entries.popitem(last=False)
+        return value
+
+    def __len__(self):
+        return len(self.entries)
+
+def remove_duplicates(population, *columns):
+    """
+    Drops repeated solutions, keeping the first occurrence of each.
+
+    Parameters:
+        population (list): List of binary solutions.
+        *columns (list): Lists parallel to the population, such as fitness values.
+
+    Returns:
+        tuple: (unique population, *filtered columns)
+    """
+    seen = set()
+    keep = []
+    for i, sol in enumerate(population):
+        key = pack_solution(sol)
+        if key not in seen:
+            seen.add(key)
+            keep.append(i)
+    return tuple([column[i] for i in keep] for column in (population,) + columns)
+
+def repair(solution, weights, capacity=None, values=None):
     """
     Repairs an infeasible solution by removing items until it's feasible.
     
     Parameters:
         solution (list): Binary list representing the solution.
-        weights (list): List of item weights.
+        weights (list or KnapsackInstance): List of item weights, or the whole
+            instance in place of weights, capacity and values.
         capacity (int): Maximum capacity of the knapsack.
         values (list): List of item values.
     
@@ -61,6 +170,10 @@ def repair(solution, weights, capacity, values):
         list: A feasible binary solution.
     """
     repaired = solution.copy()
+    if isinstance(weights, KnapsackInstance):
+        repair_in_place(repaired, weights)
+        return repaired
+
     total_weight = sum(w for w, bit in zip(weights, repaired) if bit)
     
     if total_weight <= capacity:
@@ -79,6 +192,32 @@ def repair(solution, weights, capacity, values):
             break
     return repaired
 
+def repair_in_place(solution, instance):
+    """
+    Repairs a solution like ``repair``, overwriting it instead of copying it.
+    
+    Parameters:
+        solution (list): Binary list representing the solution, modified in place.
+        instance (KnapsackInstance): The knapsack instance.
+    
+    Returns:
+        int: Number of items removed.
+    """
+    weights, capacity = instance.weights, instance.capacity
+    total_weight = sum(compress(weights, solution))
+    if total_weight <= capacity:
+        return 0
+    # Same removal order as sorting the selected items, without the sort
+    removed = 0
+    for idx in instance.ascending_order:
+        if solution[idx]:
+            solution[idx] = 0
+            removed += 1
+            total_weight -= weights[idx]
+            if total_weight <= capacity:
+                break
+    return removed
+
 def split_population(population):
     """
     Splits the population into two subpopulations.
@@ -110,6 +249,41 @@ def single_point_crossover(parent1, parent2):
     child2 = parent2[:point] + parent1[point:]
     return child1, child2
 
+def single_point_crossover_into(parent1, parent2, child1, child2):
+    """
+    Performs ``single_point_crossover``, writing the children over two
+    existing solutions instead of building new lists. Draws the same cut
+    point, so the children are the same for the same RNG state.
+    
+    Parameters:
+        parent1 (list): First parent solution.
+        parent2 (list): Second parent solution.
+        child1 (list): Solution overwritten with the first child.
+        child2 (list): Solution overwritten with the second child.
+    """
+    if len(parent1) != len(parent2):
+        raise ValueError("Parents must be of same length")
+    point = random.randint(1, len(parent1) - 1)
+    child1[:] = parent1
+    child1[point:] = parent2[point:]
+    child2[:] = parent2
+    child2[point:] = parent1[point:]
+
+def migration_phase_into(population, out):
+    """
+    Performs ``migration_phase``, writing the migrated population over the
+    solutions of ``out``, which must be as long as ``population``.
+    
+    Parameters:
+        population (list): The current population.
+        out (list): Solutions to overwrite, none of them shared with population.
+    """
+    subpop_a, subpop_b = split_population(population)
+    for i in range(len(subpop_a)):
+        single_point_crossover_into(subpop_a[i], subpop_b[i % len(subpop_b)], out[2 * i], out[2 * i + 1])
+    if len(population) % 2 != 0:
+        out[-1][:] = population[-1]
+
 def migration_phase(population):
     """
     Performs the migration phase using crossover between subpopulations.
@@ -136,37 +310,102 @@ def migration_phase(population):
     
     return migrated
 
-def mutate(solution, mutation_rate):
+def mutate(solution, mutation_rate, geometric=False):
     """
     Mutates a solution by flipping bits with a given probability.
     
     Parameters:
         solution (list): Binary solution to mutate.
         mutation_rate (float): Probability of flipping each bit.
+        geometric (bool): Draw the flipped positions with ``flip_positions``,
+            in time proportional to the number of flips, instead of one
+            random number per bit. Same flip distribution, different draws.
     
     Returns:
         list: Mutated solution.
     """
     mutated = solution.copy()
-    for i in range(len(mutated)):
-        if random.random() < mutation_rate:
-            mutated[i] = 1 - mutated[i]  # Flip bit
+    mutate_in_place(mutated, mutation_rate, geometric)
     return mutated
 
-def local_search(solution, values, weights, capacity):
+def flip_positions(num_items, mutation_rate):
+    """
+    Yields the positions to flip when each of ``num_items`` bits flips
+    independently with probability ``mutation_rate``.
+    
+    The gap before the next flip is geometrically distributed, so it is
+    drawn directly with one random number per flip instead of testing every
+    bit; the positions have exactly the distribution of per-bit draws.
+    
+    Parameters:
+        num_items (int): Number of bits.
+        mutation_rate (float): Probability of flipping each bit.
+    
+    Yields:
+        int: Positions to flip, in increasing order.
+    """
+    if mutation_rate <= 0:
+        return
+    if mutation_rate >= 1:
+        yield from range(num_items)
+        return
+    log_keep = math.log(1.0 - mutation_rate)
+    i = -1
+    while True:
+        # Bits skipped before the next flip: floor(log(U) / log(1 - p)) with U in (0, 1]
+        i += 1 + int(math.log(1.0 - random.random()) / log_keep)
+        if i >= num_items:
+            return
+        yield i
+
+def mutate_in_place(solution, mutation_rate, geometric=False):
+    """
+    Mutates a solution like ``mutate``, overwriting it instead of copying it.
+    
+    Parameters:
+        solution (list): Binary solution, modified in place.
+        mutation_rate (float): Probability of flipping each bit.
+        geometric (bool): Sample the flipped positions, see ``mutate``.
+    
+    Returns:
+        int: Number of bits flipped.
+    """
+    flips = 0
+    if geometric:
+        for i in flip_positions(len(solution), mutation_rate):
+            solution[i] = 1 - solution[i]
+            flips += 1
+        return flips
+    for i in range(len(solution)):
+        if random.random() < mutation_rate:
+            solution[i] = 1 - solution[i]  # Flip bit
+            flips += 1
+    return flips
+
+# 'add' adds items in index order while they fit; 'swap' fills in ratio order
+# and then swaps selected items for more valuable unselected ones
+LOCAL_SEARCH_MODES = ('add', 'swap')
+
+def local_search(solution, values, weights=None, capacity=None, mode='add'):
     """
     Applies local search to improve a solution by adding items.
     
     Parameters:
         solution (list): Binary solution to improve.
-        values (list): List of item values.
+        values (list or KnapsackInstance): List of item values, or the whole
+            instance in place of values, weights and capacity.
         weights (list): List of item weights.
         capacity (int): Maximum capacity of the knapsack.
+        mode (str): One of LOCAL_SEARCH_MODES, see ``local_search_in_place``.
     
     Returns:
         list: Improved solution.
     """
     improved = solution.copy()
+    if isinstance(values, KnapsackInstance) or mode != 'add':
+        local_search_in_place(improved, as_instance(values, weights, capacity), mode)
+        return improved
+
     current_value = sum(v for v, bit in zip(values, improved) if bit)
     current_weight = sum(w for w, bit in zip(weights, improved) if bit)
     
@@ -182,29 +421,379 @@ def local_search(solution, values, weights, capacity):
                     current_weight = new_weight
     return improved
 
-def mutate_and_search(population, mutation_rate, values, weights, capacity):
+def local_search_in_place(solution, instance, mode='add'):
+    """
+    Improves a solution like ``local_search``, overwriting it instead of copying it.
+    
+    Parameters:
+        solution (list): Binary solution, modified in place.
+        instance (KnapsackInstance): The knapsack instance.
+        mode (str): 'add' adds every item that still fits, in index order.
+            'swap' adds them in descending ratio order instead and then
+            makes improving swap moves, see ``_swap_search``.
+    
+    Returns:
+        int: Number of items added, or of add and swap moves made.
+    """
+    values, weights, capacity = instance
+    slack = capacity - sum(compress(weights, solution))
+    if mode == 'swap':
+        return _swap_search(solution, instance, slack)[0]
+    added = 0
+    # Adding an item improves the value exactly when the item is worth something
+    for i in range(len(solution)):
+        if slack < instance.min_weight:
+            break
+        if solution[i] == 0 and weights[i] <= slack and values[i] > 0:
+            solution[i] = 1
+            slack -= weights[i]
+            added += 1
+    return added
+
+def _best_fitting(solution, values, index, limit, floor):
+    """
+    Returns the most valuable unselected item weighing at most ``limit`` and
+    worth more than ``floor``, or None.
+
+    Only the items of the best_before chain of ``KnapsackInstance.weight_index``
+    are visited: an item off the chain is outvalued by a lighter one on it,
+    so it is only missed when that lighter item is already selected.
+    """
+    sorted_weights, weight_order, best_before = index
+    k = bisect_right(sorted_weights, limit)
+    p = best_before[k - 1] if k else -1
+    while p >= 0:
+        j = weight_order[p]
+        if values[j] <= floor:
+            return None
+        if not solution[j]:
+            return j
+        p = best_before[p - 1] if p else -1
+    return None
+
+def _swap_search(solution, instance, slack):
+    """
+    Fills a feasible solution in descending ratio order, then swaps selected
+    items for more valuable unselected ones that fit in their place, adding
+    items again whenever a swap frees capacity, until a pass of fill and
+    swaps improves nothing.
+
+    Selected items are tried worst ratio first, and each move is found with
+    a bisection of the sorted weights instead of a scan of all items.
+
+    Parameters:
+        solution (list): Binary solution, modified in place.
+        instance (KnapsackInstance): The knapsack instance.
+        slack (int): Unused capacity of the solution.
+
+    Returns:
+        tuple: (moves made, remaining slack, value gained)
+    """
+    if slack < 0:
+        return 0, slack, 0
+    values, weights = instance.values, instance.weights
+    min_weight = instance.min_weight
+    index = instance.weight_index()
+    moves = gain = 0
+    improved = True
+    while improved:
+        # A full pass, since the chain lookups below can miss items that still fit
+        for i in instance.greedy_order:
+            if slack < min_weight:
+                break
+            if not solution[i] and weights[i] <= slack and values[i] > 0:
+                solution[i] = 1
+                slack -= weights[i]
+                gain += values[i]
+                moves += 1
+        improved = False
+        for i in instance.ascending_order:
+            if not solution[i]:
+                continue
+            j = _best_fitting(solution, values, index, slack + weights[i], values[i])
+            if j is None:
+                continue
+            solution[i], solution[j] = 0, 1
+            slack += weights[i] - weights[j]
+            gain += values[j] - values[i]
+            moves += 1
+            improved = True
+            while slack >= min_weight:
+                j = _best_fitting(solution, values, index, slack, 0)
+                if j is None:
+                    break
+                solution[j] = 1
+                slack -= weights[j]
+                gain += values[j]
+                moves += 1
+    return moves, slack, gain
+
+def mutate_and_search(population, mutation_rate, values, weights=None, capacity=None, profile=None,
+                      geometric=False, local_search_mode='add'):
     """
     Applies mutation and local search to the population.
     
     Parameters:
         population (list): Current population.
         mutation_rate (float): Mutation probability.
-        values (list): List of item values.
+        values (list or KnapsackInstance): List of item values, or the whole
+            instance in place of values, weights and capacity.
         weights (list): List of item weights.
         capacity (int): Maximum capacity of the knapsack.
+        profile (PhaseProfile, optional): Counts flips, repairs and improvements.
+        geometric (bool): Sample the flipped positions, see ``mutate``.
+        local_search_mode (str): One of LOCAL_SEARCH_MODES.
     
     Returns:
         list: Population after mutation and local search.
     """
+    instance = as_instance(values, weights, capacity)
     new_population = []
     for sol in population:
-        mutated = mutate(sol, mutation_rate)
-        repaired = repair(mutated, weights, capacity, values)
-        searched = local_search(repaired, values, weights, capacity)
+        mutated = mutate(sol, mutation_rate, geometric)
+        repaired = repair(mutated, instance)
+        searched = local_search(repaired, instance, mode=local_search_mode)
+        if profile is not None:
+            profile.count_variation(sol, mutated, repaired, searched)
         new_population.append(searched)
     return new_population
 
-def select_next_generation(population, fitness_values, pop_size):
+def solution_totals(solution, instance):
+    """
+    Sums the weight and value of the items selected by a solution.
+
+    Parameters:
+        solution (list): Binary list representing the solution.
+        instance (KnapsackInstance): The knapsack instance.
+
+    Returns:
+        tuple: (total_weight, total_value)
+    """
+    return sum(compress(instance.weights, solution)), sum(compress(instance.values, solution))
+
+def single_point_crossover_delta(parent1, parent2, totals1, totals2, instance):
+    """
+    Single-point crossover that also derives the children's totals.
+
+    Only the shorter side of the cut point is summed; the other side follows
+    from the parents' totals. Draws the cut point like ``single_point_crossover``.
+
+    Parameters:
+        parent1 (list): First parent solution.
+        parent2 (list): Second parent solution.
+        totals1 (tuple): (weight, value) of the first parent.
+        totals2 (tuple): (weight, value) of the second parent.
+        instance (KnapsackInstance): The knapsack instance.
+
+    Returns:
+        tuple: (child1, child2, child1 totals, child2 totals)
+    """
+    num_items = len(parent1)
+    if num_items != len(parent2):
+        raise ValueError("Parents must be of same length")
+    point = random.randint(1, num_items - 1)
+    child1 = parent1[:point] + parent2[point:]
+    child2 = parent2[:point] + parent1[point:]
+
+    weights, values = instance.weights, instance.values
+    if point <= num_items - point:
+        # Heads are summed, tails are the remainder of each parent
+        w1, v1 = sum(compress(weights, parent1[:point])), sum(compress(values, parent1[:point]))
+        w2, v2 = sum(compress(weights, parent2[:point])), sum(compress(values, parent2[:point]))
+        totals_child1 = (w1 + totals2[0] - w2, v1 + totals2[1] - v2)
+        totals_child2 = (w2 + totals1[0] - w1, v2 + totals1[1] - v1)
+    else:
+        # Tails are summed and swapped between the parents
+        w1 = sum(compress(islice(weights, point, None), parent1[point:]))
+        v1 = sum(compress(islice(values, point, None), parent1[point:]))
+        w2 = sum(compress(islice(weights, point, None), parent2[point:]))
+        v2 = sum(compress(islice(values, point, None), parent2[point:]))
+        totals_child1 = (totals1[0] - w1 + w2, totals1[1] - v1 + v2)
+        totals_child2 = (totals2[0] - w2 + w1, totals2[1] - v2 + v1)
+    return child1, child2, totals_child1, totals_child2
+
+def migration_phase_delta(population, population_totals, instance):
+    """
+    Performs the migration phase, carrying each child's totals.
+
+    Parameters:
+        population (list): The current population.
+        population_totals (list): (weight, value) of each solution.
+        instance (KnapsackInstance): The knapsack instance.
+
+    Returns:
+        tuple: (migrated population, their totals)
+    """
+    mid = len(population) // 2
+    migrated = []
+    migrated_totals = []
+
+    for i in range(mid):
+        j = mid + i % (len(population) - mid)
+        child1, child2, totals1, totals2 = single_point_crossover_delta(
+            population[i], population[j], population_totals[i], population_totals[j], instance)
+        migrated.extend([child1, child2])
+        migrated_totals.extend([totals1, totals2])
+
+    if len(population) % 2 != 0:
+        migrated.append(population[-1])
+        migrated_totals.append(population_totals[-1])
+
+    return migrated, migrated_totals
+
+def mutate_delta(solution, mutation_rate, totals, instance, geometric=False):
+    """
+    Mutates a solution like ``mutate``, adjusting its totals per flipped bit.
+
+    Parameters:
+        solution (list): Binary solution to mutate.
+        mutation_rate (float): Probability of flipping each bit.
+        totals (tuple): (weight, value) of the solution.
+        instance (KnapsackInstance): The knapsack instance.
+        geometric (bool): Sample the flipped positions, see ``mutate``.
+
+    Returns:
+        tuple: (mutated solution, its totals)
+    """
+    weights, values = instance.weights, instance.values
+    mutated = solution.copy()
+    weight, value = totals
+    if geometric:
+        positions = flip_positions(len(mutated), mutation_rate)
+    else:
+        positions = (i for i in range(len(mutated)) if random.random() < mutation_rate)
+    for i in positions:
+        if mutated[i]:
+            mutated[i] = 0
+            weight -= weights[i]
+            value -= values[i]
+        else:
+            mutated[i] = 1
+            weight += weights[i]
+            value += values[i]
+    return mutated, (weight, value)
+
+def repair_delta(solution, totals, instance):
+    """
+    Repairs a solution like ``repair``, using and updating its known totals.
+
+    Parameters:
+        solution (list): Binary list representing the solution.
+        totals (tuple): (weight, value) of the solution.
+        instance (KnapsackInstance): The knapsack instance.
+
+    Returns:
+        tuple: (feasible solution, its totals)
+    """
+    weight, value = totals
+    if weight <= instance.capacity:
+        return solution.copy(), totals
+    weights, values = instance.weights, instance.values
+    repaired = solution.copy()
+    for idx in instance.ascending_order:
+        if repaired[idx]:
+            repaired[idx] = 0
+            weight -= weights[idx]
+            value -= values[idx]
+            if weight <= instance.capacity:
+                break
+    return repaired, (weight, value)
+
+def local_search_delta(solution, totals, instance, mode='add'):
+    """
+    Improves a solution like ``local_search``, using and updating its known totals.
+
+    Parameters:
+        solution (list): Binary solution to improve.
+        totals (tuple): (weight, value) of the solution.
+        instance (KnapsackInstance): The knapsack instance.
+        mode (str): One of LOCAL_SEARCH_MODES.
+
+    Returns:
+        tuple: (improved solution, its totals)
+    """
+    weights, values = instance.weights, instance.values
+    improved = solution.copy()
+    weight, value = totals
+    slack = instance.capacity - weight
+    if mode == 'swap':
+        _, slack, gain = _swap_search(improved, instance, slack)
+        return improved, (instance.capacity - slack, value + gain)
+    for i in range(len(improved)):
+        if slack < instance.min_weight:
+            break
+        if improved[i] == 0 and weights[i] <= slack and values[i] > 0:
+            improved[i] = 1
+            slack -= weights[i]
+            value += values[i]
+    return improved, (instance.capacity - slack, value)
+
+def mutate_and_search_delta(population, population_totals, mutation_rate, instance, profile=None, geometric=False,
+                            local_search_mode='add'):
+    """
+    Applies mutation, repair and local search, carrying each solution's totals.
+
+    Parameters:
+        population (list): Current population.
+        population_totals (list): (weight, value) of each solution.
+        mutation_rate (float): Mutation probability.
+        instance (KnapsackInstance): The knapsack instance.
+        profile (PhaseProfile, optional): Counts flips, repairs and improvements.
+        geometric (bool): Sample the flipped positions, see ``mutate``.
+        local_search_mode (str): One of LOCAL_SEARCH_MODES.
+
+    Returns:
+        tuple: (new population, their totals)
+    """
+    new_population = []
+    new_totals = []
+    for sol, totals in zip(population, population_totals):
+        mutated, totals = mutate_delta(sol, mutation_rate, totals, instance, geometric)
+        repaired, totals = repair_delta(mutated, totals, instance)
+        searched, totals = local_search_delta(repaired, totals, instance, local_search_mode)
+        if profile is not None:
+            profile.count_variation(sol, mutated, repaired, searched)
+        new_population.append(searched)
+        new_totals.append(totals)
+    return new_population, new_totals
+
+# Lists at least this long are ranked by partition instead of a full sort
+PARTIAL_SELECTION_MIN = 512
+
+def rank_indices(fitness_values, count):
+    """
+    Returns the indices of the ``count`` fittest solutions, best first.
+
+    Ties keep their original order, matching ``select_next_generation``.
+    """
+    return _partial_order(fitness_values, count, best=True)
+
+def worst_indices(fitness_values, count):
+    """
+    Returns the indices of the ``count`` least fit solutions, worst first.
+
+    Ties keep their original order.
+    """
+    return _partial_order(fitness_values, count, best=False)
+
+def _partial_order(fitness_values, count, best):
+    """
+    Orders the ``count`` best (or worst) fitness values without sorting them all.
+
+    Short lists are sorted, which is faster than anything else in Python;
+    from PARTIAL_SELECTION_MIN values on, ``mbo_numpy.top_indices`` finds the
+    cut-off with an O(n) partition and only sorts the selected indices.
+    Both give the same result.
+    """
+    num = len(fitness_values)
+    if num < PARTIAL_SELECTION_MIN:
+        return sorted(range(num), key=fitness_values.__getitem__, reverse=best)[:max(count, 0)]
+    import numpy as np
+    from mbo_numpy import top_indices
+    keys = np.asarray(fitness_values)
+    return top_indices(keys if best else -keys, count).tolist()
+
+def select_next_generation(population, fitness_values, pop_size, allele_counts=None):
     """
     Selects the top solutions to form the next generation.
     
@@ -212,120 +801,900 @@ def select_next_generation(population, fitness_values, pop_size):
         population (list): Combined population.
         fitness_values (list): Fitness values of the combined population.
         pop_size (int): Desired population size.
+        allele_counts (AlleleCounts, optional): Tracker of the current population,
+            updated in place to describe the selected one.
     
     Returns:
         list: Selected next generation population.
     """
-    # Combine population and fitness
-    combined = list(zip(population, fitness_values))
-    # Sort based on fitness in descending order
-    combined.sort(key=lambda x: x[1], reverse=True)
-    # Select top pop_size solutions
-    selected = [sol for sol, fit in combined[:pop_size]]
+    # Select top pop_size solutions by descending fitness
+    selected = [population[i] for i in rank_indices(fitness_values, pop_size)]
+    if allele_counts is not None:
+        allele_counts.update(selected)
     return selected
 
+class AlleleCounts:
+    """
+    Tracks how many solutions of a population select each item.
+
+    The average pairwise Hamming distance only depends on these counts:
+    a locus where c of n solutions hold a 1 contributes c * (n - c)
+    differing pairs. Members are remembered as a multiset so that moving to
+    a new population only touches the solutions that actually changed.
+    """
+
+    def __init__(self, population, num_items=None):
+        if num_items is None:
+            num_items = len(population[0]) if population else 0
+        self.counts = [0] * num_items
+        self.members = Counter()
+        self.size = 0
+        for sol in population:
+            self.add(sol)
+
+    def add(self, solution):
+        """Adds one solution to the tracked population."""
+        counts = self.counts
+        for i in compress(range(len(counts)), solution):
+            counts[i] += 1
+        self.members[tuple(solution)] += 1
+        self.size += 1
+
+    def remove(self, solution):
+        """Removes one solution from the tracked population."""
+        counts = self.counts
+        for i in compress(range(len(counts)), solution):
+            counts[i] -= 1
+        key = tuple(solution)
+        self.members[key] -= 1
+        if not self.members[key]:
+            del self.members[key]
+        self.size -= 1
+
+    def update(self, population):
+        """Moves the tracker to a new population, touching only the solutions that changed."""
+        incoming = Counter(tuple(sol) for sol in population)
+        for key, count in (self.members - incoming).items():
+            for _ in range(count):
+                self.remove(key)
+        for key, count in (incoming - self.members).items():
+            for _ in range(count):
+                self.add(key)
+
+    def diversity(self):
+        """Returns the average pairwise Hamming distance of the tracked population."""
+        n = self.size
+        if n < 2:
+            return 0
+        return sum(c * (n - c) for c in self.counts) / (n * (n-1) / 2)
+
+def count_alleles_into(counts, population):
+    """
+    Overwrites ``counts`` with how many solutions of the population select
+    each item, without the per-solution tuples AlleleCounts keeps.
+    """
+    counts[:] = repeat(0, len(counts))
+    for sol in population:
+        counts[:] = map(add, counts, sol)
+    return counts
+
 def calculate_diversity(population):
-    """Calculate population diversity using Hamming distance"""
+    """Calculate population diversity as the average pairwise Hamming distance, from per-item counts"""
     if not population:
         return 0
     n = len(population)
-    diversity = 0
-    for i in range(n):
-        for j in range(i + 1, n):
-            diversity += sum(a != b for a, b in zip(population[i], population[j]))
-    return diversity / (n * (n-1) / 2) if n > 1 else 0
+    if n < 2:
+        return 0
+    counts = [sum(column) for column in zip(*population)]
+    return sum(c * (n - c) for c in counts) / (n * (n-1) / 2)
+
+def tournament_indices(population, fitness_values, tournament_size=5, count=None):
+    """Return the index of each tournament winner, one tournament per population slot (or ``count`` tournaments)"""
+    winners = []
+    for _ in range(len(population) if count is None else count):
+        tournament = random.sample(range(len(population)), tournament_size)
+        winners.append(max(tournament, key=lambda x: fitness_values[x]))
+    return winners
+
+def batch_tournament_indices(fitness_values, count=None, tournament_size=5):
+    """
+    Runs all tournaments from one batch of contestants drawn up front.
+
+    Contestants are drawn with replacement, so a solution may meet itself;
+    in exchange the draws are a single ``random.choices`` call and each
+    winner is a slice maximum, about four times faster than
+    ``tournament_indices`` but a different random stream.
+
+    Parameters:
+        fitness_values (list): Fitness of each solution.
+        count (int, optional): Number of tournaments, one per solution by default.
+        tournament_size (int): Contestants per tournament.
+
+    Returns:
+        list: Index of each tournament winner; the first of equally fit contestants wins.
+    """
+    num = len(fitness_values)
+    if count is None:
+        count = num
+    contestants = random.choices(range(num), k=count * tournament_size)
+    scores = list(map(fitness_values.__getitem__, contestants))
+    winners = []
+    for start in range(0, len(scores), tournament_size):
+        block = scores[start:start + tournament_size]
+        winners.append(contestants[start + block.index(max(block))])
+    return winners
 
 def tournament_selection(population, fitness_values, tournament_size=5):
     """Select parents using tournament selection"""
-    selected = []
-    for _ in range(len(population)):
-        tournament = random.sample(range(len(population)), tournament_size)
-        winner = max(tournament, key=lambda x: fitness_values[x])
-        selected.append(population[winner].copy())
-    return selected
+    return [population[i].copy() for i in tournament_indices(population, fitness_values, tournament_size)]
 
-def main_knapsack_mbo(values, weights, capacity, pop_size=50, max_generations=100, mutation_rate=0.01, verbose=True):
-    """Enhanced MBO with adaptive mechanisms and diversity preservation"""
-    num_items = len(values)
-    population = initialize_population(pop_size, num_items)
-    population = [repair(sol, weights, capacity, values) for sol in population]
-    
-    best_solution = None
-    best_fitness = 0
-    fitness_history = []
-    diversity_history = []
+ENGINES = ('python', 'numpy', 'packed')
+
+class MBOState:
+    """
+    Everything the python engine carries from one generation to the next.
+
+    Attributes:
+        population (list): Current population.
+        population_totals (list or None): (weight, value) of each solution when
+            delta evaluation is used, else None.
+        pop_size (int): Target population size.
+        best_solution (list): Best solution found so far.
+        best_fitness (int): Fitness of the best solution.
+        fitness_history (list): Best fitness after each generation.
+        diversity_history (list): Population diversity at each generation.
+        stagnation_counter (int): Generations since the best fitness improved.
+        generation (int): Number of generations run so far.
+        stop_reason (str or None): Criterion that ended the last call to
+            ``run_generations`` early, if any.
+    """
+
+    def __init__(self, population, instance, pop_size=None, delta_evaluation=False):
+        self.population = population
+        self.population_totals = ([solution_totals(sol, instance) for sol in population]
+                                  if delta_evaluation else None)
+        self.pop_size = len(population) if pop_size is None else pop_size
+        self.best_solution = None
+        self.best_fitness = 0
+        self.fitness_history = []
+        self.diversity_history = []
+        self.stagnation_counter = 0
+        self.generation = 0
+        self.stop_reason = None
+
+STOP_REASONS = ('max_generations', 'optimal', 'target_fitness', 'time_limit', 'node_limit', 'cancelled')
+
+class RunStats:
+    """
+    Summary of a finished run, returned by ``main_knapsack_mbo(return_stats=True)``.
+
+    Attributes:
+        stop_reason (str): Criterion that ended the run, one of STOP_REASONS.
+        generations (int): Number of generations run, always the length of
+            the fitness history; 1 for the exact solvers.
+        elapsed (float): Wall-clock seconds spent in the run.
+        upper_bound (int or None): Dantzig bound of the instance, when it was
+            computed for the proven-optimal stop.
+        profile (PhaseProfile or None): Phase timers and counters, when the
+            run was profiled.
+    """
+
+    def __init__(self, stop_reason='max_generations', generations=0, elapsed=0.0, upper_bound=None, profile=None):
+        self.stop_reason = stop_reason
+        self.generations = generations
+        self.elapsed = elapsed
+        self.upper_bound = upper_bound
+        self.profile = profile
+
+    def __repr__(self):
+        return (f"RunStats(stop_reason={self.stop_reason!r}, generations={self.generations}, "
+                f"elapsed={self.elapsed:.3f})")
+
+PHASES = ('diversity', 'evaluation', 'reinjection', 'elite', 'tournament_selection', 'migration_phase',
+          'mutate_and_search', 'repair', 'deduplicate', 'select_next_generation')
+
+class PhaseProfile:
+    """
+    Wall time per generation phase and operator counters of a python-engine
+    run, collected when ``main_knapsack_mbo`` is called with ``profile=True``.
+
+    Attributes:
+        times (dict): Seconds spent in each of PHASES. 'repair' is the
+            repair pass after ``mutate_and_search``; delta evaluation has none.
+        evaluations (int): Fitness values computed, including cache hits and
+            values read off carried totals.
+        repairs (int): Solutions that repair had to change.
+        local_search_improvements (int): Solutions local search improved.
+        bits_flipped (int): Bits flipped by mutation.
+    """
+
+    def __init__(self):
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.evaluations = 0
+        self.repairs = 0
+        self.local_search_improvements = 0
+        self.bits_flipped = 0
+        self._mark = time.perf_counter()
+
+    def start(self):
+        """Starts timing the next phase from now."""
+        self._mark = time.perf_counter()
+
+    def lap(self, phase):
+        """Adds the time since the last lap or start to a phase."""
+        now = time.perf_counter()
+        self.times[phase] += now - self._mark
+        self._mark = now
+
+    def count_variation(self, parent, mutated, repaired, searched):
+        """Counts what mutation, repair and local search did to one solution."""
+        self.bits_flipped += sum(map(ne, parent, mutated))
+        self.repairs += repaired != mutated
+        self.local_search_improvements += searched != repaired
+
+    def counting(self, evaluate):
+        """Wraps a fitness function so that its calls are counted."""
+        def counted(sol):
+            self.evaluations += 1
+            return evaluate(sol)
+        return counted
+
+    def as_dict(self):
+        return {'times': dict(self.times), 'evaluations': self.evaluations, 'repairs': self.repairs,
+                'local_search_improvements': self.local_search_improvements,
+                'bits_flipped': self.bits_flipped}
+
+    def report(self):
+        """
+        Formats the profile as a table, slowest phase first.
+
+        Returns:
+            str: One line per phase with its time and share, then the counters.
+        """
+        total = sum(self.times.values()) or 1.0
+        lines = [f"{'Phase':<24}{'Seconds':>10}{'Share':>8}"]
+        for phase, seconds in sorted(self.times.items(), key=lambda item: -item[1]):
+            lines.append(f"{phase:<24}{seconds:>10.4f}{seconds / total:>8.1%}")
+        lines.append(f"Evaluations: {self.evaluations}, Repairs: {self.repairs}, "
+                     f"Local Search Improvements: {self.local_search_improvements}, "
+                     f"Bits Flipped: {self.bits_flipped}")
+        return "\n".join(lines)
+
+def _no_lap(phase):
+    pass
+
+class GenerationSnapshot:
+    """
+    Progress of a run after one generation, as streamed by ``iter_generations``
+    and passed to the ``progress`` callback of ``main_knapsack_mbo``.
+
+    Attributes:
+        generation (int): Number of generations run so far.
+        best_fitness (int): Best fitness found so far.
+        diversity (float): Population diversity at this generation.
+        mutation_rate (float or None): Mutation rate used for this generation,
+            None for island runs where every island adapts its own.
+        elapsed (float): Wall-clock seconds since the run started.
+        best_solution (list): Best solution found so far. Not a copy, so it
+            must not be modified.
+        stop_reason (str or None): Criterion that ends the run after this
+            generation, if any.
+    """
+
+    def __init__(self, generation, best_fitness, diversity, mutation_rate, elapsed,
+                 best_solution=None, stop_reason=None):
+        self.generation = generation
+        self.best_fitness = best_fitness
+        self.diversity = diversity
+        self.mutation_rate = mutation_rate
+        self.elapsed = elapsed
+        self.best_solution = best_solution
+        self.stop_reason = stop_reason
+
+    def __repr__(self):
+        return (f"GenerationSnapshot(generation={self.generation}, best_fitness={self.best_fitness}, "
+                f"diversity={self.diversity:.3f}, elapsed={self.elapsed:.3f})")
+
+def check_stop(best_fitness, started, target_fitness=None, time_limit=None, upper_bound=None):
+    """
+    Returns the stopping criterion met by a run, or None to keep going.
+
+    Parameters:
+        best_fitness (int): Best fitness found so far.
+        started (float): ``time.perf_counter()`` when the run started.
+        target_fitness (int, optional): Stop once this fitness is reached.
+        time_limit (float, optional): Stop once this many seconds have passed.
+        upper_bound (int, optional): Stop once the best fitness reaches this
+            bound, which proves it optimal.
+
+    Returns:
+        str or None: 'optimal', 'target_fitness', 'time_limit' or None.
+    """
+    if upper_bound is not None and best_fitness >= upper_bound:
+        return 'optimal'
+    if target_fitness is not None and best_fitness >= target_fitness:
+        return 'target_fitness'
+    if time_limit is not None and time.perf_counter() - started >= time_limit:
+        return 'time_limit'
+    return None
+
+def run_generations(state, instance, generations, mutation_rate=0.01, verbose=True, evaluate=None, deduplicate=False,
+                    target_fitness=None, time_limit=None, upper_bound=None, greedy_fraction=0.0, greedy_noise=0.1,
+                    profile=None, in_place=False, geometric_mutation=False, batch_tournament=False, steady_state=0,
+                    checkpoint=None, local_search_mode='add'):
+    """
+    Advances an MBO run by a number of generations, updating the state in place.
+
+    Parameters:
+        state (MBOState): State to advance. Delta evaluation is used when it
+            carries population totals.
+        instance (KnapsackInstance): The knapsack instance.
+        generations (int): Number of generations to run.
+        mutation_rate (float): Minimum per-bit mutation probability.
+        verbose (bool): Print progress for every generation.
+        evaluate (callable, optional): Fitness function of one solution, such
+            as a FitnessCache. Defaults to ``fitness`` on the instance.
+        deduplicate (bool): Drop repeated solutions before selection.
+        target_fitness, time_limit, upper_bound: Stopping criteria, see
+            ``check_stop``. The time limit counts from this call.
+        greedy_fraction, greedy_noise: Greedy seeding of the solutions
+            re-injected on stagnation, see ``initialize_population``.
+        profile (PhaseProfile, optional): Accumulates phase times and
+            operator counters of these generations.
+        in_place (bool): Write elite copies and offspring over the solutions
+            of a preallocated back buffer that is swapped with the population
+            each generation, instead of allocating new solutions. Same
+            results; not available with delta evaluation or deduplication.
+        geometric_mutation (bool): Draw the mutated positions with
+            ``flip_positions`` instead of one random number per bit.
+        batch_tournament (bool): Pick parents with ``batch_tournament_indices``.
+        steady_state (int): If positive, each generation breeds only this many
+            offspring, which replace the worst solutions they beat instead of
+            the whole population being re-ranked. Not available with delta
+            evaluation, deduplication or in-place generations.
+        checkpoint (callable, optional): Called with the state at the start
+            of every generation, when it holds everything needed to continue
+            the run, for example an ``mbo_checkpoint.Checkpointer``.
+        local_search_mode (str): Local search of the offspring, one of
+            LOCAL_SEARCH_MODES.
+
+    Returns:
+        MBOState: The same state object, with ``stop_reason`` set to the
+            criterion that fired or None if all generations ran.
+    """
+    for _ in iter_generations(state, instance, generations, mutation_rate, verbose, evaluate, deduplicate,
+                              target_fitness, time_limit, upper_bound, greedy_fraction, greedy_noise, profile,
+                              in_place, geometric_mutation, batch_tournament, steady_state, checkpoint,
+                              local_search_mode):
+        pass
+    return state
+
+def iter_generations(state, instance, generations, mutation_rate=0.01, verbose=False, evaluate=None, deduplicate=False,
+                     target_fitness=None, time_limit=None, upper_bound=None, greedy_fraction=0.0, greedy_noise=0.1,
+                     profile=None, in_place=False, geometric_mutation=False, batch_tournament=False,
+                     steady_state=0, checkpoint=None, local_search_mode='add'):
+    """
+    Advances an MBO run generation by generation, yielding a GenerationSnapshot
+    after each one is evaluated.
+
+    The state is brought up to date before every yield, so a consumer that
+    stops iterating, which cancels the run, is left with a consistent state.
+    Takes the same arguments as ``run_generations``, but does not print by
+    default.
+
+    Yields:
+        GenerationSnapshot: Progress after each generation.
+    """
+    values, weights, capacity = instance
+    num_items = instance.num_items
+    pop_size = state.pop_size
+    population = state.population
+    population_totals = state.population_totals
+    delta_evaluation = population_totals is not None
+    if evaluate is None:
+        evaluate = lambda sol: fitness(sol, instance)
+    # Phase timing is a no-op call unless profiling
+    lap = _no_lap
+    if profile is not None:
+        evaluate = profile.counting(evaluate)
+        lap = profile.lap
+    started = time.perf_counter()
+    state.stop_reason = None
     
     # Control parameters
     min_mutation = mutation_rate
     max_mutation = 0.1
-    diversity_threshold = 0.3
     stagnation_limit = 20
-    stagnation_counter = 0
+    elite_size = pop_size // 10
+    
+    if steady_state:
+        if delta_evaluation or deduplicate or in_place:
+            raise ValueError("Steady-state replacement supports neither delta evaluation, deduplication "
+                             "nor in-place generations")
+        # Stagnation is counted in generations of pop_size offspring
+        stagnation_limit *= max(1, pop_size // steady_state)
+    # Fitness of the current population when it is carried over instead of re-evaluated
+    known_fitness = None
+    
+    if in_place:
+        if delta_evaluation or deduplicate:
+            raise ValueError("In-place generations support neither delta evaluation nor deduplication")
+        # Solutions the elite and offspring are written over; after selection the
+        # unselected ones and the old population become the next back buffer
+        back = [[0] * num_items for _ in range(elite_size + len(population))]
+        allele_counts = None
+        counts = [0] * num_items
+    else:
+        allele_counts = AlleleCounts(population, num_items)
     
-    for generation in range(max_generations):
+    if profile is not None:
+        profile.start()
+    for _ in range(generations):
+        if checkpoint is not None:
+            # Only the population and the counters are carried into a generation,
+            # so the state and the random module state resume it exactly
+            state.population = population
+            state.population_totals = population_totals
+            checkpoint(state)
+        
         # Calculate diversity
-        diversity = calculate_diversity(population)
-        diversity_history.append(diversity)
+        if in_place:
+            count_alleles_into(counts, population)
+            n = len(population)
+            diversity = sum(c * (n - c) for c in counts) / (n * (n-1) / 2) if n > 1 else 0
+        else:
+            diversity = allele_counts.diversity()
+        state.diversity_history.append(diversity)
+        lap('diversity')
         
         # Adapt mutation rate
         current_mutation = min_mutation + (max_mutation - min_mutation) * (1 - diversity/1.0)
         
         # Evaluate fitness
-        fitness_values = [fitness(sol, values, weights, capacity) for sol in population]
+        if delta_evaluation:
+            fitness_values = [value if weight <= capacity else 0 for weight, value in population_totals]
+            if profile is not None:
+                profile.evaluations += len(fitness_values)
+        elif known_fitness is not None:
+            fitness_values = known_fitness
+        else:
+            fitness_values = [evaluate(sol) for sol in population]
         current_best = max(fitness_values)
+        lap('evaluation')
         
         # Update best solution
-        if current_best > best_fitness:
-            best_fitness = current_best
-            best_solution = population[fitness_values.index(current_best)]
-            stagnation_counter = 0
+        if current_best > state.best_fitness:
+            state.best_fitness = current_best
+            state.best_solution = population[fitness_values.index(current_best)]
+            if in_place:
+                # Buffer solutions are overwritten in later generations
+                state.best_solution = state.best_solution.copy()
+            state.stagnation_counter = 0
         else:
-            stagnation_counter += 1
+            state.stagnation_counter += 1
         
-        fitness_history.append(best_fitness)
+        state.fitness_history.append(state.best_fitness)
+        state.generation += 1
         
         if verbose:
-            print(f"Generation {generation + 1}: Best Fitness = {best_fitness}, Diversity = {diversity:.3f}")
+            print(f"Generation {state.generation}: Best Fitness = {state.best_fitness}, Diversity = {diversity:.3f}")
+        
+        state.stop_reason = check_stop(state.best_fitness, started, target_fitness, time_limit, upper_bound)
+        state.population = population
+        state.population_totals = population_totals
+        yield GenerationSnapshot(state.generation, state.best_fitness, diversity, current_mutation,
+                                 time.perf_counter() - started, state.best_solution, state.stop_reason)
+        if state.stop_reason:
+            break
+        if profile is not None:
+            profile.start()
         
         # Check for stagnation
-        if stagnation_counter >= stagnation_limit:
+        refreshed_from = len(population)
+        if state.stagnation_counter >= stagnation_limit:
             # Inject diversity
             num_refresh = pop_size // 4
-            population[-num_refresh:] = initialize_population(num_refresh, num_items)
-            stagnation_counter = 0
+            fresh = initialize_population(num_refresh, num_items, instance, greedy_fraction, greedy_noise)
+            if steady_state:
+                # The population is unordered, so the worst solutions make way
+                for i, sol in zip(worst_indices(fitness_values, num_refresh), fresh):
+                    allele_counts.remove(population[i])
+                    allele_counts.add(sol)
+                    population[i] = sol
+                    fitness_values[i] = evaluate(sol)
+            else:
+                population[-num_refresh:] = fresh
+                refreshed_from = len(population) - num_refresh
+            if delta_evaluation:
+                population_totals[refreshed_from:] = [solution_totals(sol, instance)
+                                                      for sol in population[refreshed_from:]]
+            state.stagnation_counter = 0
+        lap('reinjection')
         
-        # Enhanced migration with tournament selection
-        parents = tournament_selection(population, fitness_values)
-        migrated_population = migration_phase(parents)
-        
-        # Adaptive mutation and local search
-        mutated_population = mutate_and_search(migrated_population, current_mutation, 
-                                             values, weights, capacity)
-        
-        # Repair solutions
-        repaired_population = [repair(sol, weights, capacity, values) for sol in mutated_population]
+        if steady_state:
+            parent_indices = (batch_tournament_indices(fitness_values, steady_state) if batch_tournament
+                              else tournament_indices(population, fitness_values, count=steady_state))
+            lap('tournament_selection')
+            migrated_population = migration_phase([population[i] for i in parent_indices])
+            lap('migration_phase')
+            mutated_population = mutate_and_search(migrated_population, current_mutation, instance,
+                                                   profile=profile, geometric=geometric_mutation,
+                                                   local_search_mode=local_search_mode)
+            lap('mutate_and_search')
+            offspring = [repair(sol, instance) for sol in mutated_population]
+            if profile is not None:
+                profile.repairs += sum(map(ne, offspring, mutated_population))
+            lap('repair')
+            offspring_fitness = [evaluate(sol) for sol in offspring]
+            lap('evaluation')
+            
+            # The offspring compete with the solutions they would replace, so
+            # only the worst slots are ranked and the best solutions always survive
+            slots = worst_indices(fitness_values, len(offspring))
+            pool_fitness = [fitness_values[i] for i in slots] + offspring_fitness
+            survivors = set(rank_indices(pool_fitness, len(slots)))
+            winners = [j - len(slots) for j in sorted(survivors) if j >= len(slots)]
+            losers = [slot for j, slot in enumerate(slots) if j not in survivors]
+            for slot, j in zip(losers, winners):
+                allele_counts.remove(population[slot])
+                allele_counts.add(offspring[j])
+                population[slot] = offspring[j]
+                fitness_values[slot] = offspring_fitness[j]
+            known_fitness = fitness_values
+            lap('select_next_generation')
+            continue
         
         # Elitism: preserve best solutions
-        elite_size = pop_size // 10
-        elite_indices = sorted(range(len(fitness_values)), 
-                             key=lambda k: fitness_values[k], 
-                             reverse=True)[:elite_size]
-        elite = [population[i].copy() for i in elite_indices]
+        elite_indices = rank_indices(fitness_values, elite_size)
+        if in_place:
+            for slot, i in zip(back, elite_indices):
+                slot[:] = population[i]
+        else:
+            elite = [population[i].copy() for i in elite_indices]
+        lap('elite')
+        
+        if delta_evaluation:
+            # Migration, mutation and local search carry each child's totals
+            parent_indices = (batch_tournament_indices(fitness_values) if batch_tournament
+                              else tournament_indices(population, fitness_values))
+            lap('tournament_selection')
+            migrated_population, migrated_totals = migration_phase_delta(
+                [population[i] for i in parent_indices],
+                [population_totals[i] for i in parent_indices], instance)
+            lap('migration_phase')
+            repaired_population, repaired_totals = mutate_and_search_delta(
+                migrated_population, migrated_totals, current_mutation, instance, profile, geometric_mutation,
+                local_search_mode)
+            lap('mutate_and_search')
+            
+            combined_population = elite + repaired_population
+            combined_totals = [population_totals[i] for i in elite_indices] + repaired_totals
+            combined_fitness = [value if weight <= capacity else 0 for weight, value in combined_totals]
+            if profile is not None:
+                profile.evaluations += len(combined_fitness)
+            lap('evaluation')
+        elif in_place:
+            parent_indices = (batch_tournament_indices(fitness_values) if batch_tournament
+                              else tournament_indices(population, fitness_values))
+            lap('tournament_selection')
+            offspring = back[len(elite_indices):]
+            migration_phase_into([population[i] for i in parent_indices], offspring)
+            lap('migration_phase')
+            
+            # Mutation, repair and local search on the offspring, in place
+            for sol in offspring:
+                flips = mutate_in_place(sol, current_mutation, geometric_mutation)
+                removed = repair_in_place(sol, instance)
+                added = local_search_in_place(sol, instance, local_search_mode)
+                if profile is not None:
+                    profile.bits_flipped += flips
+                    profile.repairs += removed > 0
+                    profile.local_search_improvements += added > 0
+            lap('mutate_and_search')
+            
+            for sol in offspring:
+                removed = repair_in_place(sol, instance)
+                if profile is not None:
+                    profile.repairs += removed > 0
+            lap('repair')
+            
+            elite_fitness = [fitness_values[i] if i < refreshed_from else evaluate(population[i])
+                             for i in elite_indices]
+            combined_population = back
+            combined_fitness = elite_fitness + [evaluate(sol) for sol in offspring]
+            lap('evaluation')
+        else:
+            # Enhanced migration with tournament selection
+            if batch_tournament:
+                parents = [population[i].copy() for i in batch_tournament_indices(fitness_values)]
+            else:
+                parents = tournament_selection(population, fitness_values)
+            lap('tournament_selection')
+            migrated_population = migration_phase(parents)
+            lap('migration_phase')
+            
+            # Adaptive mutation and local search
+            mutated_population = mutate_and_search(migrated_population, current_mutation, instance, profile=profile,
+                                                   geometric=geometric_mutation, local_search_mode=local_search_mode)
+            lap('mutate_and_search')
+            
+            # Repair solutions
+            repaired_population = [repair(sol, instance) for sol in mutated_population]
+            if profile is not None:
+                profile.repairs += sum(map(ne, repaired_population, mutated_population))
+            lap('repair')
+            
+            # Elite scores are reused unless the individual was just re-injected
+            elite_fitness = [fitness_values[i] if i < refreshed_from else evaluate(population[i])
+                             for i in elite_indices]
+            
+            # Combine populations
+            combined_population = elite + repaired_population
+            combined_fitness = elite_fitness + [evaluate(sol) for sol in repaired_population]
+            lap('evaluation')
         
-        # Combine populations
-        combined_population = elite + repaired_population
-        combined_fitness = ([fitness(sol, values, weights, capacity) 
-                           for sol in combined_population])
+        if deduplicate:
+            if delta_evaluation:
+                combined_population, combined_fitness, combined_totals = remove_duplicates(
+                    combined_population, combined_fitness, combined_totals)
+            else:
+                combined_population, combined_fitness = remove_duplicates(combined_population, combined_fitness)
+            shortfall = pop_size - len(combined_population)
+            if shortfall > 0:
+                fresh = [repair(sol, instance) for sol in initialize_population(
+                    shortfall, num_items, instance, greedy_fraction, greedy_noise)]
+                combined_population += fresh
+                if delta_evaluation:
+                    fresh_totals = [solution_totals(sol, instance) for sol in fresh]
+                    combined_totals += fresh_totals
+                    combined_fitness += [value if weight <= capacity else 0 for weight, value in fresh_totals]
+                else:
+                    combined_fitness += [evaluate(sol) for sol in fresh]
+            lap('deduplicate')
         
         # Selection for next generation
-        population = select_next_generation(combined_population, combined_fitness, pop_size)
+        if in_place:
+            survivors = rank_indices(combined_fitness, pop_size)
+            selected = set(survivors)
+            next_population = [back[i] for i in survivors]
+            back = [sol for i, sol in enumerate(back) if i not in selected] + population
+            population = next_population
+        elif delta_evaluation:
+            survivors = rank_indices(combined_fitness, pop_size)
+            population = [combined_population[i] for i in survivors]
+            population_totals = [combined_totals[i] for i in survivors]
+            allele_counts.update(population)
+        else:
+            population = select_next_generation(combined_population, combined_fitness, pop_size,
+                                                allele_counts=allele_counts)
+        lap('select_next_generation')
+    
+    state.population = population
+    state.population_totals = population_totals
+    return state
+
+def _initial_state(instance, pop_size, delta_evaluation, greedy_fraction, greedy_noise):
+    """Builds the repaired initial population of a single-population run."""
+    population = initialize_population(pop_size, instance.num_items, instance, greedy_fraction, greedy_noise)
+    population = [repair(sol, instance) for sol in population]
+    return MBOState(population, instance, pop_size, delta_evaluation=delta_evaluation)
+
+def iter_knapsack_mbo(values, weights=None, capacity=None, pop_size=50, max_generations=100, mutation_rate=0.01,
+                      cache_size=0, deduplicate=False, delta_evaluation=False, target_fitness=None,
+                      time_limit=None, stop_at_optimum=False, greedy_fraction=0.0, greedy_noise=0.1,
+                      geometric_mutation=False, batch_tournament=False, steady_state=0, local_search_mode='add'):
+    """
+    Streams a python-engine MBO run as one GenerationSnapshot per generation.
+
+    The run only advances while the generator is consumed, so breaking out of
+    the loop or closing the generator cancels it. Nothing is printed. The
+    parameters are those of ``main_knapsack_mbo``.
+
+    Yields:
+        GenerationSnapshot: Progress after each generation; the last one
+            carries the best solution and the stop reason, if any.
+    """
+    instance = as_instance(values, weights, capacity)
+    upper_bound = instance.upper_bound() if stop_at_optimum else None
+    state = _initial_state(instance, pop_size, delta_evaluation, greedy_fraction, greedy_noise)
+    evaluate = FitnessCache(instance, max_size=cache_size) if cache_size else None
+    yield from iter_generations(state, instance, max_generations, mutation_rate=mutation_rate,
+                                evaluate=evaluate, deduplicate=deduplicate, target_fitness=target_fitness,
+                                time_limit=time_limit, upper_bound=upper_bound,
+                                greedy_fraction=greedy_fraction, greedy_noise=greedy_noise,
+                                geometric_mutation=geometric_mutation, batch_tournament=batch_tournament,
+                                steady_state=steady_state, local_search_mode=local_search_mode)
+
+def main_knapsack_mbo(values, weights=None, capacity=None, pop_size=50, max_generations=100, mutation_rate=0.01, verbose=True, engine='python',
+                      cache_size=0, deduplicate=False, delta_evaluation=False, islands=1,
+                      target_fitness=None, time_limit=None, stop_at_optimum=False, return_stats=False,
+                      greedy_fraction=0.0, greedy_noise=0.1, progress=None, profile=False, in_place=False,
+                      geometric_mutation=False, batch_tournament=False, steady_state=0, checkpoint_path=None,
+                      checkpoint_every=None, checkpoint_interval=None, resume=False, local_search_mode='add',
+                      **island_options):
+    """
+    Enhanced MBO with adaptive mechanisms and diversity preservation.
+
+    Parameters:
+        values (list or KnapsackInstance): List of item values, or the whole
+            instance in place of values, weights and capacity.
+        engine (str): 'python' runs the list-based operators in this module,
+            'numpy' runs the matrix-backed engine in ``mbo_numpy``, 'packed'
+            the int-per-solution engine in ``mbo_bitpacked``, which matches
+            the python engine's default results for the same seed.
+        cache_size (int): Capacity of the LRU fitness cache, 0 disables it.
+            Python engine only.
+        deduplicate (bool): Drop repeated solutions before selecting the next
+            generation and top the population up with fresh repaired ones.
+            Python engine only.
+        delta_evaluation (bool): Carry each solution's total weight and value
+            through crossover, mutation, repair and local search instead of
+            re-summing them; fitness is read off the totals, so the fitness
+            cache is not consulted. Same results, python engine only.
+        islands (int): Number of populations to evolve in parallel worker
+            processes; more than one runs ``mbo_islands.island_knapsack_mbo``
+            with ``island_options`` (migration_interval, topology, ...).
+        target_fitness (int, optional): Stop as soon as this fitness is reached.
+        time_limit (float, optional): Stop after this many wall-clock seconds.
+        stop_at_optimum (bool): Stop when the best fitness equals the Dantzig
+            upper bound of the instance, which proves it optimal.
+        return_stats (bool): Also return a RunStats as fifth element, telling
+            which stopping criterion fired.
+        greedy_fraction (float): Share of the initial and re-injected solutions
+            built around the ratio-greedy solution instead of drawn at random.
+        greedy_noise (float): Probability of skipping each item when building
+            a greedy solution.
+        progress (callable, optional): Called with a GenerationSnapshot after
+            every generation (every migration interval for islands). Returning
+            False cancels the run, with stop reason 'cancelled'.
+        profile (bool): Time every generation phase and count evaluations,
+            repairs, local-search improvements and flipped bits. The
+            PhaseProfile is attached to the RunStats (see return_stats) and
+            printed when verbose. Single-population python engine only.
+        in_place (bool): Keep the population in two preallocated buffers and
+            write offspring straight into them, so that no solution lists are
+            allocated per generation. Same results; single-population python
+            engine without delta evaluation or deduplication only.
+        geometric_mutation (bool): Draw each offspring's mutated positions
+            from geometric gaps between flips, one random number per flip
+            rather than per bit, which is much faster for long solutions
+            and low mutation rates. Same flip distribution, but a different
+            random stream than the default. Python engine only.
+        batch_tournament (bool): Draw the contestants of all parent
+            tournaments in one batch, with replacement, instead of one
+            ``random.sample`` per tournament. Faster, but a different random
+            stream; the numpy engine always batches its tournaments.
+        steady_state (int): Breed only this many offspring per generation and
+            let each replace one of the worst solutions if it is fitter,
+            instead of ranking the whole combined population; 0 (default)
+            replaces whole generations. Suits large populations, where the
+            full selection dominates. Python engine without delta
+            evaluation, deduplication or in-place generations only.
+        checkpoint_path (str, optional): File to save the run's state and
+            the ``random`` module state to, every ``checkpoint_every``
+            generations or ``checkpoint_interval`` seconds (every 10
+            generations if neither is given) and when the run completes.
+            Single-population python engine only.
+        checkpoint_every (int, optional): Generations between checkpoints.
+        checkpoint_interval (float, optional): Seconds between checkpoints.
+        resume (bool): Continue from ``checkpoint_path`` if it exists, up to
+            ``max_generations`` in total. The other settings must match the
+            checkpointed run, which then ends exactly as if it had never
+            been interrupted. Time limits count from the resumed start.
+        local_search_mode (str): 'add' (default) adds items that still fit
+            in index order. 'swap' adds them in descending ratio order and
+            then swaps selected items for more valuable ones that fit in
+            their place, finding each move by bisecting a sorted weight
+            index; it costs more per offspring but reaches good solutions
+            in fewer generations. Python engine only.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+    if profile and (engine != 'python' or islands > 1):
+        raise ValueError("Profiling needs the python engine with a single population")
+    if in_place and (engine != 'python' or islands > 1):
+        raise ValueError("In-place generations need the python engine with a single population")
+    if geometric_mutation and engine != 'python':
+        raise ValueError("Geometric mutation needs the python engine")
+    if steady_state and engine != 'python':
+        raise ValueError("Steady-state replacement needs the python engine")
+    if local_search_mode not in LOCAL_SEARCH_MODES:
+        raise ValueError(f"Unknown local search mode {local_search_mode!r}, expected one of {LOCAL_SEARCH_MODES}")
+    if local_search_mode != 'add' and engine != 'python':
+        raise ValueError("Swap local search needs the python engine")
+    if (checkpoint_path or resume) and (engine != 'python' or islands > 1):
+        raise ValueError("Checkpoints need the python engine with a single population")
+    if resume and not checkpoint_path:
+        raise ValueError("resume needs a checkpoint_path")
+    instance = as_instance(values, weights, capacity)
+    if islands > 1:
+        if engine != 'python':
+            raise ValueError("The island model runs the python engine only")
+        from mbo_islands import island_knapsack_mbo
+        return island_knapsack_mbo(instance, num_islands=islands, pop_size=pop_size,
+                                   max_generations=max_generations, mutation_rate=mutation_rate,
+                                   verbose=verbose, cache_size=cache_size, deduplicate=deduplicate,
+                                   delta_evaluation=delta_evaluation, target_fitness=target_fitness,
+                                   time_limit=time_limit, stop_at_optimum=stop_at_optimum,
+                                   return_stats=return_stats, greedy_fraction=greedy_fraction,
+                                   greedy_noise=greedy_noise, progress=progress,
+                                   geometric_mutation=geometric_mutation, batch_tournament=batch_tournament,
+                                   steady_state=steady_state, local_search_mode=local_search_mode,
+                                   **island_options)
+    if island_options:
+        raise TypeError(f"Unexpected arguments without islands: {', '.join(island_options)}")
+    if engine == 'numpy':
+        from mbo_numpy import main_knapsack_mbo_numpy
+        return main_knapsack_mbo_numpy(instance, pop_size=pop_size,
+                                       max_generations=max_generations,
+                                       mutation_rate=mutation_rate, verbose=verbose,
+                                       target_fitness=target_fitness, time_limit=time_limit,
+                                       stop_at_optimum=stop_at_optimum, return_stats=return_stats,
+                                       greedy_fraction=greedy_fraction, greedy_noise=greedy_noise,
+                                       progress=progress)
+    if engine == 'packed':
+        from mbo_bitpacked import main_knapsack_mbo_packed
+        return main_knapsack_mbo_packed(instance, pop_size=pop_size,
+                                        max_generations=max_generations,
+                                        mutation_rate=mutation_rate, verbose=verbose,
+                                        target_fitness=target_fitness, time_limit=time_limit,
+                                        stop_at_optimum=stop_at_optimum, return_stats=return_stats,
+                                        greedy_fraction=greedy_fraction, greedy_noise=greedy_noise,
+                                        progress=progress)
+
+    started = time.perf_counter()
+    upper_bound = instance.upper_bound() if stop_at_optimum else None
+    checkpointer = None
+    if checkpoint_path:
+        from mbo_checkpoint import Checkpointer, load_checkpoint, run_config
+        config = run_config(instance, pop_size=pop_size, mutation_rate=mutation_rate, deduplicate=deduplicate,
+                            delta_evaluation=delta_evaluation, greedy_fraction=greedy_fraction,
+                            greedy_noise=greedy_noise, in_place=in_place, geometric_mutation=geometric_mutation,
+                            batch_tournament=batch_tournament, steady_state=steady_state,
+                            local_search_mode=local_search_mode)
+        checkpointer = Checkpointer(checkpoint_path, checkpoint_every, checkpoint_interval, config)
+    if resume and os.path.exists(checkpoint_path):
+        state, random_state = load_checkpoint(checkpoint_path, config)
+        random.setstate(random_state)
+        if verbose:
+            print(f"Resuming from {checkpoint_path} at generation {state.generation}")
+    else:
+        state = _initial_state(instance, pop_size, delta_evaluation, greedy_fraction, greedy_noise)
+    evaluate = FitnessCache(instance, max_size=cache_size) if cache_size else None
+    phase_profile = PhaseProfile() if profile else None
+    
+    for snapshot in iter_generations(state, instance, max(max_generations - state.generation, 0),
+                                     mutation_rate=mutation_rate,
+                                     verbose=verbose, evaluate=evaluate, deduplicate=deduplicate,
+                                     target_fitness=target_fitness, time_limit=time_limit,
+                                     upper_bound=upper_bound, greedy_fraction=greedy_fraction,
+                                     greedy_noise=greedy_noise, profile=phase_profile, in_place=in_place,
+                                     geometric_mutation=geometric_mutation, batch_tournament=batch_tournament,
+                                     steady_state=steady_state, checkpoint=checkpointer,
+                                     local_search_mode=local_search_mode):
+        if progress is not None and progress(snapshot) is False:
+            state.stop_reason = state.stop_reason or 'cancelled'
+            break
+    if checkpointer is not None and state.stop_reason is None:
+        # A completed run can be extended by resuming with more generations
+        checkpointer.save(state)
+    best_solution = state.best_solution
+    stats = RunStats(state.stop_reason or 'max_generations', state.generation,
+                     time.perf_counter() - started, upper_bound, phase_profile)
     
     if verbose:
         print("\nOptimization Complete!")
-        print(f"Best Fitness: {best_fitness}")
+        print(f"Stopped By: {stats.stop_reason} after {stats.generations} generations")
+        print(f"Best Fitness: {state.best_fitness}")
         print(f"Best Solution: {best_solution}")
-        print(f"Final Diversity: {diversity:.3f}")
-        total_weight = sum(w for w, bit in zip(weights, best_solution) if bit)
+        print(f"Final Diversity: {state.diversity_history[-1]:.3f}")
+        total_weight = sum(w for w, bit in zip(instance.weights, best_solution) if bit)
         print(f"Total Weight: {total_weight}")
+        if cache_size:
+            print(f"Fitness Cache: {evaluate.hits} hits, {evaluate.misses} misses")
+        if profile:
+            print(f"\nProfile:\n{phase_profile.report()}")
     
-    return best_solution, best_fitness, fitness_history, diversity_history
+    if return_stats:
+        return best_solution, state.best_fitness, state.fitness_history, state.diversity_history, stats
+    return best_solution, state.best_fitness, state.fitness_history, state.diversity_history
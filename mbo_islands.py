@@ -0,0 +1,241 @@
+# mbo_islands.py
+
+import copy
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from knapsack_instance import as_instance
+from mbo_core import (FitnessCache, GenerationSnapshot, MBOState, RunStats, fitness, initialize_population, rank_indices,
+                      repair, run_generations, solution_totals, worst_indices)
+
+TOPOLOGIES = ('ring', 'fully_connected')
+
+# Instance shared by the generations run in a worker process, set once per worker
+_worker_instance = None
+
+def _init_worker(instance):
+    global _worker_instance
+    _worker_instance = instance
+
+def _run_island_epoch(state, generations, seed, mutation_rate, cache_size, deduplicate, options):
+    """
+    Runs one island for a number of generations in a worker process.
+
+    Returns:
+        tuple: (state, fitness_values) where the state's histories cover only
+            these generations and fitness_values scores its final population.
+    """
+    random.seed(seed)
+    evaluate = FitnessCache(_worker_instance, max_size=cache_size) if cache_size else None
+    state = run_generations(state, _worker_instance, generations, mutation_rate=mutation_rate,
+                            verbose=False, evaluate=evaluate, deduplicate=deduplicate, **options)
+    if state.population_totals is not None:
+        fitness_values = [value if weight <= _worker_instance.capacity else 0
+                          for weight, value in state.population_totals]
+    else:
+        fitness_values = [(evaluate or (lambda sol: fitness(sol, _worker_instance)))(sol)
+                          for sol in state.population]
+    return state, fitness_values
+
+def _epoch_state(state):
+    """
+    Returns a copy of an island's state without its histories, which stay in
+    the parent process, so the state shipped to a worker does not grow with
+    the length of the run.
+    """
+    shipped = copy.copy(state)
+    shipped.fitness_history = []
+    shipped.diversity_history = []
+    return shipped
+
+def _merge_epoch(state, epoch_state):
+    """Takes over a worker's state, appending its histories to the parent's."""
+    fitness_history = state.fitness_history + epoch_state.fitness_history
+    diversity_history = state.diversity_history + epoch_state.diversity_history
+    epoch_state.fitness_history = fitness_history
+    epoch_state.diversity_history = diversity_history
+    return epoch_state
+
+def migration_sources(num_islands, topology):
+    """
+    Lists, for every island, the islands it receives migrants from.
+
+    Parameters:
+        num_islands (int): Number of islands.
+        topology (str): 'ring' (each island receives from its predecessor) or
+            'fully_connected' (each island receives from all others).
+
+    Returns:
+        list: One list of source island indices per island.
+    """
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Unknown topology {topology!r}, expected one of {TOPOLOGIES}")
+    if num_islands < 2:
+        return [[] for _ in range(num_islands)]
+    if topology == 'ring':
+        return [[(i - 1) % num_islands] for i in range(num_islands)]
+    return [[j for j in range(num_islands) if j != i] for i in range(num_islands)]
+
+def exchange_migrants(states, instance, topology='ring', num_migrants=1, fitness_values=None):
+    """
+    Copies the best solutions of each island over the worst ones of its neighbours.
+
+    Emigrants are chosen from every island before any island is changed, so
+    the exchange does not depend on the island order.
+
+    Parameters:
+        states (list): MBOState of every island, updated in place.
+        instance (KnapsackInstance): The knapsack instance.
+        topology (str): Migration topology, see ``migration_sources``.
+        num_migrants (int): Number of solutions each source sends.
+        fitness_values (list, optional): Fitness of every solution of every
+            island, as the workers report it; computed here if None.
+    """
+    if fitness_values is None:
+        fitness_values = [[fitness(sol, instance) for sol in state.population] for state in states]
+    emigrants = [[state.population[i].copy() for i in rank_indices(island_fitness, num_migrants)]
+                 for state, island_fitness in zip(states, fitness_values)]
+
+    for island, sources in enumerate(migration_sources(len(states), topology)):
+        arrivals = [sol for source in sources for sol in emigrants[source]]
+        if not arrivals:
+            continue
+        state = states[island]
+        island_fitness = fitness_values[island]
+        worst = worst_indices(island_fitness, len(arrivals))
+        for i, sol in zip(worst, arrivals):
+            state.population[i] = sol.copy()
+            if state.population_totals is not None:
+                state.population_totals[i] = solution_totals(sol, instance)
+
+def island_knapsack_mbo(values, weights=None, capacity=None, num_islands=None, migration_interval=10,
+                        topology='ring', num_migrants=1, pop_size=50, max_generations=100,
+                        mutation_rate=0.01, verbose=True, cache_size=0, deduplicate=False,
+                        delta_evaluation=False, max_workers=None, executor=None, target_fitness=None,
+                        time_limit=None, stop_at_optimum=False, return_stats=False, greedy_fraction=0.0,
+                        greedy_noise=0.1, progress=None, geometric_mutation=False, batch_tournament=False,
+                        steady_state=0, local_search_mode='add'):
+    """
+    Island-model MBO: independent populations evolve in worker processes and
+    exchange their best solutions every ``migration_interval`` generations.
+
+    Parameters:
+        values (list or KnapsackInstance): List of item values, or the whole
+            instance in place of values, weights and capacity.
+        weights (list): List of item weights.
+        capacity (int): Maximum capacity of the knapsack.
+        num_islands (int): Number of populations, defaults to the CPU count.
+        migration_interval (int): Generations between migrations.
+        topology (str): 'ring' or 'fully_connected'.
+        num_migrants (int): Solutions sent by each island per migration.
+        pop_size (int): Population size of each island.
+        max_generations (int): Number of generations of each island.
+        mutation_rate (float): Minimum per-bit mutation probability.
+        verbose (bool): Print progress after every migration interval.
+        cache_size (int): Fitness cache capacity per island and interval.
+        deduplicate (bool): Drop repeated solutions before selection.
+        delta_evaluation (bool): Carry solution totals instead of re-summing them.
+        max_workers (int): Worker processes, defaults to the number of islands.
+        executor (concurrent.futures.Executor, optional): Executor to run the
+            islands on instead of a new process pool. Its workers must be able
+            to see the instance, so it is mainly useful for testing.
+        target_fitness, time_limit, stop_at_optimum, return_stats: Stopping
+            criteria and reporting, as for ``main_knapsack_mbo``. Once any
+            island meets a criterion, all islands stop at the end of the
+            interval; histories are cut to the shortest island.
+        greedy_fraction, greedy_noise: Greedy seeding, as for ``main_knapsack_mbo``.
+        geometric_mutation, batch_tournament, steady_state, local_search_mode:
+            Operator variants, as for ``main_knapsack_mbo``.
+        progress (callable, optional): Called with a GenerationSnapshot after
+            every migration interval; returning False cancels the run.
+
+    Returns:
+        tuple: (best_solution, best_fitness, fitness_history, diversity_history)
+            where the fitness history is the best fitness over all islands and
+            the diversity history is the mean island diversity per generation,
+            followed by a RunStats if return_stats is set.
+    """
+    started = time.perf_counter()
+    instance = as_instance(values, weights, capacity)
+    upper_bound = instance.upper_bound() if stop_at_optimum else None
+    if num_islands is None:
+        num_islands = os.cpu_count() or 1
+    if migration_interval < 1:
+        raise ValueError("migration_interval must be at least 1")
+    migration_sources(num_islands, topology)  # validates the topology
+
+    states = []
+    for _ in range(num_islands):
+        population = [repair(sol, instance) for sol in initialize_population(
+            pop_size, instance.num_items, instance, greedy_fraction, greedy_noise)]
+        states.append(MBOState(population, instance, pop_size, delta_evaluation=delta_evaluation))
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=max_workers or num_islands,
+                                       initializer=_init_worker, initargs=(instance,))
+    else:
+        _init_worker(instance)
+    stop_reason = None
+    try:
+        done = 0
+        while done < max_generations and not stop_reason:
+            generations = min(migration_interval, max_generations - done)
+            seeds = [random.getrandbits(64) for _ in states]
+            options = dict(target_fitness=target_fitness, upper_bound=upper_bound,
+                           greedy_fraction=greedy_fraction, greedy_noise=greedy_noise,
+                           geometric_mutation=geometric_mutation, batch_tournament=batch_tournament,
+                           steady_state=steady_state, local_search_mode=local_search_mode,
+                           time_limit=None if time_limit is None
+                           else max(time_limit - (time.perf_counter() - started), 0))
+            futures = [executor.submit(_run_island_epoch, _epoch_state(state), generations, seed,
+                                       mutation_rate, cache_size, deduplicate, options)
+                       for state, seed in zip(states, seeds)]
+            epochs = [future.result() for future in futures]
+            states = [_merge_epoch(state, epoch_state) for state, (epoch_state, _) in zip(states, epochs)]
+            fitness_values = [island_fitness for _, island_fitness in epochs]
+            done += generations
+            fired = [state.stop_reason for state in states if state.stop_reason]
+            if fired:
+                # A proof of optimality outranks the other criteria
+                stop_reason = 'optimal' if 'optimal' in fired else fired[0]
+            elif done < max_generations:
+                exchange_migrants(states, instance, topology, num_migrants, fitness_values)
+            if progress is not None:
+                best_state = max(states, key=lambda state: state.best_fitness)
+                diversity = sum(state.diversity_history[-1] for state in states) / num_islands
+                snapshot = GenerationSnapshot(min(state.generation for state in states), best_state.best_fitness, diversity, None,
+                                              time.perf_counter() - started, best_state.best_solution,
+                                              stop_reason)
+                if progress(snapshot) is False:
+                    stop_reason = stop_reason or 'cancelled'
+            if verbose:
+                best = max(state.best_fitness for state in states)
+                print(f"Generation {done}: Best Fitness = {best}, "
+                      f"Island Bests = {[state.best_fitness for state in states]}")
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    fitness_history = [max(history) for history in zip(*(state.fitness_history for state in states))]
+    diversity_history = [sum(history) / num_islands
+                         for history in zip(*(state.diversity_history for state in states))]
+    best_state = max(states, key=lambda state: state.best_fitness)
+    best_solution, best_fitness = best_state.best_solution, best_state.best_fitness
+    stats = RunStats(stop_reason or 'max_generations', len(fitness_history),
+                     time.perf_counter() - started, upper_bound)
+
+    if verbose:
+        print("\nOptimization Complete!")
+        print(f"Stopped By: {stats.stop_reason} after {stats.generations} generations")
+        print(f"Best Fitness: {best_fitness}")
+        print(f"Best Solution: {best_solution}")
+        if best_solution is not None:
+            total_weight = sum(w for w, bit in zip(instance.weights, best_solution) if bit)
+            print(f"Total Weight: {total_weight}")
+
+    if return_stats:
+        return best_solution, best_fitness, fitness_history, diversity_history, stats
+    return best_solution, best_fitness, fitness_history, diversity_history
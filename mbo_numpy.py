@@ -0,0 +1,404 @@
+# mbo_numpy.py
+
+import random
+import time
+
+import numpy as np
+
+from knapsack_instance import as_instance
+from mbo_core import GenerationSnapshot, RunStats, check_stop
+
+def initialize_population_array(pop_size, num_items, rng):
+    """
+    Initializes the population as a single random binary matrix.
+
+    Parameters:
+        pop_size (int): Number of solutions in the population.
+        num_items (int): Number of items in the knapsack.
+        rng (numpy.random.Generator): Random number generator.
+
+    Returns:
+        numpy.ndarray: A (pop_size, num_items) uint8 matrix of solutions.
+    """
+    return rng.integers(0, 2, size=(pop_size, num_items), dtype=np.uint8)
+
+def greedy_population_array(count, values, weights, capacity, greedy_order, rng, noise=0.1):
+    """
+    Builds feasible rows around the ratio-greedy solution.
+
+    Each row skips every item with probability ``noise`` and packs the rest
+    in greedy order up to the first one that overflows; local search then
+    fills the remaining slack.
+
+    Parameters:
+        count (int): Number of rows.
+        values (numpy.ndarray): Item values.
+        weights (numpy.ndarray): Item weights.
+        capacity (int): Maximum capacity of the knapsack.
+        greedy_order (numpy.ndarray): Item indices by descending value-to-weight ratio.
+        rng (numpy.random.Generator): Random number generator.
+        noise (float): Probability of skipping each item.
+
+    Returns:
+        numpy.ndarray: A (count, num_items) uint8 matrix of feasible solutions.
+    """
+    keep = rng.random((count, len(greedy_order))) >= noise
+    packed = np.cumsum(keep * weights[greedy_order], axis=1) <= capacity
+    rows = np.zeros((count, len(greedy_order)), dtype=np.uint8)
+    rows[:, greedy_order] = keep & packed
+    return local_search_population(rows, values, weights, capacity)
+
+def evaluate_population(population, values, weights, capacity):
+    """
+    Evaluates the whole population with one matrix-vector product per objective.
+
+    Parameters:
+        population (numpy.ndarray): (pop_size, num_items) binary matrix.
+        values (numpy.ndarray): Item values.
+        weights (numpy.ndarray): Item weights.
+        capacity (int): Maximum capacity of the knapsack.
+
+    Returns:
+        tuple: (fitness_values, total_weights) arrays of length pop_size.
+    """
+    total_values = population @ values
+    total_weights = population @ weights
+    fitness_values = np.where(total_weights <= capacity, total_values, 0)
+    return fitness_values, total_weights
+
+def repair_population(population, weights, capacity, ascending_order):
+    """
+    Repairs every infeasible row in place by removing its lowest-ratio items first.
+
+    Parameters:
+        population (numpy.ndarray): (pop_size, num_items) binary matrix.
+        weights (numpy.ndarray): Item weights.
+        capacity (int): Maximum capacity of the knapsack.
+        ascending_order (numpy.ndarray): Item indices sorted by ascending value-to-weight ratio.
+
+    Returns:
+        numpy.ndarray: The repaired population.
+    """
+    total_weights = population @ weights
+    infeasible = np.flatnonzero(total_weights > capacity)
+    if infeasible.size == 0:
+        return population
+
+    excess = total_weights[infeasible] - capacity
+    ordered = population[infeasible][:, ascending_order]
+    contribution = ordered * weights[ascending_order]
+    # An item is dropped if it is selected and the weight removed before it
+    # has not yet brought the row back under capacity
+    removed_before = np.cumsum(contribution, axis=1) - contribution
+    drop = (ordered == 1) & (removed_before < excess[:, None])
+    ordered[drop] = 0
+
+    rows = population[infeasible]
+    rows[:, ascending_order] = ordered
+    population[infeasible] = rows
+    return population
+
+def local_search_population(population, values, weights, capacity):
+    """
+    Adds items in index order to every row while they still fit, in place.
+
+    Only items light enough to fit into the largest remaining slack are
+    visited, which keeps the loop short once the population is repaired.
+
+    Parameters:
+        population (numpy.ndarray): (pop_size, num_items) binary matrix.
+        values (numpy.ndarray): Item values.
+        weights (numpy.ndarray): Item weights.
+        capacity (int): Maximum capacity of the knapsack.
+
+    Returns:
+        numpy.ndarray: The improved population.
+    """
+    total_weights = population @ weights
+    slack = capacity - total_weights
+    if slack.size == 0:
+        return population
+    max_slack = slack.max()
+    candidates = np.flatnonzero((weights <= max_slack) & (values > 0))
+    candidate_weights = weights[candidates].tolist()
+    for i, weight in zip(candidates.tolist(), candidate_weights):
+        if weight > max_slack:
+            continue
+        fits = (population[:, i] == 0) & (weight <= slack)
+        if fits.any():
+            population[fits, i] = 1
+            slack[fits] -= weight
+            max_slack = slack.max()
+    return population
+
+def mutate_population(population, mutation_rate, rng):
+    """
+    Flips every bit of the population with the given probability, in place.
+
+    Parameters:
+        population (numpy.ndarray): (pop_size, num_items) binary matrix.
+        mutation_rate (float): Probability of flipping each bit.
+        rng (numpy.random.Generator): Random number generator.
+
+    Returns:
+        numpy.ndarray: The mutated population.
+    """
+    if mutation_rate > 0:
+        population ^= (rng.random(population.shape) < mutation_rate).astype(np.uint8)
+    return population
+
+def tournament_selection_population(population, fitness_values, rng, tournament_size=5):
+    """
+    Selects parents with one batched draw of all tournaments.
+
+    Contestants are drawn with replacement so that populations smaller than
+    the tournament size are still supported.
+
+    Parameters:
+        population (numpy.ndarray): (pop_size, num_items) binary matrix.
+        fitness_values (numpy.ndarray): Fitness of each row.
+        rng (numpy.random.Generator): Random number generator.
+        tournament_size (int): Number of contestants per tournament.
+
+    Returns:
+        numpy.ndarray: Selected parents as a new matrix.
+    """
+    n = len(population)
+    contestants = rng.integers(0, n, size=(n, tournament_size))
+    winners = contestants[np.arange(n), np.argmax(fitness_values[contestants], axis=1)]
+    return population[winners]
+
+def migration_phase_population(population, rng):
+    """
+    Performs single-point crossover between the two halves of the population.
+
+    Children are laid out in the same order as ``mbo_core.migration_phase``.
+
+    Parameters:
+        population (numpy.ndarray): (pop_size, num_items) binary matrix.
+        rng (numpy.random.Generator): Random number generator.
+
+    Returns:
+        numpy.ndarray: Migrated population.
+    """
+    pop_size, num_items = population.shape
+    mid = pop_size // 2
+    if mid == 0 or num_items < 2:
+        return population.copy()
+    subpop_a = population[:mid]
+    subpop_b = population[mid:][np.arange(mid) % (pop_size - mid)]
+
+    points = rng.integers(1, num_items, size=mid)
+    head = np.arange(num_items) < points[:, None]
+    migrated = np.empty((2 * mid, num_items), dtype=population.dtype)
+    migrated[0::2] = np.where(head, subpop_a, subpop_b)
+    migrated[1::2] = np.where(head, subpop_b, subpop_a)
+
+    if pop_size % 2 != 0:
+        migrated = np.vstack([migrated, population[-1:]])
+    return migrated
+
+def calculate_diversity_population(population):
+    """
+    Calculates the average pairwise Hamming distance from per-item counts.
+
+    Parameters:
+        population (numpy.ndarray): (pop_size, num_items) binary matrix.
+
+    Returns:
+        float: Average Hamming distance between all pairs of rows.
+    """
+    n = len(population)
+    if n < 2:
+        return 0
+    ones = population.sum(axis=0, dtype=np.int64)
+    return int(np.dot(ones, n - ones)) / (n * (n - 1) / 2)
+
+def top_indices(fitness_values, count):
+    """
+    Returns the indices of the ``count`` highest fitness values, best first,
+    keeping earlier indices first on ties.
+
+    The same as the first ``count`` entries of a stable argsort, but the
+    cut-off value is found with an O(n) partition and only the selected
+    indices are sorted.
+
+    Parameters:
+        fitness_values (numpy.ndarray): Fitness of each row.
+        count (int): Number of indices to return.
+
+    Returns:
+        numpy.ndarray: Selected indices.
+    """
+    n = len(fitness_values)
+    count = max(min(count, n), 0)
+    keys = -fitness_values
+    if count == n:
+        return np.argsort(keys, kind='stable')
+    if count == 0:
+        return np.empty(0, dtype=np.intp)
+    # The count smallest keys: all keys below the cut-off, then the first ones equal to it
+    cutoff = np.partition(keys, count - 1)[count - 1]
+    below = np.flatnonzero(keys < cutoff)
+    tied = np.flatnonzero(keys == cutoff)[:count - len(below)]
+    chosen = np.concatenate((below, tied))
+    return chosen[np.lexsort((chosen, keys[chosen]))]
+
+def select_next_generation_population(population, fitness_values, pop_size):
+    """
+    Selects the top rows by fitness, keeping earlier rows first on ties.
+
+    Parameters:
+        population (numpy.ndarray): Combined population matrix.
+        fitness_values (numpy.ndarray): Fitness of each row.
+        pop_size (int): Desired population size.
+
+    Returns:
+        tuple: (selected population, selected fitness values).
+    """
+    order = top_indices(fitness_values, pop_size)
+    return population[order], fitness_values[order]
+
+def main_knapsack_mbo_numpy(values, weights=None, capacity=None, pop_size=50, max_generations=100, mutation_rate=0.01, verbose=True, rng=None,
+                            target_fitness=None, time_limit=None, stop_at_optimum=False, return_stats=False,
+                            greedy_fraction=0.0, greedy_noise=0.1, progress=None):
+    """
+    Matrix-backed MBO engine with the same control flow as ``main_knapsack_mbo``.
+
+    The population is a single (pop_size, num_items) uint8 array and every
+    operator works on the whole population at once.
+
+    Parameters:
+        values (list or KnapsackInstance): List of item values, or the whole
+            instance in place of values, weights and capacity.
+        weights (list): List of item weights.
+        capacity (int): Maximum capacity of the knapsack.
+        pop_size (int): Number of solutions in the population.
+        max_generations (int): Number of generations.
+        mutation_rate (float): Minimum per-bit mutation probability.
+        verbose (bool): Print progress for every generation.
+        rng (numpy.random.Generator, optional): Random number generator. If None,
+            one is seeded from the ``random`` module so ``random.seed`` applies.
+        target_fitness, time_limit, stop_at_optimum, return_stats: Stopping
+            criteria and reporting, as for ``main_knapsack_mbo``.
+        greedy_fraction (float): Share of the initial and re-injected rows
+            built by ``greedy_population_array``.
+        greedy_noise (float): Probability of skipping each item in those rows.
+        progress (callable, optional): Per-generation callback, as for
+            ``main_knapsack_mbo``.
+
+    Returns:
+        tuple: (best_solution, best_fitness, fitness_history, diversity_history),
+            followed by a RunStats if return_stats is set.
+    """
+    started = time.perf_counter()
+    if rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+    instance = as_instance(values, weights, capacity)
+    upper_bound = instance.upper_bound() if stop_at_optimum else None
+    capacity = instance.capacity
+    # Fractional values or weights are kept as floats rather than truncated
+    values = np.asarray(instance.values, dtype=np.int64 if instance.integral_values else np.float64)
+    weights = np.asarray(instance.weights, dtype=np.int64 if all(isinstance(w, int) for w in instance.weights)
+                         else np.float64)
+    num_items = instance.num_items
+    ascending_order = np.asarray(instance.ascending_order, dtype=np.intp)
+    greedy_order = np.asarray(instance.greedy_order, dtype=np.intp)
+
+    def new_rows(count):
+        # Greedy-seeded rows first, then uniformly random ones
+        rows = initialize_population_array(count, num_items, rng)
+        num_seeded = round(count * greedy_fraction)
+        if num_seeded:
+            rows[:num_seeded] = greedy_population_array(num_seeded, values, weights, capacity,
+                                                        greedy_order, rng, greedy_noise)
+        return rows
+
+    population = new_rows(pop_size)
+    population = repair_population(population, weights, capacity, ascending_order)
+
+    best_solution = None
+    best_fitness = 0
+    fitness_history = []
+    diversity_history = []
+
+    # Control parameters
+    min_mutation = mutation_rate
+    max_mutation = 0.1
+    stagnation_limit = 20
+    stagnation_counter = 0
+    elite_size = pop_size // 10
+    stop_reason = None
+
+    for generation in range(max_generations):
+        diversity = calculate_diversity_population(population)
+        diversity_history.append(diversity)
+
+        current_mutation = min_mutation + (max_mutation - min_mutation) * (1 - diversity/1.0)
+
+        fitness_values, _ = evaluate_population(population, values, weights, capacity)
+        best_index = int(np.argmax(fitness_values))
+        current_best = fitness_values[best_index].item()
+
+        if current_best > best_fitness:
+            best_fitness = current_best
+            best_solution = population[best_index].copy()
+            stagnation_counter = 0
+        else:
+            stagnation_counter += 1
+
+        fitness_history.append(best_fitness)
+
+        if verbose:
+            print(f"Generation {generation + 1}: Best Fitness = {best_fitness}, Diversity = {diversity:.3f}")
+
+        stop_reason = check_stop(best_fitness, started, target_fitness, time_limit, upper_bound)
+        if progress is not None:
+            snapshot = GenerationSnapshot(generation + 1, best_fitness, diversity, current_mutation,
+                                          time.perf_counter() - started, best_solution, stop_reason)
+            if progress(snapshot) is False:
+                stop_reason = stop_reason or 'cancelled'
+        if stop_reason:
+            break
+
+        # Elite are taken before re-injection, from the evaluated population
+        elite_indices = top_indices(fitness_values, elite_size)
+        elite = population[elite_indices]
+        elite_fitness = fitness_values[elite_indices]
+
+        if stagnation_counter >= stagnation_limit:
+            num_refresh = pop_size // 4
+            if num_refresh:
+                population[-num_refresh:] = new_rows(num_refresh)
+            stagnation_counter = 0
+
+        parents = tournament_selection_population(population, fitness_values, rng)
+        offspring = migration_phase_population(parents, rng)
+
+        offspring = mutate_population(offspring, current_mutation, rng)
+        offspring = repair_population(offspring, weights, capacity, ascending_order)
+        offspring = local_search_population(offspring, values, weights, capacity)
+        offspring_fitness, _ = evaluate_population(offspring, values, weights, capacity)
+
+        combined_population = np.vstack([elite, offspring])
+        combined_fitness = np.concatenate([elite_fitness, offspring_fitness])
+        population, _ = select_next_generation_population(combined_population, combined_fitness, pop_size)
+
+    if best_solution is None:
+        best_solution = population[0].copy()
+    best_solution = best_solution.astype(int).tolist()
+    stats = RunStats(stop_reason or 'max_generations', len(fitness_history),
+                     time.perf_counter() - started, upper_bound)
+
+    if verbose:
+        print("\nOptimization Complete!")
+        print(f"Stopped By: {stats.stop_reason} after {stats.generations} generations")
+        print(f"Best Fitness: {best_fitness}")
+        print(f"Best Solution: {best_solution}")
+        print(f"Final Diversity: {diversity:.3f}")
+        total_weight = sum(w for w, bit in zip(weights.tolist(), best_solution) if bit)
+        print(f"Total Weight: {total_weight}")
+
+    if return_stats:
+        return best_solution, best_fitness, fitness_history, diversity_history, stats
+    return best_solution, best_fitness, fitness_history, diversity_history
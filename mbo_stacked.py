@@ -0,0 +1,339 @@
+# mbo_stacked.py
+
+import random
+import time
+
+import numpy as np
+
+from knapsack_instance import KnapsackInstance, as_instance
+from mbo_core import RunStats
+
+class StackedInstances:
+    """
+    Many knapsack instances padded to a common item count and stacked into arrays.
+
+    Each instance's items are laid out by ascending value-to-weight ratio,
+    the order in which repair removes them, so repairing needs no gathers;
+    ``item_index`` maps columns back to item numbers. Padding items come
+    last, have zero value and weight and are never selected, so a padded
+    solution has the fitness of the original one.
+
+    Attributes:
+        instances (list): The KnapsackInstance objects, in stacking order.
+        values (numpy.ndarray): (K, N) item values, by column.
+        weights (numpy.ndarray): (K, N) item weights, by column.
+        capacities (numpy.ndarray): (K,) capacities.
+        num_items (numpy.ndarray): (K,) real item count of each instance.
+        item_mask (numpy.ndarray): (K, N) True for the columns of real items.
+        item_index (numpy.ndarray): (K, N) item number held by each column;
+            padding columns hold numbers from num_items on.
+        item_column (numpy.ndarray): (K, N) column of each item number.
+        greedy_order (numpy.ndarray): (K, N) columns by descending ratio,
+            ties by item number, padding last.
+    """
+
+    def __init__(self, instances):
+        self.instances = [instance if isinstance(instance, KnapsackInstance) else as_instance(*instance)
+                          for instance in instances]
+        count = len(self.instances)
+        width = max((instance.num_items for instance in self.instances), default=0)
+        # Fractional values, weights or capacities make the arrays float rather than truncated
+        integral = all(instance.integral_values for instance in self.instances)
+        integral_weights = all(isinstance(w, int) for instance in self.instances for w in instance.weights)
+        integral_weights = integral_weights and all(isinstance(instance.capacity, int) for instance in self.instances)
+        self.values = np.zeros((count, width), dtype=np.int64 if integral else np.float64)
+        self.weights = np.zeros((count, width), dtype=np.int64 if integral_weights else np.float64)
+        self.capacities = np.array([instance.capacity for instance in self.instances], dtype=self.weights.dtype)
+        self.num_items = np.array([instance.num_items for instance in self.instances], dtype=np.int64)
+        self.item_mask = np.arange(width) < self.num_items[:, None]
+        self.item_index = np.tile(np.arange(width), (count, 1))
+        greedy_items = self.item_index.copy()
+        for k, instance in enumerate(self.instances):
+            n = instance.num_items
+            self.item_index[k, :n] = instance.ascending_order
+            self.values[k, :n] = np.take(instance.values, instance.ascending_order)
+            self.weights[k, :n] = np.take(instance.weights, instance.ascending_order)
+            greedy_items[k, :n] = instance.greedy_order
+        self.item_column = np.argsort(self.item_index, axis=1)
+        self.greedy_order = np.take_along_axis(self.item_column, greedy_items, axis=1)
+
+    def solution(self, k, row):
+        """Returns a row of instance k as a binary list in item order."""
+        return row[self.item_column[k, :self.num_items[k]]].astype(int).tolist()
+
+    def __len__(self):
+        return len(self.instances)
+
+    def select(self, which):
+        """Returns the arrays of the instances picked by an index or mask, as a dict."""
+        return dict(values=self.values[which], weights=self.weights[which], capacities=self.capacities[which],
+                    item_mask=self.item_mask[which], item_column=self.item_column[which],
+                    greedy_order=self.greedy_order[which])
+
+def random_rows_stacked(count, item_mask, rng):
+    """Random (K, count, N) rows with the padding items cleared."""
+    rows = rng.integers(0, 2, size=(len(item_mask), count, item_mask.shape[1]), dtype=np.uint8)
+    rows &= item_mask[:, None, :]
+    return rows
+
+def greedy_rows_stacked(count, values, weights, capacities, item_mask, item_column, greedy_order, rng, noise=0.1):
+    """
+    Builds feasible rows around each instance's ratio-greedy solution, as
+    ``mbo_numpy.greedy_population_array`` does for one instance.
+
+    Returns:
+        numpy.ndarray: A (K, count, N) uint8 tensor.
+    """
+    order = greedy_order[:, None, :]
+    keep = rng.random((len(values), count, values.shape[1])) >= noise
+    ordered_weights = np.take_along_axis(weights, greedy_order, axis=1)[:, None, :]
+    packed = np.cumsum(keep * ordered_weights, axis=2) <= capacities[:, None, None]
+    rows = np.zeros(keep.shape, dtype=np.uint8)
+    np.put_along_axis(rows, np.broadcast_to(order, rows.shape), keep & packed, axis=2)
+    rows &= item_mask[:, None, :]
+    return local_search_stacked(rows, values, weights, capacities, item_column)
+
+def evaluate_stacked(population, values, weights, capacities):
+    """
+    Evaluates every row of every instance.
+
+    Parameters:
+        population (numpy.ndarray): (K, P, N) binary tensor.
+        values, weights (numpy.ndarray): (K, N) item values and weights.
+        capacities (numpy.ndarray): (K,) capacities.
+
+    Returns:
+        tuple: (fitness_values, total_weights) arrays of shape (K, P).
+    """
+    total_values = np.einsum('kpn,kn->kp', population, values)
+    total_weights = np.einsum('kpn,kn->kp', population, weights)
+    fitness_values = np.where(total_weights <= capacities[:, None], total_values, 0)
+    return fitness_values, total_weights
+
+def repair_stacked(population, weights, capacities):
+    """
+    Repairs every infeasible row in place by removing its lowest-ratio items
+    first, like ``mbo_numpy.repair_population`` per instance. Columns are
+    already in ascending ratio order, see StackedInstances.
+
+    Returns:
+        numpy.ndarray: The repaired population.
+    """
+    excess = np.einsum('kpn,kn->kp', population, weights) - capacities[:, None]
+    if not (excess > 0).any():
+        return population
+    contribution = population * weights[:, None, :]
+    # Feasible rows have no positive excess, so nothing is dropped from them
+    removed_before = np.cumsum(contribution, axis=2) - contribution
+    population[(population == 1) & (removed_before < excess[:, :, None])] = 0
+    return population
+
+def local_search_stacked(population, values, weights, capacities, item_column):
+    """
+    Adds items in item-number order to every row while they still fit, in
+    place, like ``mbo_numpy.local_search_population`` per instance.
+
+    Returns:
+        numpy.ndarray: The improved population.
+    """
+    slack = capacities[:, None] - np.einsum('kpn,kn->kp', population, weights)
+    instances = np.arange(len(population))
+    for i in range(population.shape[2]):
+        column = item_column[:, i]
+        weight = weights[instances, column][:, None]
+        bits = population[instances, :, column]
+        fits = (bits == 0) & (weight <= slack) & (values[instances, column][:, None] > 0)
+        population[instances, :, column] = bits | fits
+        slack -= fits * weight
+    return population
+
+def mutate_stacked(population, mutation_rates, item_mask, rng):
+    """Flips every real item bit with its instance's mutation rate, in place."""
+    flips = rng.random(population.shape) < mutation_rates[:, None, None]
+    population ^= (flips & item_mask[:, None, :]).astype(np.uint8)
+    return population
+
+def tournament_selection_stacked(population, fitness_values, rng, tournament_size=5):
+    """Runs P tournaments within each instance in one batched draw, as ``tournament_selection_population`` does."""
+    count, pop_size = fitness_values.shape
+    contestants = rng.integers(0, pop_size, size=(count, pop_size, tournament_size))
+    rows = np.arange(count)[:, None, None]
+    best = np.argmax(fitness_values[rows, contestants], axis=2)
+    winners = np.take_along_axis(contestants, best[:, :, None], axis=2)[:, :, 0]
+    return population[np.arange(count)[:, None], winners]
+
+def migration_phase_stacked(population, num_items, item_index, rng):
+    """
+    Single-point crossover between the two halves of every instance's
+    population, cutting within each instance's own items by item number.
+    """
+    count, pop_size, width = population.shape
+    mid = pop_size // 2
+    if mid == 0 or width < 2:
+        return population.copy()
+    subpop_a = population[:, :mid]
+    subpop_b = population[:, mid:][:, np.arange(mid) % (pop_size - mid)]
+
+    # Cut points uniform in [1, num_items - 1], as rng.integers(1, num_items) per instance
+    spans = np.maximum(num_items - 1, 1)[:, None]
+    points = 1 + (rng.random((count, mid)) * spans).astype(np.int64)
+    head = item_index[:, None, :] < points[:, :, None]
+    migrated = np.empty((count, 2 * mid, width), dtype=population.dtype)
+    migrated[:, 0::2] = np.where(head, subpop_a, subpop_b)
+    migrated[:, 1::2] = np.where(head, subpop_b, subpop_a)
+
+    if pop_size % 2 != 0:
+        migrated = np.concatenate([migrated, population[:, -1:]], axis=1)
+    return migrated
+
+def diversity_stacked(population):
+    """Average pairwise Hamming distance of each instance's population, shape (K,)."""
+    pop_size = population.shape[1]
+    if pop_size < 2:
+        return np.zeros(len(population))
+    ones = population.sum(axis=1, dtype=np.int64)
+    return (ones * (pop_size - ones)).sum(axis=1) / (pop_size * (pop_size - 1) / 2)
+
+def stacked_knapsack_mbo(instances, pop_size=50, max_generations=100, mutation_rate=0.01, verbose=False,
+                         rng=None, target_fitness=None, time_limit=None, stop_at_optimum=False,
+                         return_stats=False, greedy_fraction=0.0, greedy_noise=0.1):
+    """
+    Runs the numpy-engine MBO on many small instances at once.
+
+    The instances are padded to a common item count and their populations
+    stacked into one (K, pop_size, N) tensor, so every operator is one array
+    operation for all of them and the per-call overhead of
+    ``main_knapsack_mbo`` is paid once per generation instead of once per
+    instance. Each instance follows the control flow of
+    ``mbo_numpy.main_knapsack_mbo_numpy`` with its own mutation rate,
+    stagnation counter and stopping criteria; the random draws differ, so
+    results are not identical to solving the instances one by one. Meant for
+    thousands of instances with tens of items; large ones are better solved
+    separately, since every instance pays for the largest.
+
+    Parameters:
+        instances (list): KnapsackInstance objects or (values, weights, capacity) tuples.
+        pop_size, max_generations, mutation_rate, greedy_fraction, greedy_noise:
+            As for ``main_knapsack_mbo``, shared by all instances.
+        verbose (bool): Print a summary at the end.
+        rng (numpy.random.Generator, optional): Random number generator. If None,
+            one is seeded from the ``random`` module so ``random.seed`` applies.
+        target_fitness (int, optional): Stop each instance once it reaches this fitness.
+        time_limit (float, optional): Stop all instances after this many seconds.
+        stop_at_optimum (bool): Stop each instance at its Dantzig upper bound.
+        return_stats (bool): Add a RunStats to each result.
+
+    Returns:
+        list: One (best_solution, best_fitness, fitness_history, diversity_history)
+            tuple per instance, in order, each followed by a RunStats if
+            return_stats is set.
+    """
+    started = time.perf_counter()
+    if rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+    stacked = StackedInstances(instances)
+    count = len(stacked)
+    if count == 0:
+        return []
+    values, weights, capacities = stacked.values, stacked.weights, stacked.capacities
+    item_mask = stacked.item_mask
+    upper_bounds = ([instance.upper_bound() for instance in stacked.instances] if stop_at_optimum
+                    else [None] * count)
+    bounds = np.array([bound if bound is not None else np.inf for bound in upper_bounds])
+    target = np.inf if target_fitness is None else target_fitness
+
+    def new_rows(num_rows, which):
+        # Greedy-seeded rows first, then uniformly random ones, for the instances in which
+        arrays = stacked.select(which)
+        rows = random_rows_stacked(num_rows, arrays['item_mask'], rng)
+        num_seeded = round(num_rows * greedy_fraction)
+        if num_seeded:
+            rows[:, :num_seeded] = greedy_rows_stacked(num_seeded, rng=rng, noise=greedy_noise, **arrays)
+        return rows
+
+    everyone = np.arange(count)
+    population = new_rows(pop_size, everyone)
+    population = repair_stacked(population, weights, capacities)
+
+    best_solutions = np.zeros(values.shape, dtype=np.uint8)
+    best_fitness = np.zeros(count, dtype=values.dtype)
+    fitness_history = [[] for _ in range(count)]
+    diversity_history = [[] for _ in range(count)]
+    stop_reasons = [None] * count
+    active = np.ones(count, dtype=bool)
+
+    # Control parameters
+    min_mutation = mutation_rate
+    max_mutation = 0.1
+    stagnation_limit = 20
+    stagnation_counter = np.zeros(count, dtype=np.int64)
+    elite_size = pop_size // 10
+    num_refresh = pop_size // 4
+
+    for _ in range(max_generations):
+        diversity = diversity_stacked(population)
+        current_mutation = min_mutation + (max_mutation - min_mutation) * (1 - diversity/1.0)
+
+        fitness_values, _ = evaluate_stacked(population, values, weights, capacities)
+        best_index = np.argmax(fitness_values, axis=1)
+        current_best = fitness_values[everyone, best_index]
+
+        improved = active & (current_best > best_fitness)
+        best_fitness[improved] = current_best[improved]
+        best_solutions[improved] = population[improved, best_index[improved]]
+        stagnation_counter = np.where(improved, 0, stagnation_counter + 1)
+
+        # Histories and stopping only concern instances still running
+        timed_out = time_limit is not None and time.perf_counter() - started >= time_limit
+        for k in np.flatnonzero(active).tolist():
+            fitness_history[k].append(best_fitness[k].item())
+            diversity_history[k].append(float(diversity[k]))
+            if best_fitness[k] >= bounds[k]:
+                stop_reasons[k] = 'optimal'
+            elif best_fitness[k] >= target:
+                stop_reasons[k] = 'target_fitness'
+            elif timed_out:
+                stop_reasons[k] = 'time_limit'
+            if stop_reasons[k]:
+                active[k] = False
+        if not active.any():
+            break
+
+        # Elite are taken before re-injection, from the evaluated population
+        order = np.argsort(-fitness_values, axis=1, kind='stable')
+        elite_indices = order[:, :elite_size]
+        elite = np.take_along_axis(population, elite_indices[:, :, None], axis=1)
+        elite_fitness = np.take_along_axis(fitness_values, elite_indices, axis=1)
+
+        stagnant = np.flatnonzero(stagnation_counter >= stagnation_limit)
+        if stagnant.size:
+            if num_refresh:
+                population[stagnant, -num_refresh:] = new_rows(num_refresh, stagnant)
+            stagnation_counter[stagnant] = 0
+
+        parents = tournament_selection_stacked(population, fitness_values, rng)
+        offspring = migration_phase_stacked(parents, stacked.num_items, stacked.item_index, rng)
+
+        offspring = mutate_stacked(offspring, current_mutation, item_mask, rng)
+        offspring = repair_stacked(offspring, weights, capacities)
+        offspring = local_search_stacked(offspring, values, weights, capacities, stacked.item_column)
+        offspring_fitness, _ = evaluate_stacked(offspring, values, weights, capacities)
+
+        combined_population = np.concatenate([elite, offspring], axis=1)
+        combined_fitness = np.concatenate([elite_fitness, offspring_fitness], axis=1)
+        survivors = np.argsort(-combined_fitness, axis=1, kind='stable')[:, :pop_size]
+        population = np.take_along_axis(combined_population, survivors[:, :, None], axis=1)
+
+    elapsed = time.perf_counter() - started
+    results = []
+    for k, instance in enumerate(stacked.instances):
+        solution = stacked.solution(k, best_solutions[k])
+        result = (solution, best_fitness[k].item(), fitness_history[k], diversity_history[k])
+        if return_stats:
+            result += (RunStats(stop_reasons[k] or 'max_generations', len(fitness_history[k]), elapsed,
+                                upper_bounds[k]),)
+        results.append(result)
+
+    if verbose:
+        print(f"Solved {count} instances in {elapsed:.3f}s ({count / elapsed:.1f} instances/s)")
+    return results
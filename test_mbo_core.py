@@ -1,7 +1,14 @@
 # test_mbo_core.py
 
+import random
 import unittest
-from mbo_core import generate_random_solution, fitness, repair
+from mbo_core import generate_random_solution, fitness, repair, main_knapsack_mbo
+
+def pairwise_diversity(population):
+    n = len(population)
+    total = sum(sum(a != b for a, b in zip(population[i], population[j]))
+                for i in range(n) for j in range(i + 1, n))
+    return total / (n * (n-1) / 2)
 
 class TestMBOCore(unittest.TestCase):
     
@@ -47,5 +54,1016 @@ class TestMBOCore(unittest.TestCase):
         expected_solution = [1, 1, 0]
         self.assertEqual(repaired, expected_solution)
 
+    def test_calculate_diversity(self):
+        from mbo_core import calculate_diversity
+        population = [generate_random_solution(30) for _ in range(12)]
+        self.assertEqual(calculate_diversity(population), pairwise_diversity(population))
+
+    def test_allele_counts_incremental_update(self):
+        from mbo_core import AlleleCounts, select_next_generation
+        population = [generate_random_solution(20) for _ in range(10)]
+        counts = AlleleCounts(population)
+        combined = population[:3] + [generate_random_solution(20) for _ in range(10)]
+        fitness_values = [random.random() for _ in combined]
+        selected = select_next_generation(combined, fitness_values, 10, allele_counts=counts)
+        self.assertEqual(counts.diversity(), pairwise_diversity(selected))
+
+class TestKnapsackInstance(unittest.TestCase):
+
+    def setUp(self):
+        from knapsack_instance import KnapsackInstance
+        self.instance = KnapsackInstance([60, 100, 120], [10, 20, 30], 50)
+
+    def test_precomputed_orders(self):
+        self.assertEqual(self.instance.ascending_order, [2, 1, 0])
+        self.assertEqual(self.instance.greedy_order, [0, 1, 2])
+        self.assertEqual(self.instance.prefix_weights, [0, 10, 30, 60])
+        self.assertEqual(self.instance.prefix_values, [0, 60, 160, 280])
+        values, weights, capacity = self.instance
+        self.assertEqual((values, weights, capacity), ([60, 100, 120], [10, 20, 30], 50))
+
+    def test_operators_accept_instance(self):
+        from mbo_core import local_search
+        values, weights, capacity = self.instance
+        for solution in ([1, 1, 1], [0, 1, 1], [0, 0, 1], [0, 0, 0]):
+            self.assertEqual(fitness(solution, self.instance), fitness(solution, values, weights, capacity))
+            self.assertEqual(repair(solution, self.instance), repair(solution, weights, capacity, values))
+            repaired = repair(solution, self.instance)
+            self.assertEqual(local_search(repaired, self.instance),
+                             local_search(repaired, values, weights, capacity))
+
+class TestStoppingCriteria(unittest.TestCase):
+
+    def setUp(self):
+        from knapsack_instance import KnapsackInstance
+        self.instance = KnapsackInstance([60, 100, 120], [10, 20, 30], 50)
+
+    def test_upper_bound(self):
+        from knapsack_instance import KnapsackInstance
+        # Items 1 and 2 fit whole, two thirds of item 3 fill the rest: 160 + 80
+        self.assertEqual(self.instance.upper_bound(), 240)
+        self.assertEqual(KnapsackInstance([5, 4], [1, 1], 10).upper_bound(), 9)
+
+    def test_upper_bound_with_float_values(self):
+        from itertools import product
+        from knapsack_instance import KnapsackInstance
+        instance = KnapsackInstance([0.41, 0.23, 0.96, 1.88], [0.13, 0.89, 1.67, 1.6], 1.16)
+        self.assertFalse(instance.integral_values)
+        self.assertGreaterEqual(instance.upper_bound(), 0.64)
+        rng = random.Random(9)
+        for _ in range(200):
+            n = rng.randint(1, 8)
+            values = [round(rng.uniform(0, 2), 2) for _ in range(n)]
+            weights = [round(rng.uniform(0.01, 2), 2) for _ in range(n)]
+            instance = KnapsackInstance(values, weights, round(rng.uniform(0, 3), 2))
+            optimum = max(fitness(list(bits), instance) for bits in product((0, 1), repeat=n))
+            self.assertGreaterEqual(instance.upper_bound(), optimum - 1e-9)
+
+    def test_stops_at_optimum(self):
+        from knapsack_instance import KnapsackInstance
+        instance = KnapsackInstance([60, 100, 120], [10, 20, 30], 60)
+        for engine in ('python', 'numpy'):
+            result = main_knapsack_mbo(instance, pop_size=10, max_generations=50, verbose=False,
+                                       engine=engine, stop_at_optimum=True, return_stats=True)
+            best_sol, best_fit, fitness_history, diversity_history, stats = result
+            self.assertEqual(best_fit, 280)
+            self.assertEqual(stats.stop_reason, 'optimal')
+            self.assertEqual(stats.generations, len(fitness_history))
+            self.assertLess(len(fitness_history), 50)
+
+    def test_target_fitness_and_time_limit(self):
+        stats = main_knapsack_mbo(self.instance, pop_size=10, max_generations=50, verbose=False,
+                                  target_fitness=1, return_stats=True)[-1]
+        self.assertEqual(stats.stop_reason, 'target_fitness')
+        stats = main_knapsack_mbo(self.instance, pop_size=10, max_generations=50, verbose=False,
+                                  time_limit=0, return_stats=True)[-1]
+        self.assertEqual((stats.stop_reason, stats.generations), ('time_limit', 1))
+        stats = main_knapsack_mbo(self.instance, pop_size=10, max_generations=5, verbose=False,
+                                  return_stats=True)[-1]
+        self.assertEqual(stats.stop_reason, 'max_generations')
+
+class TestGreedySeeding(unittest.TestCase):
+
+    def setUp(self):
+        from knapsack_instance import KnapsackInstance
+        random.seed(5)
+        self.instance = KnapsackInstance([random.randint(1, 100) for _ in range(200)],
+                                         [random.randint(1, 100) for _ in range(200)], 2000)
+
+    def test_seeded_solutions_are_feasible(self):
+        from mbo_core import generate_greedy_solution, initialize_population
+        instance = self.instance
+        for _ in range(10):
+            greedy = generate_greedy_solution(instance, noise=0)
+            self.assertLessEqual(sum(w for w, bit in zip(instance.weights, greedy) if bit), instance.capacity)
+            # Without noise nothing more fits afterwards
+            slack = instance.capacity - sum(w for w, bit in zip(instance.weights, greedy) if bit)
+            self.assertTrue(all(greedy[i] or instance.weights[i] > slack for i in range(instance.num_items)))
+        population = initialize_population(20, instance.num_items, instance, greedy_fraction=0.5)
+        self.assertEqual(len(population), 20)
+        for sol in population[:10]:
+            self.assertGreater(fitness(sol, instance), 0)
+
+    def test_seeding_improves_start(self):
+        results = {}
+        for engine in ('python', 'numpy'):
+            for greedy_fraction in (0.0, 0.5):
+                random.seed(3)
+                results[engine, greedy_fraction] = main_knapsack_mbo(
+                    self.instance, pop_size=20, max_generations=1, verbose=False,
+                    engine=engine, greedy_fraction=greedy_fraction)[1]
+            self.assertGreater(results[engine, 0.5], results[engine, 0.0])
+            self.assertLessEqual(results[engine, 0.5], self.instance.upper_bound())
+
+class TestProgress(unittest.TestCase):
+
+    def setUp(self):
+        from knapsack_instance import KnapsackInstance
+        self.instance = KnapsackInstance([60, 100, 120, 30, 70], [10, 20, 30, 15, 25], 60)
+
+    def test_iterator_matches_run(self):
+        from mbo_core import iter_knapsack_mbo
+        random.seed(8)
+        snapshots = list(iter_knapsack_mbo(self.instance, pop_size=10, max_generations=15))
+        random.seed(8)
+        best_sol, best_fit, fitness_history, diversity_history = main_knapsack_mbo(
+            self.instance, pop_size=10, max_generations=15, verbose=False)
+        self.assertEqual([s.generation for s in snapshots], list(range(1, 16)))
+        self.assertEqual([s.best_fitness for s in snapshots], fitness_history)
+        self.assertEqual([s.diversity for s in snapshots], diversity_history)
+        self.assertEqual(snapshots[-1].best_solution, best_sol)
+
+    def test_progress_cancels_run(self):
+        for engine in ('python', 'numpy'):
+            seen = []
+            result = main_knapsack_mbo(self.instance, pop_size=10, max_generations=50, verbose=False,
+                                       engine=engine, return_stats=True,
+                                       progress=lambda snapshot: seen.append(snapshot) or len(seen) < 3)
+            self.assertEqual(len(seen), 3)
+            self.assertEqual(len(result[2]), 3)
+            self.assertEqual(result[-1].stop_reason, 'cancelled')
+            self.assertIsNotNone(seen[0].mutation_rate)
+
+class TestProfiling(unittest.TestCase):
+
+    def test_profile_does_not_change_run(self):
+        from knapsack_instance import KnapsackInstance
+        from mbo_core import PHASES
+        random.seed(6)
+        instance = KnapsackInstance([random.randint(1, 100) for _ in range(40)],
+                                    [random.randint(1, 100) for _ in range(40)], 600)
+        for delta_evaluation in (False, True):
+            random.seed(2)
+            expected = main_knapsack_mbo(instance, pop_size=20, max_generations=10, verbose=False,
+                                         delta_evaluation=delta_evaluation)
+            random.seed(2)
+            result = main_knapsack_mbo(instance, pop_size=20, max_generations=10, verbose=False,
+                                       delta_evaluation=delta_evaluation, profile=True, return_stats=True)
+            self.assertEqual(result[:4], expected)
+            profile = result[4].profile
+            self.assertEqual(set(profile.times), set(PHASES))
+            self.assertGreater(profile.times['mutate_and_search'], 0)
+            self.assertGreaterEqual(profile.evaluations, 20 * 10)
+            self.assertGreater(profile.bits_flipped, 0)
+        self.assertIsNone(main_knapsack_mbo(instance, pop_size=10, max_generations=2, verbose=False,
+                                            return_stats=True)[4].profile)
+        with self.assertRaises(ValueError):
+            main_knapsack_mbo(instance, pop_size=10, max_generations=2, verbose=False, engine='numpy', profile=True)
+
+class TestInPlace(unittest.TestCase):
+
+    def test_in_place_operators_match_copying_ones(self):
+        from knapsack_instance import KnapsackInstance
+        from mbo_core import (local_search, local_search_in_place, migration_phase, migration_phase_into,
+                              mutate, mutate_in_place, repair, repair_in_place)
+        random.seed(9)
+        instance = KnapsackInstance([random.randint(1, 100) for _ in range(30)],
+                                    [random.randint(1, 100) for _ in range(30)], 400)
+        population = [generate_random_solution(30) for _ in range(7)]
+        random.seed(1)
+        expected = migration_phase(population)
+        out = [[0] * 30 for _ in range(7)]
+        random.seed(1)
+        migration_phase_into(population, out)
+        self.assertEqual(out, expected)
+        
+        sol = population[0]
+        random.seed(2)
+        mutated = mutate(sol, 0.2)
+        in_place = sol.copy()
+        random.seed(2)
+        flips = mutate_in_place(in_place, 0.2)
+        self.assertEqual((in_place, flips), (mutated, sum(a != b for a, b in zip(sol, mutated))))
+        repaired = repair(mutated, instance)
+        self.assertEqual(repair_in_place(in_place, instance), sum(mutated) - sum(repaired))
+        self.assertEqual(in_place, repaired)
+        searched = local_search(repaired, instance)
+        self.assertEqual(local_search_in_place(in_place, instance), sum(searched) - sum(repaired))
+        self.assertEqual(in_place, searched)
+
+    def test_same_run_as_copying_loop(self):
+        from knapsack_instance import KnapsackInstance
+        instance = KnapsackInstance([60, 100, 120, 30, 70, 20, 90], [10, 20, 30, 15, 25, 5, 35], 80)
+        for pop_size in (10, 15):
+            random.seed(12)
+            expected = main_knapsack_mbo(instance, pop_size=pop_size, max_generations=60, verbose=False)
+            random.seed(12)
+            result = main_knapsack_mbo(instance, pop_size=pop_size, max_generations=60, verbose=False,
+                                       in_place=True)
+            self.assertEqual(result, expected)
+        with self.assertRaises(ValueError):
+            main_knapsack_mbo(instance, pop_size=10, max_generations=2, verbose=False, in_place=True,
+                              delta_evaluation=True)
+
+class TestGeometricMutation(unittest.TestCase):
+
+    def test_flip_positions_distribution(self):
+        from mbo_core import flip_positions
+        self.assertEqual(list(flip_positions(20, 0.0)), [])
+        self.assertEqual(list(flip_positions(20, 1.0)), list(range(20)))
+        random.seed(4)
+        num_items, rate, draws = 50, 0.05, 4000
+        hits = [0] * num_items
+        total = 0
+        for _ in range(draws):
+            positions = list(flip_positions(num_items, rate))
+            self.assertEqual(positions, sorted(set(positions)))
+            for i in positions:
+                hits[i] += 1
+            total += len(positions)
+        # Mean flips per solution is n * p = 2.5, and every position is hit about p * draws = 200 times
+        self.assertAlmostEqual(total / draws, num_items * rate, delta=0.15)
+        self.assertTrue(all(120 < count < 290 for count in hits))
+
+    def test_geometric_run(self):
+        from knapsack_instance import KnapsackInstance
+        from mbo_core import mutate_delta, solution_totals
+        instance = KnapsackInstance([60, 100, 120, 30, 70, 20, 90], [10, 20, 30, 15, 25, 5, 35], 80)
+        sol = [1, 0, 1, 0, 1, 0, 1]
+        mutated, totals = mutate_delta(sol, 0.3, solution_totals(sol, instance), instance, geometric=True)
+        self.assertEqual(totals, solution_totals(mutated, instance))
+        results = []
+        for options in ({}, {'in_place': True}, {}):
+            random.seed(8)
+            results.append(main_knapsack_mbo(instance, pop_size=10, max_generations=30, verbose=False,
+                                             geometric_mutation=True, **options))
+        best_solution, best_fitness = results[0][:2]
+        self.assertLessEqual(sum(w for w, bit in zip(instance.weights, best_solution) if bit), instance.capacity)
+        self.assertEqual(fitness(best_solution, instance), best_fitness)
+        self.assertEqual(results[1], results[0])
+        self.assertEqual(results[2], results[0])
+        with self.assertRaises(ValueError):
+            main_knapsack_mbo(instance, pop_size=10, max_generations=2, verbose=False, engine='numpy',
+                              geometric_mutation=True)
+
+class TestSelection(unittest.TestCase):
+
+    def test_partial_selection_matches_full_sort(self):
+        import numpy as np
+        from mbo_core import PARTIAL_SELECTION_MIN, rank_indices, worst_indices
+        from mbo_numpy import top_indices
+        random.seed(6)
+        for num in (40, PARTIAL_SELECTION_MIN + 100):
+            # Few distinct values, so many ties straddle the cut-off
+            fitness_values = [random.randint(0, 30) for _ in range(num)]
+            for count in (0, 1, 7, num // 2, num):
+                self.assertEqual(rank_indices(fitness_values, count),
+                                 sorted(range(num), key=fitness_values.__getitem__, reverse=True)[:count])
+                self.assertEqual(worst_indices(fitness_values, count),
+                                 sorted(range(num), key=fitness_values.__getitem__)[:count])
+                array = np.array(fitness_values)
+                self.assertEqual(top_indices(array, count).tolist(),
+                                 np.argsort(-array, kind='stable')[:count].tolist())
+
+    def test_batch_tournament(self):
+        from mbo_core import batch_tournament_indices
+        fitness_values = list(range(50))
+        random.seed(2)
+        winners = batch_tournament_indices(fitness_values, count=30)
+        random.seed(2)
+        self.assertEqual(batch_tournament_indices(fitness_values, count=30), winners)
+        self.assertEqual(len(winners), 30)
+        self.assertTrue(all(0 <= i < 50 for i in winners))
+        # The best of five draws averages well above the population mean
+        self.assertGreater(sum(fitness_values[i] for i in winners) / 30, 30)
+        self.assertEqual(len(batch_tournament_indices(fitness_values)), 50)
+
+    def test_steady_state_and_batch_tournament_runs(self):
+        from knapsack_instance import KnapsackInstance
+        random.seed(13)
+        instance = KnapsackInstance([random.randint(1, 100) for _ in range(40)],
+                                    [random.randint(1, 40) for _ in range(40)], 300)
+        for options in ({'steady_state': 4}, {'batch_tournament': True},
+                        {'steady_state': 3, 'batch_tournament': True}):
+            runs = []
+            for _ in range(2):
+                random.seed(1)
+                runs.append(main_knapsack_mbo(instance, pop_size=20, max_generations=80, verbose=False, **options))
+            self.assertEqual(runs[0], runs[1])
+            best_solution, best_fitness, fitness_history, _ = runs[0]
+            self.assertEqual(fitness(best_solution, instance), best_fitness)
+            self.assertGreater(best_fitness, 0)
+            self.assertEqual(fitness_history, sorted(fitness_history))
+        with self.assertRaises(ValueError):
+            main_knapsack_mbo(instance, pop_size=20, max_generations=2, verbose=False, steady_state=4,
+                              delta_evaluation=True)
+
+class TestSwapLocalSearch(unittest.TestCase):
+
+    def setUp(self):
+        from knapsack_instance import KnapsackInstance
+        rng = random.Random(3)
+        self.instances = []
+        for _ in range(50):
+            n = rng.randint(1, 30)
+            self.instances.append(KnapsackInstance([rng.randint(0, 100) for _ in range(n)],
+                                                   [rng.randint(0, 30) for _ in range(n)], rng.randint(0, 200)))
+
+    def test_swap_improves_and_keeps_totals(self):
+        from mbo_core import local_search, local_search_delta, solution_totals
+        random.seed(4)
+        for instance in self.instances:
+            sol = repair(generate_random_solution(instance.num_items), instance)
+            searched = local_search(sol, instance, mode='swap')
+            weight, value = solution_totals(searched, instance)
+            self.assertLessEqual(weight, instance.capacity)
+            self.assertGreaterEqual(value, fitness(sol, instance))
+            self.assertEqual(local_search_delta(sol, solution_totals(sol, instance), instance, 'swap'),
+                             (searched, (weight, value)))
+            # Nothing more fits, and searching again finds no move
+            slack = instance.capacity - weight
+            for i in range(instance.num_items):
+                if not searched[i]:
+                    self.assertFalse(instance.weights[i] <= slack and instance.values[i] > 0)
+            self.assertEqual(local_search(searched, instance.values, instance.weights, instance.capacity,
+                                          mode='swap'), searched)
+
+    def test_weight_index_chain(self):
+        instance = self.instances[0]
+        sorted_weights, weight_order, best_before = instance.weight_index()
+        self.assertEqual(sorted_weights, sorted(instance.weights))
+        for p, best in enumerate(best_before):
+            prefix = [instance.values[i] for i in weight_order[:p + 1]]
+            self.assertEqual(instance.values[weight_order[best]], max(prefix))
+        self.assertIs(instance.weight_index(), instance.weight_index())
+
+    def test_solver_modes(self):
+        from exact_solvers import dp_knapsack
+        values = [random.Random(i).randint(1, 100) for i in range(40)]
+        weights = [random.Random(i + 40).randint(1, 30) for i in range(40)]
+        capacity = sum(weights) // 3
+        random.seed(5)
+        result = main_knapsack_mbo(values, weights, capacity, pop_size=20, max_generations=30, verbose=False,
+                                   local_search_mode='swap')
+        self.assertEqual(result[1], dp_knapsack(values, weights, capacity, verbose=False)[1])
+        for options in ({'delta_evaluation': True}, {'in_place': True}):
+            random.seed(5)
+            self.assertEqual(main_knapsack_mbo(values, weights, capacity, pop_size=20, max_generations=30,
+                                               verbose=False, local_search_mode='swap', **options), result)
+        with self.assertRaises(ValueError):
+            main_knapsack_mbo(values, weights, capacity, verbose=False, local_search_mode='swap', engine='numpy')
+        with self.assertRaises(ValueError):
+            main_knapsack_mbo(values, weights, capacity, verbose=False, local_search_mode='2opt')
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        import os
+        import tempfile
+        from knapsack_instance import KnapsackInstance
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'run.ckpt')
+        random.seed(17)
+        self.instance = KnapsackInstance([random.randint(1, 100) for _ in range(40)],
+                                         [random.randint(1, 40) for _ in range(40)], 300)
+
+    def run_mbo(self, seed, max_generations=60, **options):
+        random.seed(seed)
+        return main_knapsack_mbo(self.instance, pop_size=16, max_generations=max_generations, verbose=False,
+                                 **options)
+
+    def test_resumed_run_is_identical(self):
+        import os
+        for options in ({}, {'delta_evaluation': True}, {'steady_state': 4}):
+            expected = self.run_mbo(3, **options)
+            # Cancel after 27 generations; the last checkpoint is from generation 20
+            self.run_mbo(3, checkpoint_path=self.path, checkpoint_every=10,
+                         progress=lambda snapshot: snapshot.generation < 27, **options)
+            resumed = self.run_mbo(99, checkpoint_path=self.path, checkpoint_every=10, resume=True, **options)
+            self.assertEqual(resumed, expected)
+            os.remove(self.path)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_extend_completed_run(self):
+        expected = self.run_mbo(4, max_generations=50)
+        self.run_mbo(4, max_generations=30, checkpoint_path=self.path)
+        self.assertEqual(self.run_mbo(0, max_generations=50, checkpoint_path=self.path, resume=True), expected)
+
+    def test_settings_must_match(self):
+        from mbo_checkpoint import load_checkpoint
+        self.run_mbo(5, max_generations=5, checkpoint_path=self.path)
+        state, random_state = load_checkpoint(self.path)
+        self.assertEqual(state.generation, 5)
+        self.assertEqual(len(state.population), 16)
+        with self.assertRaises(ValueError):
+            self.run_mbo(5, checkpoint_path=self.path, resume=True, mutation_rate=0.05)
+        with self.assertRaises(ValueError):
+            self.run_mbo(5, checkpoint_path=self.path, engine='numpy')
+
+class TestPlotting(unittest.TestCase):
+
+    def test_downsample_history(self):
+        from utils import downsample_history
+        history = [i // 7 for i in range(50000)]
+        history[12345] = 10 ** 6  # a spike must survive thinning
+        generations, values = downsample_history(history, max_points=600)
+        self.assertLessEqual(len(values), 700)
+        self.assertEqual((generations[0], generations[-1]), (1, 50000))
+        self.assertIn(10 ** 6, values.tolist())
+        self.assertTrue(all(history[g - 1] == v for g, v in zip(generations.tolist(), values.tolist())))
+        generations, values = downsample_history([3, 4, 5])
+        self.assertEqual((generations.tolist(), values.tolist()), ([1, 2, 3], [3, 4, 5]))
+
+    def test_plot_modes_save_headless(self):
+        import contextlib
+        import io
+        import os
+        import tempfile
+        from utils import PLOT_MODES, plot_fitness_history, plot_solution
+        random.seed(3)
+        num_items = 5000
+        values = [random.randint(1, 100) for _ in range(num_items)]
+        weights = [random.randint(1, 100) for _ in range(num_items)]
+        solution = generate_random_solution(num_items)
+        with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()) as output:
+            for mode in PLOT_MODES:
+                # One bar per item is only drawn for a slice of the instance
+                size = 100 if mode == 'bars' else num_items
+                path = os.path.join(directory, f'{mode}.png')
+                plot_solution(solution[:size], values[:size], weights[:size], sum(weights) // 2, save_path=path,
+                              mode=mode)
+                self.assertGreater(os.path.getsize(path), 0)
+            path = os.path.join(directory, 'history.png')
+            plot_fitness_history(list(range(20000)), save_path=path)
+            self.assertGreater(os.path.getsize(path), 0)
+        # Large selections are summarized instead of listed
+        self.assertIn(f'Selected Items: {sum(solution)} of {num_items}', output.getvalue())
+        with self.assertRaises(ValueError):
+            plot_solution(solution, values, weights, 10, mode='pie')
+
+class TestStartup(unittest.TestCase):
+
+    def test_solver_path_skips_plotting_gui_and_ai(self):
+        import subprocess
+        import sys
+        from benchmarks import HEAVY_MODULES, import_time
+        for module in ('mbo_core', 'knapsack_problem', 'utils'):
+            self.assertEqual(import_time(module, repeats=1)[1], [])
+        # A whole solve, from loading the file to the result, stays headless too
+        code = ("import sys\n"
+                "from knapsack_problem import load_knapsack_instance, solve_knapsack\n"
+                "instance = load_knapsack_instance('data/knapsack_instances/instance1.txt', use_sidecar=False)\n"
+                "solve_knapsack(instance, method='mbo', verbose=False, pop_size=10, max_generations=3)\n"
+                f"print(*[name for name in {HEAVY_MODULES!r} if name in sys.modules])")
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.split(), [])
+
+class TestDeltaEvaluation(unittest.TestCase):
+
+    def setUp(self):
+        from knapsack_instance import KnapsackInstance
+        random.seed(11)
+        self.instance = KnapsackInstance([random.randint(1, 100) for _ in range(30)],
+                                         [random.randint(1, 40) for _ in range(30)], 200)
+
+    def test_crossover_and_mutation_totals(self):
+        from mbo_core import mutate_delta, single_point_crossover_delta, solution_totals
+        for _ in range(20):
+            parent1, parent2 = generate_random_solution(30), generate_random_solution(30)
+            child1, child2, totals1, totals2 = single_point_crossover_delta(
+                parent1, parent2, solution_totals(parent1, self.instance),
+                solution_totals(parent2, self.instance), self.instance)
+            self.assertEqual(totals1, solution_totals(child1, self.instance))
+            self.assertEqual(totals2, solution_totals(child2, self.instance))
+            mutated, totals = mutate_delta(child1, 0.2, totals1, self.instance)
+            self.assertEqual(totals, solution_totals(mutated, self.instance))
+
+    def test_same_result_as_full_evaluation(self):
+        random.seed(5)
+        expected = main_knapsack_mbo(self.instance, pop_size=20, max_generations=40, verbose=False)
+        random.seed(5)
+        result = main_knapsack_mbo(self.instance, pop_size=20, max_generations=40, verbose=False,
+                                   delta_evaluation=True)
+        self.assertEqual(result, expected)
+
+class TestIslands(unittest.TestCase):
+
+    def setUp(self):
+        from knapsack_instance import KnapsackInstance
+        random.seed(13)
+        self.instance = KnapsackInstance([random.randint(1, 100) for _ in range(30)],
+                                         [random.randint(1, 40) for _ in range(30)], 200)
+
+    def test_migration_sources(self):
+        from mbo_islands import migration_sources
+        self.assertEqual(migration_sources(3, 'ring'), [[2], [0], [1]])
+        self.assertEqual(migration_sources(3, 'fully_connected'), [[1, 2], [0, 2], [0, 1]])
+        with self.assertRaises(ValueError):
+            migration_sources(3, 'star')
+
+    def test_island_run(self):
+        best_sol, best_fit, fitness_history, diversity_history = main_knapsack_mbo(
+            self.instance, pop_size=10, max_generations=12, verbose=False,
+            islands=2, migration_interval=5, topology='fully_connected')
+        self.assertEqual(fitness(best_sol, self.instance), best_fit)
+        self.assertEqual(len(fitness_history), 12)
+        self.assertEqual(len(diversity_history), 12)
+        self.assertEqual(fitness_history[-1], best_fit)
+
+    def test_epochs_ship_no_histories(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from mbo_islands import island_knapsack_mbo
+
+        class RecordingExecutor(ThreadPoolExecutor):
+            shipped = []
+
+            def submit(self, fn, state, *args):
+                self.shipped.append((len(state.fitness_history), state.generation))
+                return super().submit(fn, state, *args)
+
+        with RecordingExecutor(max_workers=1) as executor:
+            random.seed(4)
+            result = island_knapsack_mbo(self.instance, num_islands=2, pop_size=10, max_generations=12,
+                                         migration_interval=5, verbose=False, executor=executor)
+        self.assertEqual(RecordingExecutor.shipped, [(0, 0), (0, 0), (0, 5), (0, 5), (0, 10), (0, 10)])
+        self.assertEqual(len(result[2]), 12)
+        self.assertEqual(len(result[3]), 12)
+
+class TestExactSolvers(unittest.TestCase):
+
+    def test_exact_solvers_match_brute_force(self):
+        import itertools
+        from knapsack_instance import KnapsackInstance
+        from exact_solvers import branch_and_bound_knapsack, dp_knapsack
+        random.seed(17)
+        for _ in range(30):
+            n = random.randint(1, 10)
+            instance = KnapsackInstance([random.randint(0, 50) for _ in range(n)],
+                                        [random.randint(0, 30) for _ in range(n)], random.randint(0, 100))
+            optimum = max(fitness(list(sol), instance) for sol in itertools.product([0, 1], repeat=n))
+            for solver in (dp_knapsack, branch_and_bound_knapsack):
+                best_sol, best_fit, fitness_history, diversity_history, stats = solver(
+                    instance, verbose=False, return_stats=True)
+                self.assertEqual(stats.generations, len(fitness_history))
+                self.assertEqual(best_fit, optimum)
+                self.assertEqual(fitness(best_sol, instance), optimum)
+                self.assertEqual(fitness_history, [optimum])
+
+    def test_dp_with_float_values(self):
+        from knapsack_instance import KnapsackInstance
+        from exact_solvers import dp_knapsack
+        best_sol, best_fit = dp_knapsack(KnapsackInstance([0.9, 0.9, 1.5], [1, 1, 2], 2), verbose=False)[:2]
+        self.assertEqual(best_sol, [1, 1, 0])
+        self.assertAlmostEqual(best_fit, 1.8)
+
+    def test_branch_and_bound_with_float_values(self):
+        import itertools
+        from knapsack_instance import KnapsackInstance
+        from exact_solvers import branch_and_bound_knapsack
+        instance = KnapsackInstance([0.41, 0.23, 0.96, 1.88], [0.13, 0.89, 1.67, 1.6], 1.16)
+        self.assertAlmostEqual(branch_and_bound_knapsack(instance, verbose=False)[1], 0.64)
+        rng = random.Random(23)
+        for _ in range(300):
+            n = rng.randint(1, 10)
+            # Weights in 64ths add up exactly, so feasibility does not depend on summation order
+            instance = KnapsackInstance([round(rng.uniform(0, 2), 2) for _ in range(n)],
+                                        [rng.randint(1, 128) / 64 for _ in range(n)], rng.randint(0, 256) / 64)
+            optimum = max(fitness(list(sol), instance) for sol in itertools.product([0, 1], repeat=n))
+            best_sol, best_fit, _, _, stats = branch_and_bound_knapsack(instance, verbose=False, return_stats=True)
+            self.assertEqual(stats.stop_reason, 'optimal')
+            self.assertAlmostEqual(best_fit, optimum)
+            self.assertAlmostEqual(fitness(best_sol, instance), optimum)
+
+    def test_dispatch(self):
+        from knapsack_instance import KnapsackInstance
+        from knapsack_problem import choose_method, load_knapsack_instance, solve_knapsack
+        instance = load_knapsack_instance('data/knapsack_instances/instance1.txt')
+        self.assertEqual(choose_method(instance), 'dp')
+        self.assertEqual(choose_method(KnapsackInstance([1.5] * 3, [0.5] * 3, 1.0)), 'bnb')
+        # Integer weights but fractional values: the DP table would truncate them
+        fractional = KnapsackInstance([0.9, 0.9, 1.5], [1, 1, 2], 2)
+        self.assertEqual(choose_method(fractional), 'bnb')
+        best_sol, best_fit = solve_knapsack(fractional, verbose=False)[:2]
+        self.assertEqual(best_sol, [1, 1, 0])
+        self.assertAlmostEqual(best_fit, 1.8)
+        stats = solve_knapsack(instance, verbose=False, return_stats=True)[-1]
+        self.assertEqual(stats.stop_reason, 'optimal')
+        result = solve_knapsack(instance, method='mbo', verbose=False, pop_size=10, max_generations=3)
+        self.assertEqual(len(result[2]), 3)
+
+    def test_mbo_options_pick_mbo(self):
+        import json
+        import os
+        import subprocess
+        import sys
+        import tempfile
+        with tempfile.TemporaryDirectory() as directory:
+            output_path = os.path.join(directory, 'results.json')
+            subprocess.run([sys.executable, 'knapsack_problem.py', '--batch', 'data/knapsack_instances',
+                            '--engine', 'numpy', '--max_gen', '4', '--workers', '1', '--output', output_path],
+                           capture_output=True, check=True)
+            with open(output_path) as file:
+                self.assertEqual([row['generations'] for row in json.load(file)], [4, 4, 4])
+        refused = subprocess.run([sys.executable, 'knapsack_problem.py', '--instance',
+                                  'data/knapsack_instances/instance1.txt', '--method', 'dp', '--in_place'],
+                                 capture_output=True, text=True)
+        self.assertEqual(refused.returncode, 2)
+        self.assertIn('--in_place', refused.stderr)
+
+class TestBatch(unittest.TestCase):
+
+    def test_solve_and_write_batch(self):
+        import csv
+        import os
+        import tempfile
+        from knapsack_problem import expand_instance_paths, solve_batch, write_batch_results
+        paths = expand_instance_paths(os.path.join('data', 'knapsack_instances'))
+        self.assertEqual(paths, expand_instance_paths(os.path.join('data', 'knapsack_instances', '*.txt')))
+        results = solve_batch(paths[:2], max_workers=2, method='mbo', pop_size=10, max_generations=5)
+        self.assertEqual([row['instance'] for row in results], paths[:2])
+        with tempfile.TemporaryDirectory() as directory:
+            output_path = os.path.join(directory, 'results.csv')
+            write_batch_results(results, output_path)
+            with open(output_path) as file:
+                rows = list(csv.DictReader(file))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(int(rows[0]['generations']), 5)
+        self.assertEqual(rows[0]['error'], '')
+
+    def test_failed_instance_keeps_batch(self):
+        import os
+        import tempfile
+        from knapsack_problem import expand_instance_paths, solve_batch, write_batch_results
+        with tempfile.TemporaryDirectory() as directory:
+            for name, text in (('a.txt', "10\n6 4\n5 3\n"), ('b.txt', "10\n6 4 1\n5\n")):
+                with open(os.path.join(directory, name), 'w') as file:
+                    file.write(text)
+            with open(os.path.join(directory, 'a.txt.npz'), 'wb'):
+                pass
+            paths = expand_instance_paths(os.path.join(directory, '*'))
+            self.assertEqual([os.path.basename(path) for path in paths], ['a.txt', 'b.txt'])
+            results = solve_batch(paths, max_workers=2, method='dp')
+            write_batch_results(results, os.path.join(directory, 'results.json'))
+        self.assertEqual(results[0]['best_fitness'], 11)
+        self.assertIsNone(results[0]['error'])
+        self.assertEqual(results[1]['instance'], paths[1])
+        self.assertIsNone(results[1]['best_fitness'])
+        self.assertIn('ValueError', results[1]['error'])
+
+class TestStacked(unittest.TestCase):
+
+    def setUp(self):
+        from knapsack_instance import KnapsackInstance
+        rng = random.Random(5)
+        self.instances = []
+        for num_items in (8, 12, 16, 3, 1):
+            values = [rng.randint(1, 100) for _ in range(num_items)]
+            weights = [rng.randint(1, 30) for _ in range(num_items)]
+            self.instances.append(KnapsackInstance(values, weights, sum(weights) // 2))
+
+    def test_results_are_feasible_per_instance(self):
+        from exact_solvers import dp_knapsack
+        from mbo_stacked import stacked_knapsack_mbo
+        random.seed(1)
+        results = stacked_knapsack_mbo(self.instances, pop_size=20, max_generations=30)
+        self.assertEqual(len(results), len(self.instances))
+        for instance, (solution, best, fitness_history, diversity_history) in zip(self.instances, results):
+            self.assertEqual(len(solution), instance.num_items)
+            self.assertEqual(fitness(solution, instance), best)
+            self.assertEqual(len(fitness_history), 30)
+            self.assertEqual(len(diversity_history), 30)
+            self.assertEqual(best, dp_knapsack(instance, verbose=False)[1])
+        random.seed(1)
+        self.assertEqual(stacked_knapsack_mbo(self.instances, pop_size=20, max_generations=30), results)
+        # Plain (values, weights, capacity) tuples are accepted too
+        random.seed(1)
+        tuples = [(instance.values, instance.weights, instance.capacity) for instance in self.instances]
+        self.assertEqual(stacked_knapsack_mbo(tuples, pop_size=20, max_generations=30), results)
+
+    def test_fractional_values(self):
+        from mbo_stacked import stacked_knapsack_mbo
+        random.seed(3)
+        results = stacked_knapsack_mbo([([0.5, 0.7, 0.9, 1.6], [1, 1, 1, 2], 2), ([0.9, 0.9, 1.5], [1, 1, 2], 2)],
+                                       pop_size=10, max_generations=10)
+        self.assertAlmostEqual(results[0][1], 1.6)
+        self.assertAlmostEqual(results[1][1], 1.8)
+
+    def test_instances_stop_separately(self):
+        from mbo_stacked import stacked_knapsack_mbo
+        random.seed(2)
+        results = stacked_knapsack_mbo(self.instances, pop_size=20, max_generations=50, stop_at_optimum=True,
+                                       greedy_fraction=0.5, return_stats=True)
+        for instance, (solution, best, fitness_history, _, stats) in zip(self.instances, results):
+            self.assertEqual(stats.generations, len(fitness_history))
+            if stats.stop_reason == 'optimal':
+                self.assertEqual(best, instance.upper_bound())
+            else:
+                self.assertEqual(stats.generations, 50)
+        self.assertEqual(stacked_knapsack_mbo([]), [])
+
+    def test_solve_stacked_rows(self):
+        import os
+        from knapsack_problem import expand_instance_paths, solve_stacked
+        paths = expand_instance_paths(os.path.join('data', 'knapsack_instances'))
+        rows = solve_stacked(paths, pop_size=10, max_generations=5)
+        self.assertEqual([row['instance'] for row in rows], paths)
+        self.assertTrue(all(row['total_weight'] <= row['capacity'] for row in rows))
+
+class TestInstanceLoading(unittest.TestCase):
+
+    def setUp(self):
+        import os
+        import tempfile
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'instance.txt')
+        with open(self.path, 'w') as file:
+            file.write("50\n60 10\n\n100 20\n120 30\n")
+
+    def test_sidecar_reused_until_file_changes(self):
+        import os
+        from knapsack_problem import SIDECAR_SUFFIX, load_knapsack_instance, read_sidecar
+        instance = load_knapsack_instance(self.path)
+        self.assertEqual((instance.values, instance.weights, instance.capacity),
+                         ([60, 100, 120], [10, 20, 30], 50))
+        self.assertTrue(os.path.exists(self.path + SIDECAR_SUFFIX))
+        self.assertIsNotNone(read_sidecar(self.path))
+        self.assertEqual(load_knapsack_instance(self.path).greedy_order, instance.greedy_order)
+        
+        with open(self.path, 'a') as file:
+            file.write("70 5\n")
+        self.assertIsNone(read_sidecar(self.path))
+        self.assertEqual(load_knapsack_instance(self.path).values, [60, 100, 120, 70])
+        # A truncated sidecar counts as missing
+        with open(self.path + SIDECAR_SUFFIX, 'wb'):
+            pass
+        self.assertIsNone(read_sidecar(self.path))
+        self.assertEqual(load_knapsack_instance(self.path).values, [60, 100, 120, 70])
+
+    def test_sidecar_keeps_file_permissions(self):
+        import os
+        import stat
+        from knapsack_problem import SIDECAR_SUFFIX, load_knapsack_instance
+        os.chmod(self.path, 0o644)
+        load_knapsack_instance(self.path)
+        self.assertEqual(stat.S_IMODE(os.stat(self.path + SIDECAR_SUFFIX).st_mode), 0o644)
+
+    def test_malformed_file(self):
+        from knapsack_problem import load_knapsack_instance
+        with open(self.path, 'w') as file:
+            file.write("50\n60 10\n100\n")
+        with self.assertRaises(ValueError):
+            load_knapsack_instance(self.path)
+        # The token count is odd, but the rows are not pairs
+        for text in ("50\n60 10 5\n100\n", "50\n60 10 5\n100 20 7\n", "50 60\n10 5\n", "50\n60 x\n"):
+            with open(self.path, 'w') as file:
+                file.write(text)
+            with self.assertRaises(ValueError):
+                load_knapsack_instance(self.path, use_sidecar=False)
+        with open(self.path, 'w') as file:
+            file.write("50\n")
+        self.assertEqual(load_knapsack_instance(self.path, use_sidecar=False).num_items, 0)
+
+    def test_solver_accepts_arrays(self):
+        import numpy as np
+        from knapsack_instance import KnapsackInstance
+        values, weights = [random.randint(1, 50) for _ in range(40)], [random.randint(0, 20) for _ in range(40)]
+        listed = KnapsackInstance(values, weights, 100)
+        arrayed = KnapsackInstance(np.array(values), np.array(weights), 100)
+        for name in ('values', 'ratios', 'ascending_order', 'greedy_order', 'prefix_values', 'break_index'):
+            self.assertEqual(getattr(listed, name), getattr(arrayed, name))
+        random.seed(4)
+        expected = main_knapsack_mbo(values, weights, 100, pop_size=10, max_generations=5, verbose=False)
+        random.seed(4)
+        result = main_knapsack_mbo(np.array(values), np.array(weights), 100, pop_size=10,
+                                   max_generations=5, verbose=False)
+        self.assertEqual(result, expected)
+
+class TestFitnessCache(unittest.TestCase):
+
+    def setUp(self):
+        self.values = [60, 100, 120]
+        self.weights = [10, 20, 30]
+        self.capacity = 50
+
+    def test_hits_and_misses(self):
+        from mbo_core import FitnessCache
+        cache = FitnessCache(self.values, self.weights, self.capacity)
+        self.assertEqual(cache([1, 0, 1]), 180)
+        self.assertEqual(cache([1, 0, 1]), 180)
+        self.assertEqual(cache([1, 1, 1]), 0)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_lru_eviction(self):
+        from mbo_core import FitnessCache
+        cache = FitnessCache(self.values, self.weights, self.capacity, max_size=2)
+        cache([1, 0, 0])
+        cache([0, 1, 0])
+        cache([1, 0, 0])
+        cache([0, 0, 1])
+        self.assertEqual(len(cache), 2)
+        cache([1, 0, 0])
+        self.assertEqual(cache.hits, 2)
+
+    def test_cache_does_not_change_result(self):
+        random.seed(3)
+        expected = main_knapsack_mbo(self.values, self.weights, self.capacity, pop_size=10,
+                                     max_generations=10, verbose=False)
+        random.seed(3)
+        result = main_knapsack_mbo(self.values, self.weights, self.capacity, pop_size=10,
+                                   max_generations=10, verbose=False, cache_size=100)
+        self.assertEqual(result, expected)
+
+    def test_remove_duplicates(self):
+        from mbo_core import remove_duplicates
+        population, fitness_values = remove_duplicates([[1, 0], [0, 1], [1, 0]], [5, 3, 5])
+        self.assertEqual(population, [[1, 0], [0, 1]])
+        self.assertEqual(fitness_values, [5, 3])
+
+class TestBitPacked(unittest.TestCase):
+
+    def test_pack_roundtrip(self):
+        from mbo_bitpacked import pack_solution, unpack_solution
+        solution = [1, 0, 0, 1, 1, 0, 1, 0, 0, 0]
+        packed = pack_solution(solution)
+        self.assertEqual(packed, 0b1011001)
+        self.assertEqual(unpack_solution(packed, len(solution)), solution)
+
+    def test_diversity_matches_elementwise(self):
+        from mbo_bitpacked import calculate_diversity_packed, pack_population
+        population = [generate_random_solution(30) for _ in range(12)]
+        self.assertEqual(calculate_diversity_packed(pack_population(population)),
+                         pairwise_diversity(population))
+
+    def test_crossover_matches_list_crossover(self):
+        from mbo_core import single_point_crossover
+        from mbo_bitpacked import pack_solution, single_point_crossover_packed
+        parent1, parent2 = generate_random_solution(25), generate_random_solution(25)
+        random.seed(7)
+        expected = single_point_crossover(parent1, parent2)
+        random.seed(7)
+        children = single_point_crossover_packed(pack_solution(parent1), pack_solution(parent2), 25)
+        self.assertEqual(children, tuple(pack_solution(child) for child in expected))
+
+    def test_byte_table_sums(self):
+        from mbo_bitpacked import byte_tables, pack_solution, packed_sum
+        values = [random.randint(1, 100) for _ in range(21)]
+        tables = byte_tables(values, len(values))
+        for _ in range(20):
+            solution = generate_random_solution(len(values))
+            self.assertEqual(packed_sum(pack_solution(solution), tables),
+                             sum(v for v, bit in zip(values, solution) if bit))
+
+    def test_packed_engine_matches_python_engine(self):
+        from knapsack_instance import KnapsackInstance
+        rng = random.Random(4)
+        weights = [rng.randint(1, 50) for _ in range(30)]
+        instance = KnapsackInstance([rng.randint(1, 100) for _ in range(30)], weights, sum(weights) // 2)
+        # Long enough for stagnation to re-inject solutions
+        for greedy_fraction in (0.0, 0.5):
+            results = []
+            for engine in ('python', 'packed'):
+                random.seed(9)
+                results.append(main_knapsack_mbo(instance, pop_size=20, max_generations=60, verbose=False,
+                                                 engine=engine, greedy_fraction=greedy_fraction))
+            self.assertEqual(results[0], results[1])
+        snapshots = []
+        random.seed(9)
+        main_knapsack_mbo(instance, pop_size=20, max_generations=5, verbose=False, engine='packed',
+                          progress=snapshots.append)
+        self.assertEqual([snapshot.generation for snapshot in snapshots], [1, 2, 3, 4, 5])
+        self.assertEqual(fitness(snapshots[-1].best_solution, instance), snapshots[-1].best_fitness)
+
+class TestNumpyEngine(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(42)
+        self.values = [random.randint(1, 100) for _ in range(40)]
+        self.weights = [random.randint(1, 50) for _ in range(40)]
+        self.capacity = 300
+
+    def test_repair_population_matches_repair(self):
+        import numpy as np
+        from mbo_numpy import repair_population
+        population = [generate_random_solution(40) for _ in range(20)]
+        ratios = np.array(self.values) / np.array(self.weights)
+        ascending_order = np.lexsort((np.arange(40), ratios))
+        matrix = np.array(population, dtype=np.uint8)
+        repair_population(matrix, np.array(self.weights), self.capacity, ascending_order)
+        expected = [repair(sol, self.weights, self.capacity, self.values) for sol in population]
+        self.assertEqual(matrix.tolist(), expected)
+
+    def test_numpy_engine_result(self):
+        best_sol, best_fit, fitness_history, diversity_history = main_knapsack_mbo(
+            self.values, self.weights, self.capacity, pop_size=20,
+            max_generations=15, verbose=False, engine='numpy')
+        self.assertEqual(len(best_sol), 40)
+        self.assertEqual(fitness(best_sol, self.values, self.weights, self.capacity), best_fit)
+        self.assertEqual(len(fitness_history), 15)
+        self.assertEqual(len(diversity_history), 15)
+
+    def test_float_values_match_python_engine(self):
+        values, weights, capacity = [0.5, 0.7, 0.9, 1.6], [1, 1, 1, 2], 2
+        for engine in ('python', 'numpy'):
+            random.seed(6)
+            best_sol, best_fit = main_knapsack_mbo(values, weights, capacity, pop_size=10, max_generations=10,
+                                                   verbose=False, engine=engine)[:2]
+            self.assertAlmostEqual(best_fit, 1.6)
+            self.assertAlmostEqual(fitness(best_sol, values, weights, capacity), best_fit)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            main_knapsack_mbo(self.values, self.weights, self.capacity, engine='gpu')
+
+class TestResponseCache(unittest.TestCase):
+
+    class StubModel:
+        def __init__(self):
+            self.calls = 0
+
+        def generate_content(self, contents):
+            from ai_cache import CachedResponse
+            self.calls += 1
+            return CachedResponse(f"answer {self.calls}")
+
+    def setUp(self):
+        import tempfile
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_hits_skip_the_client(self):
+        from ai_cache import CachedModel, ResponseCache
+        stub = self.StubModel()
+        cache = ResponseCache(self.tmp.name)
+        model = CachedModel('stub-model', cache, client=stub)
+        self.assertEqual(model.generate_content(['prompt', b'png bytes']).text, 'answer 1')
+        self.assertEqual(model.generate_content(['prompt', b'png bytes']).text, 'answer 1')
+        self.assertEqual(model.generate_content(['prompt', b'other png']).text, 'answer 2')
+        self.assertEqual(CachedModel('other-model', cache, client=stub).generate_content('prompt').text, 'answer 3')
+        self.assertEqual((stub.calls, cache.hits), (3, 1))
+
+    def test_ttl_and_size_eviction(self):
+        import os, time
+        from ai_cache import ResponseCache
+        cache = ResponseCache(self.tmp.name, ttl=60, max_bytes=None)
+        cache.put('old', 'x')
+        cache.put('new', 'y')
+        stale = time.time() - 120
+        path = os.path.join(self.tmp.name, 'old.json')
+        with open(path, 'w') as f:
+            f.write('{"created": %f, "model": null, "text": "x"}' % stale)
+        self.assertIsNone(cache.get('old'))
+        self.assertEqual(cache.get('new'), 'y')
+        
+        for i in range(5):
+            cache.put(f'key{i}', 'z' * 100)
+            os.utime(os.path.join(self.tmp.name, f'key{i}.json'), (i, i))
+        cache.get('key0')  # most recently used now
+        cache.evict(400)
+        self.assertEqual(cache.get('key0'), 'z' * 100)
+        self.assertIsNone(cache.get('key1'))
+        self.assertLessEqual(len(cache), 3)
+
+    def test_bad_entries_are_misses(self):
+        import os
+        from ai_cache import ResponseCache
+        cache = ResponseCache(self.tmp.name, ttl=60, max_bytes=None)
+        for key, content in (('truncated', '{"created": 1'), ('no_text', '{"created": 1e12}'),
+                             ('no_created', '{"text": "x"}'), ('foreign', '["text", "created"]')):
+            path = os.path.join(self.tmp.name, f'{key}.json')
+            with open(path, 'w') as f:
+                f.write(content)
+            self.assertIsNone(cache.get(key))
+            self.assertFalse(os.path.exists(path))
+        self.assertEqual(cache.misses, 4)
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_run_and_compare(self):
+        from benchmarks import BENCHMARKS, compare_results, run_benchmarks
+        report = run_benchmarks(item_counts=(10,), pop_sizes=(20,), min_time=0, repeats=1, verbose=False)
+        self.assertEqual([record['benchmark'] for record in report['results']], list(BENCHMARKS))
+        self.assertTrue(all(record['seconds'] > 0 for record in report['results']))
+        
+        baseline = {'results': [{'benchmark': 'fitness', 'num_items': 10, 'pop_size': 20, 'seconds': 1.0},
+                                {'benchmark': 'repair', 'num_items': 10, 'pop_size': 20, 'seconds': 1.0}]}
+        current = {'results': [{'benchmark': 'fitness', 'num_items': 10, 'pop_size': 20, 'seconds': 1.1},
+                               {'benchmark': 'repair', 'num_items': 10, 'pop_size': 20, 'seconds': 2.0},
+                               {'benchmark': 'mutate', 'num_items': 10, 'pop_size': 20, 'seconds': 2.0}]}
+        comparison = compare_results(baseline, current, threshold=0.25)
+        self.assertEqual([(row['benchmark'], row['regression']) for row in comparison],
+                         [('fitness', False), ('repair', True)])
+
 if __name__ == '__main__':
     unittest.main()
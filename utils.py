@@ -1,9 +1,79 @@
-import matplotlib.pyplot as plt
+import numpy as np
 
-def plot_solution(solution, values, weights, capacity, save_path=None, ax=None):
+# matplotlib is imported by the plotting functions themselves, so that the
+# solver can import this module without paying for it
+
+# Instances with more items than this are drawn aggregated rather than one bar per item
+LARGE_INSTANCE_ITEMS = 200
+# Selected items are listed one by one only up to this many
+MAX_LISTED_ITEMS = 50
+# Item numbers are written under every bar only up to this many items
+MAX_ITEM_TICKS = 50
+# Points drawn for a history or curve, however long it is
+MAX_PLOT_POINTS = 2000
+# Histories with more points than this are drawn without markers
+MAX_MARKERS = 100
+PLOT_MODES = ('auto', 'bars', 'bins', 'cumulative')
+
+def _axes(figsize, save_path):
+    """
+    Creates the axes of a new figure. Figures that are only saved are drawn
+    headless through the Agg canvas, without pyplot or a GUI backend.
+    """
+    if save_path:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        return fig.add_subplot()
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=figsize)
+    return ax
+
+def _finish(ax, own_figure, save_path, description):
+    if save_path:
+        ax.figure.savefig(save_path)
+        print(f"{description} saved to {save_path}")
+    elif own_figure:
+        import matplotlib.pyplot as plt
+        plt.show()
+
+def downsample_history(history, max_points=MAX_PLOT_POINTS):
+    """
+    Thins a history to at most about ``max_points`` points for plotting.
+
+    The history is cut into buckets and each keeps its first, lowest and
+    highest point, so plateaus, jumps and spikes all survive.
+
+    Parameters:
+        history (list): One value per generation.
+        max_points (int): Point budget.
+
+    Returns:
+        tuple: (generations, values), generations counting from 1.
+    """
+    values = np.asarray(history)
+    n = len(values)
+    generations = np.arange(1, n + 1)
+    if n <= max_points:
+        return generations, values
+    buckets = max(max_points // 3, 1)
+    starts = np.linspace(0, n, buckets + 1).astype(np.intp)[:-1]
+    lows = np.minimum.reduceat(values, starts)
+    highs = np.maximum.reduceat(values, starts)
+    bucket_of = np.repeat(np.arange(buckets), np.diff(np.append(starts, n)))
+    # Index of the first minimum and maximum within each bucket
+    low_at = np.flatnonzero(values == lows[bucket_of])
+    high_at = np.flatnonzero(values == highs[bucket_of])
+    low_at = low_at[np.unique(bucket_of[low_at], return_index=True)[1]]
+    high_at = high_at[np.unique(bucket_of[high_at], return_index=True)[1]]
+    keep = np.unique(np.concatenate((starts, low_at, high_at, [n - 1])))
+    return generations[keep], values[keep]
+
+def plot_solution(solution, values, weights, capacity, save_path=None, ax=None, mode='auto', bins=100):
     """
     Plots the selected items in the knapsack.
-    
+
     Parameters:
         solution (list): Binary list representing the solution.
         values (list): List of item values.
@@ -11,66 +81,101 @@ def plot_solution(solution, values, weights, capacity, save_path=None, ax=None):
         capacity (int): Maximum capacity of the knapsack.
         save_path (str): Path to save the plot image. If None, displays the plot.
         ax (matplotlib.axes.Axes, optional): Axes object to plot on. If None, creates new figure.
+        mode (str): 'bars' draws one bar per item, 'bins' the selected and
+            unselected weight of ``bins`` consecutive item ranges, and
+            'cumulative' the cumulative weight and value of all and of the
+            selected items in value-to-weight order. 'auto' picks 'bars' up
+            to LARGE_INSTANCE_ITEMS items and 'bins' above, so that the
+            drawing time does not grow with the instance.
+        bins (int): Number of item ranges in 'bins' mode.
     """
-    selected_items = [i+1 for i, bit in enumerate(solution) if bit]
-    total_value = sum(v for v, bit in zip(values, solution) if bit)
-    total_weight = sum(w for w, bit in zip(weights, solution) if bit)
-    
-    print(f"\nSelected Items: {selected_items}")
+    if mode not in PLOT_MODES:
+        raise ValueError(f"Unknown plot mode {mode!r}, expected one of {PLOT_MODES}")
+    selected = np.asarray(solution, dtype=bool)
+    values = np.asarray(values, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.int64)
+    num_items = len(selected)
+    total_value = int(values[selected].sum())
+    total_weight = int(weights[selected].sum())
+
+    if np.count_nonzero(selected) <= MAX_LISTED_ITEMS:
+        print(f"\nSelected Items: {(np.flatnonzero(selected) + 1).tolist()}")
+    else:
+        print(f"\nSelected Items: {np.count_nonzero(selected)} of {num_items}")
     print(f"Total Value: {total_value}")
     print(f"Total Weight: {total_weight} / Capacity: {capacity}")
-    
+
     # Create figure if needed
-    if ax is None:
-        fig, ax = plt.subplots(figsize=(12, 6))
-    
-    # Bar Plot
-    indices = range(1, len(solution) + 1)
-    colors = ['green' if bit else 'red' for bit in solution]
-    
-    bars = ax.bar(indices, weights, color=colors, edgecolor='black')
-    
-    # Highlight selected items
-    for bar, bit in zip(bars, solution):
-        if bit:
-            bar.set_edgecolor('gold')
-            bar.set_linewidth(3)
-    
-    ax.axhline(y=capacity, color='blue', linestyle='--', label='Capacity')
-    ax.set_title('Knapsack Items Selection')
-    ax.set_xlabel('Item Number')
-    ax.set_ylabel('Weight')
-    ax.set_xticks(indices)
+    own_figure = ax is None
+    if own_figure:
+        ax = _axes((12, 6), save_path)
+    if mode == 'auto':
+        mode = 'bars' if num_items <= LARGE_INSTANCE_ITEMS else 'bins'
+
+    if mode == 'bars':
+        # One call draws all bars; selected items get a gold edge
+        indices = np.arange(1, num_items + 1)
+        ax.bar(indices, weights, color=np.where(selected, 'green', 'red'),
+               edgecolor=np.where(selected, 'gold', 'black'), linewidth=np.where(selected, 3, 1))
+        ax.axhline(y=capacity, color='blue', linestyle='--', label='Capacity')
+        ax.set_title('Knapsack Items Selection')
+        ax.set_xlabel('Item Number')
+        ax.set_ylabel('Weight')
+        if num_items <= MAX_ITEM_TICKS:
+            ax.set_xticks(indices)
+    elif mode == 'bins':
+        # Selected and unselected weight of each item range, each drawn as one filled step patch
+        bins = max(min(bins, num_items), 1)
+        edges = np.linspace(0, num_items, bins + 1)
+        bin_of = np.minimum((np.arange(num_items) * bins) // max(num_items, 1), bins - 1)
+        chosen = np.bincount(bin_of, weights=np.where(selected, weights, 0), minlength=bins)
+        rest = np.bincount(bin_of, weights=np.where(selected, 0, weights), minlength=bins)
+        ax.stairs(chosen + rest, edges + 0.5, baseline=chosen, fill=True, color='red', label='Not selected')
+        ax.stairs(chosen, edges + 0.5, fill=True, color='green', label='Selected')
+        ax.set_title(f'Knapsack Items Selection ({num_items} items in {bins} ranges, '
+                     f'weight {total_weight} / capacity {capacity})')
+        ax.set_xlabel('Item Number')
+        ax.set_ylabel('Weight per Range')
+    else:
+        # Items by descending value-to-weight ratio, as the greedy solution takes them
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = np.where(weights != 0, values / np.where(weights != 0, weights, 1), np.inf)
+        order = np.argsort(-ratios, kind='stable')
+        for mask, color, label in ((np.ones(num_items, dtype=bool), 'gray', 'All items'),
+                                   (selected[order], 'green', 'Selected items')):
+            cumulative_weight = np.concatenate(([0], np.cumsum(weights[order][mask])))
+            cumulative_value = np.concatenate(([0], np.cumsum(values[order][mask])))
+            step = max(len(cumulative_weight) // MAX_PLOT_POINTS, 1)
+            points = np.append(np.arange(0, len(cumulative_weight), step), len(cumulative_weight) - 1)
+            ax.plot(cumulative_weight[points], cumulative_value[points], color=color, label=label)
+        ax.axvline(x=capacity, color='blue', linestyle='--', label='Capacity')
+        ax.set_title('Cumulative Value by Value-to-Weight Ratio')
+        ax.set_xlabel('Cumulative Weight')
+        ax.set_ylabel('Cumulative Value')
     ax.legend()
-    
-    if save_path:
-        plt.savefig(save_path)
-        plt.close()
-        print(f"Solution plot saved to {save_path}")
-    elif ax is None:
-        plt.show()
 
-def plot_fitness_history(fitness_history, save_path=None, ax=None):
+    _finish(ax, own_figure, save_path, "Solution plot")
+
+def plot_fitness_history(fitness_history, save_path=None, ax=None, max_points=MAX_PLOT_POINTS):
     """
     Plots the fitness history over generations.
-    
+
     Parameters:
         fitness_history (list): List of best fitness values per generation.
         save_path (str): Path to save the plot image. If None, displays the plot.
         ax (matplotlib.axes.Axes, optional): Axes object to plot on. If None, creates new figure.
+        max_points (int): Longer histories are thinned with ``downsample_history``.
     """
-    if ax is None:
-        fig, ax = plt.subplots(figsize=(10, 6))
-        
-    ax.plot(range(1, len(fitness_history)+1), fitness_history, marker='o', linestyle='-', color='b')
+    own_figure = ax is None
+    if own_figure:
+        ax = _axes((10, 6), save_path)
+
+    generations, values = downsample_history(fitness_history, max_points)
+    ax.plot(generations, values, marker='o' if len(fitness_history) <= MAX_MARKERS else None,
+            linestyle='-', color='b')
     ax.set_title('Fitness Convergence Over Generations')
     ax.set_xlabel('Generation')
     ax.set_ylabel('Best Fitness')
     ax.grid(True)
-    
-    if save_path:
-        plt.savefig(save_path)
-        plt.close()
-        print(f"Fitness convergence plot saved to {save_path}")
-    elif ax is None:
-        plt.show()
\ No newline at end of file
+
+    _finish(ax, own_figure, save_path, "Fitness convergence plot")